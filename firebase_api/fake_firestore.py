@@ -0,0 +1,89 @@
+import copy
+import threading
+
+
+class FakeDocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self.collection_name = collection
+        self.id = doc_id
+
+    def set(self, data):
+        self._client._write(self.collection_name, self.id, data)
+        self._client.round_trips += 1
+
+    def update(self, data):
+        self._client._update(self.collection_name, self.id, data)
+        self._client.round_trips += 1
+
+    def get_data(self):
+        return self._client.documents.get(self.collection_name, {}).get(self.id)
+
+
+class FakeCollectionReference:
+    def __init__(self, client, name):
+        self._client = client
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self._client, self.name, doc_id)
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, doc_ref, data):
+        self._ops.append(("set", doc_ref, copy.deepcopy(data)))
+
+    def update(self, doc_ref, data):
+        self._ops.append(("update", doc_ref, copy.deepcopy(data)))
+
+    def commit(self):
+        if len(self._ops) > self._client.batch_limit:
+            raise ValueError(f"A batch may contain at most {self._client.batch_limit} writes, got {len(self._ops)}")
+        if self._client.fail_next_commits > 0:
+            self._client.fail_next_commits -= 1
+            raise ConnectionError("simulated Firestore commit failure")
+        for op, doc_ref, data in self._ops:
+            if op == "set":
+                self._client._write(doc_ref.collection_name, doc_ref.id, data)
+            else:
+                self._client._update(doc_ref.collection_name, doc_ref.id, data)
+        self._client.commits += 1
+        self._client.round_trips += 1
+        self._ops = []
+
+
+class FakeFirestore:
+    """
+    In-memory stand-in for firestore.Client used to exercise the sync code without a Firebase project.
+    Supports collection().document().set()/update() and batch().set()/update()/commit(),
+    and counts writes, commits and network round-trips.
+    """
+
+    def __init__(self, batch_limit=500):
+        self.batch_limit = batch_limit
+        self.documents = {}
+        self.writes = 0
+        self.commits = 0
+        self.round_trips = 0
+        self.fail_next_commits = 0
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def _write(self, collection, doc_id, data):
+        with self._lock:
+            self.documents.setdefault(collection, {})[doc_id] = copy.deepcopy(data)
+            self.writes += 1
+
+    def _update(self, collection, doc_id, data):
+        with self._lock:
+            self.documents.setdefault(collection, {}).setdefault(doc_id, {}).update(copy.deepcopy(data))
+            self.writes += 1
@@ -4,10 +4,14 @@ from firebase_admin import credentials, firestore
 import time
 import threading
 
+from firestore_sync import IncrementalFirestoreSync
+from sqlite_access import DBWriterActor, ReadPool, DUPLICATE
+
 class FirebaseAPI:
     """
     A class to handle communication between a local SQLite database and Google Firestore.
     - Sends the current state of devices from SQLite to Firestore.
+    - Keeps Firestore up to date incrementally with only the devices that changed.
     - Listens for new control commands from Firestore and saves them to SQLite.
     """
 
@@ -29,10 +33,13 @@ class FirebaseAPI:
             print(f"Error initializing Firebase: {e}")
             raise
 
+        self.db_path = db_path
+        self.state_sync = None
+
         try:
-            # Connect to the local SQLite database
-            self.sqlite_conn = sqlite3.connect(db_path, check_same_thread=False)
-            self.sqlite_conn.row_factory = sqlite3.Row # Allows accessing columns by name
+            # A single writer thread owns the write connection; reads use a small connection pool
+            self.db_writer = DBWriterActor(db_path)
+            self.read_pool = ReadPool(db_path)
             print(f"Successfully connected to SQLite database at {db_path}")
         except sqlite3.Error as e:
             print(f"Error connecting to SQLite database: {e}")
@@ -46,9 +53,8 @@ class FirebaseAPI:
         """
         print("\nStarting sync from SQLite to Firestore...")
         try:
-            cursor = self.sqlite_conn.cursor()
-            cursor.execute("SELECT * FROM realtime_state")
-            all_devices_state = cursor.fetchall()
+            with self.read_pool.connection() as conn:
+                all_devices_state = conn.execute("SELECT * FROM realtime_state").fetchall()
 
             if not all_devices_state:
                 print("No device states found in local DB to sync.")
@@ -73,36 +79,51 @@ class FirebaseAPI:
         except Exception as e:
             print(f"An error occurred during Firestore sync: {e}")
 
+    def start_incremental_sync(self, interval=5.0):
+        """
+        Starts the background change-feed sync of 'realtime_state' to Firestore.
+        Only devices changed since the last cycle are written, using batched commits.
+
+        Args:
+            interval (float): Seconds between two periodic sync cycles.
+        """
+        self.state_sync = IncrementalFirestoreSync(self.firestore_db, self.read_pool, self.db_writer,
+                                                   interval=interval).start()
+        self.state_sync.request_sync()
+        print(f"--> Incremental sync to Firestore running every {interval}s.")
+        return self.state_sync
+
     def _save_command_to_local_db(self, command_data):
         """
-        Saves a single command received from Firestore into the local SQLite DB.
-        (Internal method)
+        Queues a single command received from Firestore for the local SQLite DB.
+        The DB writer thread inserts queued commands in batches. (Internal method)
+
+        Returns:
+            Future: Resolves once the command is committed, or None if it was rejected.
         """
-        print(f"  - Saving new command {command_data['command_id']} to local DB...")
-        try:
-            # Ensure required fields are present
-            required_fields = ['command_id', 'device_id', 'timestamp', 'command', 'source', 'status']
-            for field in required_fields:
-                if field not in command_data:
-                    print(f"    - Command missing required field: {field}. Skipping.")
-                    return
-
-            cursor = self.sqlite_conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO control_commands (command_id, device_id, timestamp, command, source, status)
-                VALUES (:command_id, :device_id, :timestamp, :command, :source, :status)
-                """,
-                command_data
-            )
-            self.sqlite_conn.commit()
-            print(f"  - Successfully saved command {command_data['command_id']}.")
-
-        except sqlite3.IntegrityError:
-            # This can happen if two listeners try to write the same command.
-            print(f"  - Command with ID {command_data['command_id']} already exists in local DB. Skipping.")
-        except sqlite3.Error as e:
-            print(f"  - SQLite error while saving command: {e}")
+        command_id = command_data['command_id']
+        print(f"  - Saving new command {command_id} to local DB...")
+
+        # Ensure required fields are present
+        required_fields = ['command_id', 'device_id', 'timestamp', 'command', 'source', 'status']
+        for field in required_fields:
+            if field not in command_data:
+                print(f"    - Command missing required field: {field}. Skipping.")
+                return None
+
+        def on_saved(future):
+            try:
+                if future.result() == DUPLICATE:
+                    # This can happen if two listeners try to write the same command.
+                    print(f"  - Command with ID {command_id} already exists in local DB. Skipping.")
+                else:
+                    print(f"  - Successfully saved command {command_id}.")
+            except sqlite3.Error as e:
+                print(f"  - SQLite error while saving command: {e}")
+
+        future = self.db_writer.submit_command(command_data)
+        future.add_done_callback(on_saved)
+        return future
 
 
     def listen_for_control_commands(self):
@@ -113,11 +134,15 @@ class FirebaseAPI:
         # A callback to run when a snapshot is received
         def on_snapshot(col_snapshot, changes, read_time):
             print("\nReceived new snapshot from 'control_commands'...")
+            # A burst of commands arrives as one snapshot: acknowledge them in one batched write
+            status_batch = self.firestore_db.batch()
+            pending_updates = 0
             for change in changes:
                 if change.type.name == 'ADDED':
                     command_doc = change.document
                     command_data = command_doc.to_dict()
                     command_data['command_id'] = command_doc.id # Use firestore doc id as primary key
+                    command_data['received_at'] = time.time() # Server receive stage of the command latency
 
                     print(f"New command detected: ID {command_doc.id}")
                     # Save the new command to the local database
@@ -125,7 +150,14 @@ class FirebaseAPI:
 
                     # Optional: Update the status in Firestore to 'received'
                     # to prevent re-processing
-                    command_doc.reference.update({'status': 'received by server'})
+                    status_batch.update(command_doc.reference, {'status': 'received by server'})
+                    pending_updates += 1
+                    if pending_updates == 500:
+                        status_batch.commit()
+                        status_batch = self.firestore_db.batch()
+                        pending_updates = 0
+            if pending_updates:
+                status_batch.commit()
 
 
         collection_ref = self.firestore_db.collection('control_commands').where('status', '==', 'pending')
@@ -142,6 +174,18 @@ class FirebaseAPI:
             print("\nStopping listener...")
             self.command_listener.unsubscribe()
 
+    def contention_stats(self):
+        """
+        Returns queue/lock metrics of the DB writer thread and the read pool.
+        """
+        return {"writer": self.db_writer.stats(), "read_pool": self.read_pool.stats()}
+
+    def close(self):
+        if self.state_sync is not None:
+            self.state_sync.stop()
+        self.db_writer.close()
+        self.read_pool.close()
+
 
 if __name__ == '__main__':
     # --- CONFIGURATION ---
@@ -154,8 +198,8 @@ if __name__ == '__main__':
         # 1. Initialize the API class
         firebase_comm = FirebaseAPI(FIREBASE_CREDENTIALS_PATH, SQLITE_DATABASE_PATH)
 
-        # 2. Perform an initial sync of data from local DB to Firestore
-        firebase_comm.sync_current_state_to_firestore()
+        # 2. Keep Firestore in sync with the local DB (the first cycle pushes every device)
+        firebase_comm.start_incremental_sync()
 
         # 3. Start listening for commands from Firestore in a separate thread
         # This allows you to run other tasks in your main application if needed
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+
+# --- CONFIGURATION PARAMETERS ---
+SYNC_INTERVAL_S = 5.0        # Periodic sync even when nobody calls request_sync()
+MIN_SYNC_SPACING_S = 0.5     # Coalesce bursts of request_sync() into at most one cycle per spacing
+FIRESTORE_BATCH_LIMIT = 500  # Firestore accepts at most 500 writes per batched commit
+
+# Every insert/update of realtime_state moves the device to the end of a change log. SQLite serialises writers,
+# so sequence numbers are committed in order and "seq > high-water mark" never skips a change, even
+# when the ingest writer commits batches whose last_update is older than rows already synced.
+# The log keeps one row per device (a change re-inserts it with a new seq), so it stays bounded by the
+# number of devices while no sync is running, instead of growing with every reading.
+CHANGELOG_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS realtime_state_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id INTEGER NOT NULL UNIQUE
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS trg_realtime_state_changes_insert AFTER INSERT ON realtime_state
+    BEGIN
+        DELETE FROM realtime_state_changes WHERE device_id = NEW.device_id;
+        INSERT INTO realtime_state_changes (device_id) VALUES (NEW.device_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_realtime_state_changes_update AFTER UPDATE ON realtime_state
+    BEGIN
+        DELETE FROM realtime_state_changes WHERE device_id = NEW.device_id;
+        INSERT INTO realtime_state_changes (device_id) VALUES (NEW.device_id);
+    END""",
+    """CREATE TABLE IF NOT EXISTS sync_state (
+        name TEXT PRIMARY KEY NOT NULL,
+        high_water_mark INTEGER NOT NULL
+    )""",
+)
+
+# A sync that has no high-water mark yet has never pushed anything: seed the log with every known device
+SEED_CHANGELOG = """
+    REPLACE INTO realtime_state_changes (device_id)
+    SELECT device_id FROM realtime_state WHERE NOT EXISTS (SELECT 1 FROM sync_state WHERE name = ?)
+"""
+REGISTER_SYNC = "INSERT OR IGNORE INTO sync_state (name, high_water_mark) VALUES (?, 0)"
+UPDATE_HIGH_WATER_MARK = """
+    INSERT INTO sync_state (name, high_water_mark) VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET high_water_mark = excluded.high_water_mark
+"""
+# Every consumer of the log is at or past this point once the lowest mark has moved
+PRUNE_CHANGELOG = "DELETE FROM realtime_state_changes WHERE seq <= (SELECT MIN(high_water_mark) FROM sync_state)"
+
+CHANGED_ROWS_QUERY = """
+    SELECT c.max_seq, r.*
+    FROM (
+        SELECT device_id, MAX(seq) AS max_seq FROM realtime_state_changes
+        WHERE seq > ? GROUP BY device_id
+    ) AS c
+    JOIN realtime_state AS r ON r.device_id = c.device_id
+    ORDER BY c.max_seq
+"""
+
+
+class IncrementalFirestoreSync:
+    """
+    Incremental change-feed sync from the local 'realtime_state' table to Firestore.
+    - Only devices whose state changed since the last committed sync are pushed.
+    - Several changes of the same device between two cycles collapse into one document write.
+    - Writes go out as Firestore batched writes of up to FIRESTORE_BATCH_LIMIT documents.
+    - A background scheduler runs a cycle every `interval` seconds or on request_sync(), coalescing bursts.
+    - Reads borrow a connection from the ReadPool; change-log and high-water-mark writes go through the
+      DBWriterActor, the only writer of the local database.
+    """
+
+    def __init__(self, firestore_db, read_pool, db_writer, collection="realtime_state", interval=SYNC_INTERVAL_S,
+                 min_spacing=MIN_SYNC_SPACING_S, batch_limit=FIRESTORE_BATCH_LIMIT, name="realtime_state"):
+        """
+        Args:
+            firestore_db: A firestore.Client (or compatible fake) providing collection() and batch().
+            read_pool (ReadPool): Read connections to the local SQLite database.
+            db_writer (DBWriterActor): Writer thread of the local SQLite database.
+            collection (str): Target Firestore collection.
+            interval (float): Seconds between periodic cycles.
+            min_spacing (float): Minimum seconds between two cycles.
+            batch_limit (int): Maximum documents per batched commit.
+            name (str): Key of this sync's high-water mark in the sync_state table.
+        """
+        self.firestore_db = firestore_db
+        self.read_pool = read_pool
+        self.db_writer = db_writer
+        self.collection = collection
+        self.interval = interval
+        self.min_spacing = min_spacing
+        self.batch_limit = batch_limit
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_cycle = None
+        self.totals = {"cycles": 0, "docs_written": 0, "bytes_sent": 0, "commits": 0, "failed_cycles": 0}
+
+        self._install_changelog()
+
+    def _install_changelog(self):
+        statements = [(sql, ()) for sql in CHANGELOG_SCHEMA]
+        statements += [(SEED_CHANGELOG, (self.name,)), (REGISTER_SYNC, (self.name,))]
+        self.db_writer.transaction(statements).result()
+
+    # ---------- Sync cycle ----------
+    def _high_water_mark(self, conn):
+        row = conn.execute("SELECT high_water_mark FROM sync_state WHERE name = ?", (self.name,)).fetchone()
+        return row[0] if row else 0
+
+    def _commit_high_water_mark(self, seq):
+        # Wait for the commit: the next chunk must not be reported as synced before this mark is durable
+        self.db_writer.transaction([(UPDATE_HIGH_WATER_MARK, (self.name, seq)), (PRUNE_CHANGELOG, ())]).result()
+
+    def sync_once(self):
+        """
+        Pushes every device state changed since the last successful cycle.
+
+        Returns:
+            dict: Metrics of this cycle (docs_written, bytes_sent, commits, changes, duration_ms).
+        """
+        with self._lock:
+            started = time.perf_counter()
+            with self.read_pool.connection() as conn:
+                hwm = self._high_water_mark(conn)
+                changes = conn.execute(
+                    "SELECT COUNT(*) FROM realtime_state_changes WHERE seq > ?", (hwm,)).fetchone()[0]
+                rows = conn.execute(CHANGED_ROWS_QUERY, (hwm,)).fetchall()
+
+            cycle = {"changes": changes, "docs_written": 0, "bytes_sent": 0, "commits": 0}
+            collection_ref = self.firestore_db.collection(self.collection)
+            try:
+                for start in range(0, len(rows), self.batch_limit):
+                    chunk = rows[start:start + self.batch_limit]
+                    batch = self.firestore_db.batch()
+                    chunk_bytes = 0
+                    for row in chunk:
+                        state = dict(row)
+                        state.pop("max_seq")
+                        batch.set(collection_ref.document(str(state["device_id"])), state)
+                        chunk_bytes += len(json.dumps(state, default=str))
+                    batch.commit()
+                    cycle["bytes_sent"] += chunk_bytes
+                    cycle["commits"] += 1
+                    cycle["docs_written"] += len(chunk)
+                    # Rows are ordered by their latest change, so everything up to this
+                    # chunk's last sequence number is now in Firestore
+                    self._commit_high_water_mark(chunk[-1]["max_seq"])
+            except Exception as e:
+                print(f"An error occurred during Firestore sync: {e}")
+                self.totals["failed_cycles"] += 1
+            cycle["duration_ms"] = (time.perf_counter() - started) * 1000
+
+            self.last_cycle = cycle
+            self.totals["cycles"] += 1
+            for key in ("docs_written", "bytes_sent", "commits"):
+                self.totals[key] += cycle[key]
+            return cycle
+
+    # ---------- Scheduler ----------
+    def request_sync(self):
+        """
+        Asks for a cycle as soon as possible; calls made while a cycle is pending are coalesced.
+        """
+        self._wakeup.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="FirestoreSync", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        last_run = 0.0
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval)
+            if self._stop.is_set():
+                break
+            wait = self.min_spacing - (time.monotonic() - last_run)
+            if wait > 0 and self._stop.wait(wait):
+                break
+            # Clear before syncing so requests that arrive during the cycle trigger exactly one more
+            self._wakeup.clear()
+            last_run = time.monotonic()
+            cycle = self.sync_once()
+            if cycle["docs_written"]:
+                print(f"Synced {cycle['docs_written']} device states to Firestore "
+                      f"({cycle['bytes_sent']} bytes, {cycle['commits']} commits).")
@@ -0,0 +1,329 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# --- CONFIGURATION PARAMETERS ---
+WRITER_BATCH_SIZE = 200      # Requests committed together by the writer actor
+WRITER_FLUSH_S = 0.05        # Maximum time a request waits for its batch to fill up
+READ_POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000       # Let SQLite wait for a lock instead of failing with "database is locked"
+LOCKED_RETRIES = 5
+
+INSERT_COMMAND = """
+    INSERT INTO control_commands (command_id, device_id, timestamp, command, source, status, received_at)
+    VALUES (:command_id, :device_id, :timestamp, :command, :source, :status, :received_at)
+"""
+
+# Results of submit_command()
+INSERTED = "inserted"
+DUPLICATE = "duplicate"
+
+_STOP = object()
+
+
+def _connect(db_path, **kwargs):
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def _is_locked(error):
+    return "locked" in str(error)
+
+
+def _ensure_received_at(conn):
+    """
+    Adds control_commands.received_at (server receive time, used by the command dispatcher's latency tracking).
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(control_commands)")}
+    if columns and "received_at" not in columns:
+        try:
+            conn.execute("ALTER TABLE control_commands ADD COLUMN received_at REAL")
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e):
+                raise
+
+
+class _Request:
+    __slots__ = ("kind", "sql", "params", "future", "enqueued")
+
+    def __init__(self, kind, sql, params):
+        self.kind = kind
+        self.sql = sql
+        self.params = params
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class DBWriterActor:
+    """
+    Single thread that owns the only write connection to the local SQLite database.
+    - Callers enqueue requests and get a concurrent.futures.Future back, so listener callbacks never block on SQLite.
+    - Queued requests are committed together: new control_commands rows go in with one executemany().
+    - Keeps contention metrics (queue wait, batch size, commit time, lock retries).
+    """
+
+    def __init__(self, db_path, batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_S):
+        """
+        Args:
+            db_path (str): The file path to the local SQLite database.
+            batch_size (int): Maximum requests committed in one transaction.
+            flush_interval (float): Maximum seconds the first request of a batch waits for more.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "commands_inserted": 0,
+            "commands_duplicate": 0,
+            "batches": 0,
+            "max_batch": 0,
+            "locked_retries": 0,
+            "errors": 0,
+            "queue_wait_s": 0.0,
+            "max_queue_wait_ms": 0.0,
+            "commit_s": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="DBWriterActor", daemon=True)
+        self._thread.start()
+
+    # ---------- Public API ----------
+    def submit_command(self, command_data):
+        """
+        Queues a control command for insertion into control_commands.
+        A missing 'received_at' is set to the time of this call.
+
+        Returns:
+            Future: Resolves to INSERTED or DUPLICATE, or raises the sqlite3.Error that occurred.
+        """
+        params = dict(command_data)
+        params.setdefault("received_at", time.time())
+        return self._enqueue(_Request("command", INSERT_COMMAND, params))
+
+    def execute(self, sql, params=()):
+        """
+        Queues an arbitrary write statement. The Future resolves to the statement's rowcount.
+        """
+        return self._enqueue(_Request("execute", sql, params))
+
+    def transaction(self, statements):
+        """
+        Queues several write statements, given as (sql, params) pairs, that are committed together in order.
+        The Future resolves to the list of their rowcounts; if one statement fails, none of them is applied.
+        """
+        return self._enqueue(_Request("transaction", None, list(statements)))
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["queue_depth"] = self._queue.qsize()
+        s["avg_batch"] = s["requests"] / s["batches"] if s["batches"] else 0.0
+        s["avg_queue_wait_ms"] = s["queue_wait_s"] * 1000 / s["requests"] if s["requests"] else 0.0
+        s["avg_commit_ms"] = s["commit_s"] * 1000 / s["batches"] if s["batches"] else 0.0
+        return s
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _enqueue(self, request):
+        if not self._thread.is_alive():
+            raise RuntimeError("DBWriterActor is closed")
+        self._queue.put(request)
+        return request.future
+
+    # ---------- Actor thread ----------
+    def _run(self):
+        conn = _connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        _ensure_received_at(conn)
+        try:
+            while True:
+                first = self._queue.get()
+                if first is _STOP:
+                    return
+                batch = [first]
+                deadline = time.monotonic() + self.flush_interval
+                stopping = False
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._process(conn, batch)
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    def _process(self, conn, batch):
+        started = time.perf_counter()
+        waits = [started - r.enqueued for r in batch]
+
+        for attempt in range(LOCKED_RETRIES + 1):
+            try:
+                results = self._commit(conn, batch)
+                break
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if not _is_locked(e) or attempt == LOCKED_RETRIES:
+                    self._fail(batch, e)
+                    return
+                with self._stats_lock:
+                    self._stats["locked_retries"] += 1
+                time.sleep(0.01 * (2 ** attempt))
+            except Exception as e:
+                # Keep the actor alive: a dead writer thread would leave every queued Future unresolved
+                conn.rollback()
+                self._fail(batch, e)
+                return
+
+        commit_s = time.perf_counter() - started
+        failed = [(r, e) for r, e in zip(batch, results) if isinstance(e, Exception)]
+        with self._stats_lock:
+            s = self._stats
+            s["requests"] += len(batch)
+            s["batches"] += 1
+            s["max_batch"] = max(s["max_batch"], len(batch))
+            s["queue_wait_s"] += sum(waits)
+            s["max_queue_wait_ms"] = max(s["max_queue_wait_ms"], max(waits) * 1000)
+            s["commit_s"] += commit_s
+            s["commands_inserted"] += sum(1 for r in results if r == INSERTED)
+            s["commands_duplicate"] += sum(1 for r in results if r == DUPLICATE)
+            s["errors"] += len(failed)
+        for request, error in failed:
+            print(f"  - SQLite error in a queued {request.kind} request: {error}")
+        for request, result in zip(batch, results):
+            if isinstance(result, Exception):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+    @staticmethod
+    def _isolated(conn, apply):
+        """
+        Runs one request inside a savepoint. If it fails, only its own changes are rolled back and the
+        exception is returned as its result, so the other requests of the batch still commit.
+        A locked database is raised instead: the whole batch is retried.
+        """
+        conn.execute("SAVEPOINT request")
+        try:
+            result = apply()
+        except Exception as e:
+            if isinstance(e, sqlite3.OperationalError) and _is_locked(e):
+                raise
+            conn.execute("ROLLBACK TO request")
+            result = e
+        conn.execute("RELEASE request")
+        return result
+
+    def _commit(self, conn, batch):
+        """
+        Applies one batch in a single transaction and returns one result (or exception) per request.
+        """
+        commands = [r for r in batch if r.kind == "command"]
+        results = {}
+        with conn:
+            # An explicit transaction: releasing the savepoints must not commit each request on its own
+            conn.execute("BEGIN")
+            if commands:
+                ids = [r.params["command_id"] for r in commands]
+                placeholders = ", ".join("?" * len(ids))
+                existing = {row[0] for row in conn.execute(
+                    f"SELECT command_id FROM control_commands WHERE command_id IN ({placeholders})", ids)}
+                new = []
+                for r in commands:
+                    command_id = r.params["command_id"]
+                    if command_id in existing:
+                        results[id(r)] = DUPLICATE
+                    else:
+                        existing.add(command_id)  # Same command twice within the batch
+                        results[id(r)] = INSERTED
+                        new.append(r)
+                outcome = self._isolated(conn, lambda: conn.executemany(INSERT_COMMAND, [r.params for r in new]))
+                if isinstance(outcome, Exception):
+                    # Find the offending rows: insert the commands one by one
+                    for r in new:
+                        outcome = self._isolated(conn, lambda r=r: conn.execute(INSERT_COMMAND, r.params))
+                        if isinstance(outcome, Exception):
+                            results[id(r)] = outcome
+            for r in batch:
+                if r.kind == "execute":
+                    results[id(r)] = self._isolated(conn, lambda r=r: conn.execute(r.sql, r.params).rowcount)
+                elif r.kind == "transaction":
+                    results[id(r)] = self._isolated(
+                        conn, lambda r=r: [conn.execute(sql, params).rowcount for sql, params in r.params])
+        return [results[id(r)] for r in batch]
+
+    def _fail(self, batch, error):
+        print(f"  - Error while writing {len(batch)} queued requests: {error!r}")
+        with self._stats_lock:
+            self._stats["errors"] += len(batch)
+        for request in batch:
+            request.future.set_exception(error)
+
+
+class ReadPool:
+    """
+    Small pool of read-only SQLite connections shared by the sync and listener threads.
+    WAL mode lets these readers run concurrently with the writer actor.
+    """
+
+    def __init__(self, db_path, size=READ_POOL_SIZE):
+        self._pool = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {"checkouts": 0, "waited": 0, "wait_s": 0.0, "max_wait_ms": 0.0}
+        for _ in range(size):
+            conn = _connect(db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only=ON")
+            self._pool.put(conn)
+        self.size = size
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection for the duration of the with-block.
+        """
+        started = time.perf_counter()
+        try:
+            conn = self._pool.get_nowait()
+            waited = False
+        except queue.Empty:
+            conn = self._pool.get()
+            waited = True
+        wait_s = time.perf_counter() - started
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["waited"] += int(waited)
+            self._stats["wait_s"] += wait_s
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_s * 1000)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["idle"] = self._pool.qsize()
+        return s
+
+    def close(self):
+        for _ in range(self.size):
+            self._pool.get().close()
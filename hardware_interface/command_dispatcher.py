@@ -0,0 +1,491 @@
+import argparse
+import bisect
+import json
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# --- CONFIGURATION PARAMETERS ---
+CONTROL_TOPIC = "room/{room_id}/device/{device_id}/control"   # Server -> ESP32
+ACK_TOPIC = "room/+/device/+/ack"                             # ESP32 -> server, {"command_id", "status", "response"}
+PUBLISH_QOS = 1
+POLL_INTERVAL_S = 0.05       # How often control_commands is checked for new 'pending' rows
+ACK_TIMEOUT_S = 1.0          # Republish a command that was not acknowledged within this time
+MAX_ATTEMPTS = 3
+COMMAND_DEADLINE_S = 10.0    # A command not acknowledged this long after it reached the server is expired
+DISPATCH_BATCH = 100         # Pending rows picked up per poll
+LATENCY_TARGET_MS = 500.0    # p99 goal for HVAC commands (Firestore write -> device ack)
+
+# control_commands.status values
+PENDING = "pending"
+DISPATCHED = "dispatched"
+ACKNOWLEDGED = "acknowledged"
+FAILED = "failed"
+EXPIRED = "expired"
+
+# Per-stage timestamps kept next to each command (epoch seconds); executed_at holds the ack time
+DISPATCH_COLUMNS = {"received_at": "REAL", "published_at": "REAL", "attempts": "INTEGER NOT NULL DEFAULT 0"}
+
+LATENCY_STAGES = ("firestore_to_server", "server_to_publish", "publish_to_ack", "end_to_end")
+
+PENDING_QUERY = """
+    SELECT command_id, device_id, timestamp, command, received_at FROM control_commands
+    WHERE status = ? ORDER BY rowid LIMIT ?
+"""
+
+
+def ensure_dispatch_schema(conn):
+    """
+    Adds the stage timestamp columns to control_commands if they are missing.
+    """
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(control_commands)")}
+    for column, decl in DISPATCH_COLUMNS.items():
+        if column in existing:
+            continue
+        try:
+            conn.execute(f"ALTER TABLE control_commands ADD COLUMN {column} {decl}")
+        except sqlite3.OperationalError as e:
+            # Another process (e.g. the Firebase listener) added it in the meantime
+            if "duplicate column" not in str(e):
+                raise
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_control_commands_status ON control_commands (status)")
+    conn.commit()
+
+
+def to_epoch(value):
+    """
+    Converts the Firestore 'timestamp' field as stored in SQLite (epoch s/ms, ISO string or datetime) to epoch seconds.
+    Returns None when it cannot be interpreted.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        return to_epoch(float(value))
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class LatencyHistogram:
+    """
+    Fixed log-scale histogram of latencies in milliseconds (10% wide buckets from 0.1 ms to ~2 min).
+    Recording is O(log buckets) and memory stays constant however many commands are measured.
+    """
+
+    def __init__(self, lowest_ms=0.1, highest_ms=120000.0, growth=1.1):
+        bounds = [lowest_ms]
+        while bounds[-1] < highest_ms:
+            bounds.append(bounds[-1] * growth)
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def record(self, value_ms):
+        value_ms = max(value_ms, 0.0)
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.min_ms = value_ms if self.min_ms is None else min(self.min_ms, value_ms)
+        self.max_ms = value_ms if self.max_ms is None else max(self.max_ms, value_ms)
+
+    def percentile(self, p):
+        """
+        Upper bound of the bucket holding the p-th percentile (within 10% of the true value).
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(round(p / 100 * self.count + 0.5 - 1e-9)))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.bounds[i] if i < len(self.bounds) else self.max_ms, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "min_ms": self.min_ms,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms,
+        }
+
+
+class _InFlight:
+    __slots__ = ("command_id", "device_id", "command", "topic", "payload", "firestore_ts", "received_at",
+                 "first_published", "last_published", "attempts", "deadline")
+
+    def __init__(self, command_id, device_id, command, topic, payload, firestore_ts, received_at, deadline):
+        self.command_id = command_id
+        self.device_id = device_id
+        self.command = command
+        self.topic = topic
+        self.payload = payload
+        self.firestore_ts = firestore_ts
+        self.received_at = received_at
+        self.deadline = deadline
+        self.first_published = None
+        self.last_published = None
+        self.attempts = 0
+
+
+class CommandDispatcher:
+    """
+    Delivers control commands saved by the Firebase listener to the ESP32 devices.
+    - Picks up 'pending' control_commands rows and publishes them on room/<room>/device/<device>/control.
+    - Tracks acks from room/<room>/device/<device>/ack, republishing after ACK_TIMEOUT_S up to MAX_ATTEMPTS,
+      and expires commands not acknowledged within COMMAND_DEADLINE_S.
+    - Records Firestore write -> server receive -> MQTT publish -> device ack timestamps per command
+      and feeds every stage into a latency histogram.
+    """
+
+    def __init__(self, db_path, publish, poll_interval=POLL_INTERVAL_S, ack_timeout=ACK_TIMEOUT_S,
+                 max_attempts=MAX_ATTEMPTS, deadline=COMMAND_DEADLINE_S, qos=PUBLISH_QOS):
+        """
+        Args:
+            db_path (str): The file path to the local SQLite database.
+            publish (callable): publish(topic, payload, qos), e.g. a paho client's publish method.
+            poll_interval (float): Seconds between two checks for pending commands.
+            ack_timeout (float): Seconds to wait for an ack before republishing.
+            max_attempts (int): Publishes per command before it is marked failed.
+            deadline (float): Seconds after server receive after which a command is expired.
+            qos (int): MQTT QoS of the control messages.
+        """
+        self.db_path = db_path
+        self.publish = publish
+        self.poll_interval = poll_interval
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.qos = qos
+
+        self._acks = queue.Queue()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._in_flight = {}
+        self._rooms = {}
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"dispatched": 0, "publishes": 0, "retries": 0, "publish_errors": 0, "acknowledged": 0,
+                       "failed": 0, "expired": 0, "late_acks": 0, "invalid_acks": 0}
+        self.histograms = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+
+    # ---------- Public API ----------
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="CommandDispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def notify(self):
+        """
+        Wakes the dispatcher up now instead of at the next poll, e.g. right after a command was saved.
+        """
+        self._wakeup.set()
+
+    def on_ack(self, topic, payload, recv_ts=None):
+        """
+        Queues a device ack. Safe to call from the paho network thread.
+        """
+        self._acks.put((topic, payload, time.time() if recv_ts is None else recv_ts))
+        self._wakeup.set()
+
+    def on_message(self, client, userdata, msg):
+        """ paho callback, register with client.message_callback_add(ACK_TOPIC, dispatcher.on_message). """
+        self.on_ack(msg.topic, msg.payload)
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+            s["latency"] = {stage: h.summary() for stage, h in self.histograms.items()}
+        s["in_flight"] = len(self._in_flight)
+        p99 = s["latency"]["end_to_end"]["p99_ms"]
+        s["p99_within_target"] = None if p99 is None else p99 <= LATENCY_TARGET_MS
+        return s
+
+    # ---------- Dispatcher thread ----------
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA busy_timeout=5000")
+        try:
+            ensure_dispatch_schema(conn)
+            self._resume_in_flight(conn)
+            while not self._stop.is_set():
+                try:
+                    self._process_acks(conn)
+                    self._dispatch_pending(conn)
+                    self._check_timeouts(conn)
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    print(f"SQLite error in command dispatcher: {e}")
+                self._wakeup.wait(self._next_wait())
+                self._wakeup.clear()
+            self._process_acks(conn)
+        finally:
+            conn.close()
+
+    def _next_wait(self):
+        wait = self.poll_interval
+        if self._in_flight:
+            now = time.time()
+            for entry in self._in_flight.values():
+                wait = min(wait, entry.last_published + self.ack_timeout - now, entry.deadline - now)
+        return max(wait, 0.0)
+
+    def _room_of(self, conn, device_id):
+        if device_id not in self._rooms:
+            row = conn.execute("SELECT room_id FROM devices WHERE device_id = ?", (device_id,)).fetchone()
+            self._rooms[device_id] = row[0] if row else None
+        return self._rooms[device_id]
+
+    def _resume_in_flight(self, conn):
+        """
+        Reloads commands that were published but not acknowledged before a restart.
+        """
+        now = time.time()
+        rows = conn.execute("""
+            SELECT command_id, device_id, timestamp, command, received_at, published_at, attempts
+            FROM control_commands WHERE status = ?
+        """, (DISPATCHED,)).fetchall()
+        for command_id, device_id, timestamp, command, received_at, published_at, attempts in rows:
+            entry = self._new_entry(conn, command_id, device_id, timestamp, command, received_at or now)
+            if entry is None:
+                continue
+            entry.first_published = entry.last_published = published_at or now
+            entry.attempts = attempts or 1
+            self._in_flight[entry.command_id] = entry
+
+    def _new_entry(self, conn, command_id, device_id, timestamp, command, received_at):
+        room_id = self._room_of(conn, device_id)
+        if room_id is None:
+            self._finish(conn, str(command_id), device_id, command, FAILED, "unknown device", None)
+            return None
+        payload = json.dumps({"command_id": str(command_id), "command": command})
+        return _InFlight(str(command_id), device_id, command, CONTROL_TOPIC.format(room_id=room_id, device_id=device_id),
+                         payload, to_epoch(timestamp), received_at, received_at + self.deadline)
+
+    def _dispatch_pending(self, conn):
+        rows = conn.execute(PENDING_QUERY, (PENDING, DISPATCH_BATCH)).fetchall()
+        if not rows:
+            return
+        now = time.time()
+        published = []
+        for command_id, device_id, timestamp, command, received_at in rows:
+            entry = self._new_entry(conn, command_id, device_id, timestamp, command, received_at or now)
+            if entry is None:
+                continue
+            if now >= entry.deadline:
+                # Stale HVAC actions are worse than none: do not send them at all
+                self._finish(conn, entry.command_id, device_id, command, EXPIRED, "deadline passed before dispatch", None)
+                continue
+            self._publish(entry)
+            self._in_flight[entry.command_id] = entry
+            published.append((DISPATCHED, entry.first_published, entry.attempts, entry.received_at, command_id))
+        with conn:
+            conn.executemany(
+                "UPDATE control_commands SET status = ?, published_at = ?, attempts = ?, received_at = ? "
+                "WHERE command_id = ?", published)
+        with self._stats_lock:
+            self._stats["dispatched"] += len(published)
+
+    def _publish(self, entry):
+        now = time.time()
+        entry.attempts += 1
+        entry.last_published = now
+        if entry.first_published is None:
+            entry.first_published = now
+        try:
+            info = self.publish(entry.topic, entry.payload, self.qos)
+            ok = getattr(info, "rc", 0) == 0
+        except Exception as e:
+            print(f"  - Failed to publish command {entry.command_id}: {e}")
+            ok = False
+        with self._stats_lock:
+            self._stats["publishes"] += 1
+            self._stats["retries"] += int(entry.attempts > 1)
+            self._stats["publish_errors"] += int(not ok)
+
+    def _check_timeouts(self, conn):
+        now = time.time()
+        for entry in list(self._in_flight.values()):
+            if now >= entry.deadline:
+                del self._in_flight[entry.command_id]
+                self._finish(conn, entry.command_id, entry.device_id, entry.command, EXPIRED, "no ack before deadline", None)
+            elif now - entry.last_published >= self.ack_timeout:
+                if entry.attempts >= self.max_attempts:
+                    del self._in_flight[entry.command_id]
+                    self._finish(conn, entry.command_id, entry.device_id, entry.command, FAILED,
+                                 f"no ack after {entry.attempts} attempts", None)
+                else:
+                    self._publish(entry)
+                    with conn:
+                        conn.execute("UPDATE control_commands SET attempts = ? WHERE command_id = ?",
+                                     (entry.attempts, entry.command_id))
+
+    def _process_acks(self, conn):
+        while True:
+            try:
+                topic, payload, acked_at = self._acks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                ack = json.loads(payload)
+                command_id = str(ack["command_id"])
+            except (ValueError, KeyError, TypeError):
+                with self._stats_lock:
+                    self._stats["invalid_acks"] += 1
+                continue
+
+            entry = self._in_flight.pop(command_id, None)
+            if entry is None:
+                # Duplicate ack of a republished command, or an ack after the command was given up on
+                with self._stats_lock:
+                    self._stats["late_acks"] += 1
+                continue
+            ok = str(ack.get("status", "ok")).lower() in ("ok", "success", "done")
+            self._finish(conn, command_id, entry.device_id, entry.command,
+                         ACKNOWLEDGED if ok else FAILED, ack.get("response"), acked_at)
+            if ok:
+                self._record_latency(entry, acked_at)
+
+    def _record_latency(self, entry, acked_at):
+        origin = entry.firestore_ts if entry.firestore_ts is not None else entry.received_at
+        with self._stats_lock:
+            if entry.firestore_ts is not None:
+                self.histograms["firestore_to_server"].record((entry.received_at - entry.firestore_ts) * 1000)
+            self.histograms["server_to_publish"].record((entry.first_published - entry.received_at) * 1000)
+            self.histograms["publish_to_ack"].record((acked_at - entry.last_published) * 1000)
+            self.histograms["end_to_end"].record((acked_at - origin) * 1000)
+
+    def _finish(self, conn, command_id, device_id, command, status, response, acked_at):
+        with conn:
+            conn.execute("UPDATE control_commands SET status = ?, executed_at = ?, response = ? WHERE command_id = ?",
+                         (status, acked_at, None if response is None else str(response), command_id))
+            conn.execute("UPDATE realtime_state SET latest_command = ?, last_command_status = ? WHERE device_id = ?",
+                         (command, status, device_id))
+        with self._stats_lock:
+            self._stats[status] += 1
+
+
+# --- Simulation: loopback devices ---
+def run_simulation(commands, devices, ack_delay_ms, drop_rate, firestore_delay_ms, db_path=None):
+    """
+    Feeds synthetic commands through a CommandDispatcher whose publish() is answered by simulated
+    devices, and prints the per-stage latency histograms.
+
+    Args:
+        commands (int): Number of commands written to control_commands.
+        devices (int): Number of devices the commands are spread over.
+        ack_delay_ms (float): Mean device processing + network delay before the ack.
+        drop_rate (float): Fraction of control messages lost (exercises the retry path).
+        firestore_delay_ms (float): Simulated delay between the Firestore write and the server receiving it.
+        db_path (str): Database to write into, defaults to a throwaway temp file.
+    """
+    cleanup = db_path is None
+    if cleanup:
+        fd, db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS devices (device_id INTEGER PRIMARY KEY, device_name TEXT, device_type TEXT,
+                                            seat_id INTEGER, room_id INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS control_commands (command_id TEXT PRIMARY KEY NOT NULL, device_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL, command TEXT NOT NULL, source TEXT NOT NULL, status TEXT NOT NULL,
+            executed_at TEXT, response TEXT);
+        CREATE TABLE IF NOT EXISTS realtime_state (device_id INTEGER PRIMARY KEY, last_update TEXT,
+            temperature REAL, humidity REAL, occupancy INTEGER, power_usage REAL, latest_command TEXT,
+            last_command_status TEXT);
+    """)
+    conn.executemany("INSERT OR IGNORE INTO devices VALUES (?, ?, 'ac', NULL, ?)",
+                     [(d, f"ac-{d}", 1 + d % 4) for d in range(1, devices + 1)])
+    conn.commit()
+    ensure_dispatch_schema(conn)
+
+    rng = random.Random(0)
+    dispatcher = None
+
+    def device_publish(topic, payload, qos):
+        if rng.random() < drop_rate:
+            return None
+        command_id = json.loads(payload)["command_id"]
+        ack_topic = topic.rsplit("/", 1)[0] + "/ack"
+        delay = rng.expovariate(1000.0 / ack_delay_ms)
+        threading.Timer(delay, dispatcher.on_ack,
+                        (ack_topic, json.dumps({"command_id": command_id, "status": "ok"}))).start()
+        return None
+
+    dispatcher = CommandDispatcher(db_path, device_publish, ack_timeout=0.2).start()
+    try:
+        for i in range(commands):
+            received_at = time.time()
+            firestore_ts = received_at - rng.expovariate(1000.0 / firestore_delay_ms)
+            with conn:
+                conn.execute(
+                    "INSERT INTO control_commands (command_id, device_id, timestamp, command, source, status, received_at) "
+                    "VALUES (?, ?, ?, ?, 'dashboard', ?, ?)",
+                    (f"cmd-{i}", 1 + i % devices, datetime.fromtimestamp(firestore_ts).isoformat(),
+                     "fan_speed:low", PENDING, received_at))
+            dispatcher.notify()
+            time.sleep(0.002)
+
+        settle = time.time() + COMMAND_DEADLINE_S
+        while time.time() < settle:
+            s = dispatcher.stats()
+            if s["acknowledged"] + s["failed"] + s["expired"] >= commands:
+                break
+            time.sleep(0.05)
+    finally:
+        dispatcher.stop()
+        conn.close()
+        if cleanup:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+    stats = dispatcher.stats()
+    print(f"Dispatched {stats['dispatched']} commands: {stats['acknowledged']} acknowledged, "
+          f"{stats['failed']} failed, {stats['expired']} expired, {stats['retries']} retries")
+    for stage in LATENCY_STAGES:
+        h = stats["latency"][stage]
+        if h["count"]:
+            print(f"  - {stage:<20} p50 {h['p50_ms']:8.1f} ms   p90 {h['p90_ms']:8.1f} ms   "
+                  f"p99 {h['p99_ms']:8.1f} ms   max {h['max_ms']:8.1f} ms")
+    print(f"p99 end-to-end within {LATENCY_TARGET_MS:.0f} ms: {stats['p99_within_target']}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate command dispatch to ESP32 devices and report latency.")
+    parser.add_argument("--commands", type=int, default=1000)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--ack-delay-ms", type=float, default=30.0)
+    parser.add_argument("--drop-rate", type=float, default=0.01)
+    parser.add_argument("--firestore-delay-ms", type=float, default=80.0)
+    parser.add_argument("--db", default=None, help="database path (default: temporary file)")
+    args = parser.parse_args()
+    run_simulation(args.commands, args.devices, args.ack_delay_ms, args.drop_rate, args.firestore_delay_ms, args.db)
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from ingest_writer import IngestWriter
+from mqtt_gateway import MQTTGateway, BrokerConfig
+from topic_router import build_default_router
+
+
+class FakeMessage:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class FakeBrokerClient:
+    """
+    In-process stand-in for a broker connection: publishes synthetic ESP32 readings as fast as
+    the gateway consumes them, optionally dropping the connection after a number of messages.
+    """
+
+    def __init__(self, config, rooms, devices_per_room, messages, disconnect_every=None, state=None):
+        self.config = config
+        self.rooms = rooms
+        self.devices_per_room = devices_per_room
+        self.disconnect_every = disconnect_every
+        # Shared across reconnects so the publisher resumes where it stopped
+        self.state = state if state is not None else {"sent": 0, "total": messages}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def subscribe(self, topic):
+        pass
+
+    @property
+    def messages(self):
+        return self._publish()
+
+    async def _publish(self):
+        state = self.state
+        since_connect = 0
+        while state["sent"] < state["total"]:
+            i = state["sent"]
+            room = i % self.rooms
+            device = room * self.devices_per_room + (i // self.rooms) % self.devices_per_room
+            payload = json.dumps({
+                "temperature": 24.0 + (i % 40) / 10,
+                "humidity": 70.0,
+                "occupancy": i % 15,
+                "power_usage": 1.5,
+            }).encode()
+            state["sent"] += 1
+            since_connect += 1
+            yield FakeMessage(f"room/{room}/device/{device}/sensor", payload)
+            if since_connect % 256 == 0:
+                # Give the other broker tasks and the persistence task a turn
+                await asyncio.sleep(0)
+            if self.disconnect_every and since_connect >= self.disconnect_every:
+                raise ConnectionError("simulated broker disconnect")
+        # Stay connected but idle once everything has been published
+        await asyncio.Event().wait()
+
+
+async def run_loadtest(brokers, rooms, devices_per_room, messages, disconnect_every=None, db_path=None):
+    """
+    Drives the gateway with one fake publisher per broker and reports end-to-end throughput,
+    measured until every reading has been committed by the writer.
+    """
+    cleanup = db_path is None
+    if cleanup:
+        fd, db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+
+    per_broker = messages // brokers
+    states = {}
+
+    def factory(config):
+        state = states.setdefault(config.name, {"sent": 0, "total": per_broker})
+        return FakeBrokerClient(config, rooms, devices_per_room, per_broker, disconnect_every, state)
+
+    router = build_default_router()
+    writer = IngestWriter(db_path, create_schema=True, tables=router.tables())
+    configs = [BrokerConfig(name=f"segment-{b}", host="fake") for b in range(brokers)]
+    gateway = MQTTGateway(configs, writer, client_factory=factory, router=router)
+
+    started = time.perf_counter()
+    await gateway.start()
+    total = per_broker * brokers
+    while gateway.persisted + gateway.persist_failed < total:
+        await asyncio.sleep(0.01)
+    await gateway.stop()
+    await asyncio.get_running_loop().run_in_executor(None, writer.close)
+    elapsed = time.perf_counter() - started
+
+    stats = gateway.stats()
+    print(f"Ingested {stats['writer']['rows_written']} readings from {brokers} brokers, "
+          f"{rooms * devices_per_room} devices in {elapsed:.2f}s ({total / elapsed:,.0f} msgs/s)")
+    for name, s in stats["brokers"].items():
+        print(f"  - {name}: {s['messages']} msgs, {s['connects']} connects, {s['disconnects']} disconnects")
+    print(f"  - writer: {stats['writer']['flushes']} flushes, avg batch {stats['writer']['avg_batch_rows']:.0f} rows, "
+          f"avg flush {stats['writer']['avg_flush_latency_ms']:.2f} ms")
+
+    if cleanup:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the asyncio MQTT gateway with in-process fake brokers.")
+    parser.add_argument("--brokers", type=int, default=4)
+    parser.add_argument("--rooms", type=int, default=250)
+    parser.add_argument("--devices-per-room", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--disconnect-every", type=int, default=None,
+                        help="simulate a broker disconnect after this many messages per connection")
+    args = parser.parse_args()
+    asyncio.run(run_loadtest(args.brokers, args.rooms, args.devices_per_room, args.messages, args.disconnect_every))
@@ -0,0 +1,235 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from topic_router import build_default_router
+
+# --- CONFIGURATION PARAMETERS ---
+MAX_RAW_QUEUE = 10000       # Raw MQTT messages waiting to be decoded
+DECODE_WORKERS = 4
+BLOCK_TIMEOUT_S = 1.0       # How long the paho thread may wait under the 'block' policy
+SPILL_REPLAY_INTERVAL_S = 0.5
+
+# Backpressure policies applied when the raw queue is full
+DROP_OLDEST = "drop_oldest"  # Discard the oldest queued message to make room for the new one
+BLOCK = "block"              # Block the paho network thread (up to BLOCK_TIMEOUT_S, then drop the new message)
+SPILL = "spill"              # Append the overflow to a file on disk and replay it once the queue drains
+POLICIES = (DROP_OLDEST, BLOCK, SPILL)
+
+_STOP = object()
+
+
+class IngestPipeline:
+    """
+    Staged MQTT ingest pipeline that keeps database I/O off the paho network thread.
+    - Receive: on_message only enqueues raw (topic, payload, recv_ts) into a bounded queue.
+    - Decode: a thread pool routes, parses and validates the raw messages.
+    - Persist: decoded readings are handed to an IngestWriter, which commits them in batches.
+    """
+
+    def __init__(self, writer, policy=DROP_OLDEST, max_raw=MAX_RAW_QUEUE, decode_workers=DECODE_WORKERS,
+                 spill_path=None, block_timeout=BLOCK_TIMEOUT_S, router=None):
+        """
+        Args:
+            writer (IngestWriter): Persistence stage receiving the decoded readings.
+            policy (str): Backpressure policy when the raw queue is full, one of POLICIES.
+            max_raw (int): Capacity of the raw message queue.
+            decode_workers (int): Number of decode threads.
+            spill_path (str): Overflow file used by the 'spill' policy.
+            block_timeout (float): Maximum wait of the paho thread under the 'block' policy.
+            router (TopicRouter): Topic router/decoder, defaults to build_default_router().
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{policy}', expected one of {POLICIES}")
+        if policy == SPILL and not spill_path:
+            raise ValueError("The 'spill' policy requires a spill_path")
+
+        self.writer = writer
+        self.policy = policy
+        self.decode_workers = decode_workers
+        self.spill_path = spill_path
+        self.block_timeout = block_timeout
+        self.router = router if router is not None else build_default_router()
+        missing = [spec.name for spec in self.router.tables() if spec.name not in writer.tables]
+        if missing:
+            raise ValueError(f"The writer does not accept the router's tables {missing}, "
+                             f"build it with IngestWriter(..., tables=router.tables())")
+
+        self._raw = queue.Queue(maxsize=max_raw)
+        self._overflow_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._spill_offset = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "received": 0,
+            "decoded": 0,
+            "invalid": 0,
+            "persist_failed": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "raw_queue_max": 0,
+        }
+        self._executor = None
+        self._stop_spill = threading.Event()
+        self._spill_thread = None
+
+    # ---------- Lifecycle ----------
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix="IngestDecode")
+        for _ in range(self.decode_workers):
+            self._executor.submit(self._decode_loop)
+        if self.policy == SPILL:
+            self._spill_thread = threading.Thread(target=self._replay_loop, name="IngestSpillReplay", daemon=True)
+            self._spill_thread.start()
+        return self
+
+    def stop(self):
+        """
+        Drains the raw queue and the spill file, stops the decode workers, then closes the writer.
+        """
+        if self._spill_thread is not None:
+            self._stop_spill.set()
+            self._spill_thread.join()
+            self._replay_spill(drain=True)
+        if self._executor is not None:
+            for _ in range(self.decode_workers):
+                self._raw.put(_STOP)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.writer.close()
+
+    # ---------- Receive stage (paho network thread) ----------
+    def enqueue(self, topic, payload, recv_ts=None):
+        """
+        Hands one raw MQTT message to the pipeline. Never touches the database.
+        """
+        item = (topic, bytes(payload), recv_ts if recv_ts is not None else time.time())
+        self._count("received")
+
+        try:
+            self._raw.put_nowait(item)
+        except queue.Full:
+            self._handle_overflow(item)
+
+        depth = self._raw.qsize()
+        if depth > self._stats["raw_queue_max"]:
+            with self._stats_lock:
+                self._stats["raw_queue_max"] = max(self._stats["raw_queue_max"], depth)
+
+    def on_message(self, client, userdata, msg):
+        """
+        Drop-in paho on_message callback.
+        """
+        self.enqueue(msg.topic, msg.payload)
+
+    def _handle_overflow(self, item):
+        if self.policy == BLOCK:
+            try:
+                self._raw.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self._count("dropped")
+        elif self.policy == DROP_OLDEST:
+            with self._overflow_lock:
+                while True:
+                    try:
+                        self._raw.get_nowait()
+                        self._count("dropped")
+                    except queue.Empty:
+                        pass
+                    try:
+                        self._raw.put_nowait(item)
+                        break
+                    except queue.Full:
+                        continue
+        else:
+            self._spill(item)
+
+    # ---------- Spill to disk ----------
+    def _spill(self, item):
+        topic, payload, recv_ts = item
+        record = json.dumps({"topic": topic, "payload": payload.decode("latin-1"), "recv_ts": recv_ts})
+        with self._spill_lock:
+            # Binary mode: tell()/seek() in _replay_spill are plain byte offsets
+            with open(self.spill_path, "ab") as f:
+                f.write(record.encode("utf-8") + b"\n")
+        self._count("spilled")
+
+    def _replay_loop(self):
+        while not self._stop_spill.wait(SPILL_REPLAY_INTERVAL_S):
+            self._replay_spill()
+
+    def _replay_spill(self, drain=False):
+        """
+        Moves spilled messages back into the raw queue while it has room.
+        The file is removed once everything in it has been replayed. Replayed messages can be older than
+        live ones already persisted; the writer's realtime_state upsert ignores readings older than the stored state.
+        """
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return
+            with open(self.spill_path, "rb") as f:
+                f.seek(self._spill_offset)
+                while True:
+                    if not drain and self._raw.full():
+                        break
+                    line = f.readline()
+                    if not line:
+                        break
+                    record = json.loads(line)
+                    item = (record["topic"], record["payload"].encode("latin-1"), record["recv_ts"])
+                    if drain:
+                        self._raw.put(item)
+                    else:
+                        try:
+                            self._raw.put_nowait(item)
+                        except queue.Full:
+                            break
+                    self._spill_offset = f.tell()
+                    self._count("replayed")
+                at_end = f.tell() == os.fstat(f.fileno()).st_size and self._spill_offset == f.tell()
+            if at_end:
+                os.remove(self.spill_path)
+                self._spill_offset = 0
+
+    # ---------- Decode stage ----------
+    def _decode_loop(self):
+        while True:
+            item = self._raw.get()
+            if item is _STOP:
+                return
+            topic, payload, recv_ts = item
+            try:
+                route, record = self.router.decode(topic, payload)
+            except (ValueError, UnicodeDecodeError) as e:
+                self._count("invalid")
+                print(f"Error processing message on {topic}: {e}")
+                continue
+            try:
+                # Blocks when the persistence queue is full, which backs up into the raw queue
+                route.persist(self.writer, record, recv_ts)
+            except Exception as e:
+                # Keep the worker alive: dead decode workers would fill the raw queue and hang stop()
+                self._count("persist_failed")
+                print(f"Error persisting message on {topic}: {e!r}")
+                continue
+            self._count("decoded")
+
+    # ---------- Metrics ----------
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def stats(self):
+        """
+        Returns counters and queue depths for every stage.
+        """
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["raw_queue_depth"] = self._raw.qsize()
+        snapshot["persist_queue_depth"] = self.writer.queue_depth()
+        snapshot["writer"] = self.writer.stats()
+        return snapshot
@@ -0,0 +1,374 @@
+import sqlite3
+import threading
+import queue
+import time
+import os
+import tempfile
+import argparse
+from collections import namedtuple
+
+# --- CONFIGURATION PARAMETERS ---
+FLUSH_INTERVAL_S = 0.2      # Flush at least every 200 ms ...
+MAX_BATCH_ROWS = 500        # ... or as soon as 500 readings are queued
+MAX_QUEUE_SIZE = 50000      # Readings held in memory before submit() blocks
+LOCKED_RETRIES = 5          # Retries of a batch while another writer holds the database lock
+
+SENSOR_TABLE = "sensor_data"
+SENSOR_FIELDS = ("temperature", "humidity", "occupancy", "power_usage")
+
+# Extra append-only table fed by the ingest path. Rows are (device_id, timestamp, *columns).
+TableSpec = namedtuple("TableSpec", ["name", "columns", "ddl"])
+
+INSERT_SENSOR_DATA = """
+    INSERT INTO sensor_data (device_id, timestamp, temperature, humidity, occupancy, power_usage)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Readings can reach the writer out of order (parallel decode workers, spill replay): an older reading never
+# replaces a newer state. CAST keeps the comparison numeric in databases that declare last_update TEXT.
+UPSERT_REALTIME_STATE = """
+    INSERT INTO realtime_state (device_id, last_update, temperature, humidity, occupancy, power_usage)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(device_id) DO UPDATE SET
+        last_update=excluded.last_update,
+        temperature=excluded.temperature,
+        humidity=excluded.humidity,
+        occupancy=excluded.occupancy,
+        power_usage=excluded.power_usage
+    WHERE CAST(excluded.last_update AS REAL) >= CAST(realtime_state.last_update AS REAL)
+"""
+
+# Layout of the tables in BackendDatabase.db, used to bootstrap empty databases. timestamp/last_update are
+# declared REAL because the writer stores epoch seconds (BackendDatabase.db declares them TEXT)
+INGEST_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sensor_data (
+        reading_id INTEGER PRIMARY KEY, device_id INTEGER NOT NULL REFERENCES devices (device_id),
+        timestamp REAL NOT NULL, temperature REAL, humidity REAL, occupancy INTEGER, power_usage REAL
+    );
+    CREATE TABLE IF NOT EXISTS realtime_state (
+        device_id INTEGER REFERENCES devices (device_id) NOT NULL PRIMARY KEY, last_update REAL NOT NULL,
+        temperature REAL, humidity REAL, occupancy INTEGER, power_usage REAL,
+        latest_command TEXT, last_command_status TEXT
+    );
+"""
+
+_STOP = object()
+
+
+def sensor_row(device_id, data, timestamp):
+    """
+    Builds the parameter tuple shared by the sensor_data insert and the realtime_state upsert.
+    """
+    return (device_id, float(timestamp)) + tuple(data.get(field) for field in SENSOR_FIELDS)
+
+
+def insert_sql(spec):
+    columns = ("device_id", "timestamp") + tuple(spec.columns)
+    return f"INSERT INTO {spec.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+class IngestWriter:
+    """
+    Batched SQLite writer for the MQTT ingest path.
+    - Owns a single long-lived connection (WAL mode) on a dedicated writer thread.
+    - Queues decoded sensor payloads and flushes them with executemany() in one
+      transaction every FLUSH_INTERVAL_S seconds or MAX_BATCH_ROWS rows, whichever comes first.
+    - Collapses several realtime_state upserts for the same device within a batch into one.
+    - Optionally appends records to extra tables (TableSpec) in the same transaction.
+    - Optionally keeps a TimeSeriesStore's rollups up to date in the same transaction.
+    """
+
+    def __init__(self, db_path, flush_interval=FLUSH_INTERVAL_S, max_batch=MAX_BATCH_ROWS,
+                 max_queue=MAX_QUEUE_SIZE, create_schema=False, tables=(), store=None):
+        """
+        Opens the writer connection and starts the writer thread.
+
+        Args:
+            db_path (str): The file path to the local SQLite database.
+            flush_interval (float): Maximum time in seconds a reading waits before being committed.
+            max_batch (int): Maximum number of readings committed in one transaction.
+            max_queue (int): Maximum number of readings waiting in memory; submit() blocks beyond it.
+            create_schema (bool): Create sensor_data/realtime_state if they do not exist yet.
+            tables (iterable[TableSpec]): Extra tables accepted by submit_record(), created if missing.
+            store (TimeSeriesStore): Rollup/retention layer updated with every flushed batch.
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.create_schema = create_schema
+        self.tables = {spec.name: spec for spec in tables}
+        self.store = store
+        self._insert_sql = {name: insert_sql(spec) for name, spec in self.tables.items()}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+        self._ready = threading.Event()
+        self._open_error = None
+        self._thread = threading.Thread(target=self._run, name="IngestWriter", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._open_error is not None:
+            raise self._open_error
+
+    # ---------- Public API ----------
+    def submit(self, device_id, data, timestamp=None):
+        """
+        Queues one decoded sensor payload for the next batch.
+
+        Args:
+            device_id (int): The device the reading belongs to.
+            data (dict): Decoded payload with temperature/humidity/occupancy/power_usage keys.
+            timestamp (float): Receive time of the reading, defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self._queue.put((SENSOR_TABLE, sensor_row(device_id, data, timestamp)))
+
+    def submit_record(self, table, values, timestamp=None):
+        """
+        Queues one row for an extra table registered through `tables`.
+
+        Args:
+            table (str): Name of the registered table.
+            values (tuple): (device_id, *columns) in the TableSpec column order.
+            timestamp (float): Receive time of the reading, defaults to now.
+        """
+        if table not in self._insert_sql:
+            raise KeyError(f"Table '{table}' is not registered with this writer")
+        if timestamp is None:
+            timestamp = time.time()
+        self._queue.put((table, (values[0], float(timestamp)) + tuple(values[1:])))
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        Returns a snapshot of the flush counters.
+        """
+        with self._stats_lock:
+            flushes = self._stats["flushes"]
+            return {
+                **self._stats,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_rows": self._stats["rows_written"] / flushes if flushes else 0.0,
+                "avg_flush_latency_ms": self._stats["flush_time_s"] * 1000 / flushes if flushes else 0.0,
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
+
+    def close(self):
+        """
+        Flushes everything still queued, then stops the writer thread and closes the connection.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ---------- Writer thread ----------
+    def _reset_stats(self):
+        self._stats = {
+            "flushes": 0,
+            "rows_written": 0,
+            "state_rows_written": 0,
+            "failed_flushes": 0,
+            "rows_dropped": 0,
+            "locked_retries": 0,
+            "last_batch_rows": 0,
+            "max_batch_rows": 0,
+            "last_flush_latency_ms": 0.0,
+            "max_flush_latency_ms": 0.0,
+            "flush_time_s": 0.0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only fsyncs at checkpoints, which is safe against application crashes
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if self.create_schema:
+            conn.executescript(INGEST_SCHEMA)
+        for spec in self.tables.values():
+            conn.executescript(spec.ddl)
+        if self.store is not None:
+            self.store.ensure_schema(conn)
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            print(f"Error opening ingest database at {self.db_path}: {e}")
+            self._open_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        stopping = False
+        try:
+            while not stopping:
+                batch = []
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+
+                # Keep collecting until the batch is full or the oldest reading is due
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                self._flush(conn, batch)
+
+            # Drain anything submitted after the stop marker was queued
+            leftovers = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    leftovers.append(item)
+            for start in range(0, len(leftovers), self.max_batch):
+                self._flush(conn, leftovers[start:start + self.max_batch])
+        finally:
+            conn.close()
+
+    def _flush(self, conn, batch):
+        """
+        Commits one batch: every reading goes to sensor_data, only the newest reading
+        per device goes to realtime_state, extra-table records go to their own table.
+        """
+        sensor_rows = []
+        latest_per_device = {}
+        other_rows = {}
+        for table, row in batch:
+            if table == SENSOR_TABLE:
+                sensor_rows.append(row)
+                # Newest by timestamp, not by arrival: readings can reach the writer out of order
+                latest = latest_per_device.get(row[0])
+                if latest is None or row[1] >= latest[1]:
+                    latest_per_device[row[0]] = row
+            else:
+                other_rows.setdefault(table, []).append(row)
+
+        started = time.perf_counter()
+        for attempt in range(LOCKED_RETRIES + 1):
+            try:
+                with conn:
+                    if sensor_rows:
+                        conn.executemany(INSERT_SENSOR_DATA, sensor_rows)
+                        conn.executemany(UPSERT_REALTIME_STATE, latest_per_device.values())
+                        if self.store is not None:
+                            self.store.apply_batch(conn, sensor_rows)
+                    for table, rows in other_rows.items():
+                        conn.executemany(self._insert_sql[table], rows)
+                break
+            except sqlite3.Error as e:
+                # The command dispatcher and the Firebase writer share the file: wait out their locks
+                if isinstance(e, sqlite3.OperationalError) and "locked" in str(e) and attempt < LOCKED_RETRIES:
+                    with self._stats_lock:
+                        self._stats["locked_retries"] += 1
+                    time.sleep(0.01 * (2 ** attempt))
+                    continue
+                print(f"SQLite error while flushing {len(batch)} readings, dropping them: {e}")
+                with self._stats_lock:
+                    self._stats["failed_flushes"] += 1
+                    self._stats["rows_dropped"] += len(batch)
+                return
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        if self.store is not None:
+            try:
+                self.store.maybe_prune(conn)
+            except sqlite3.Error as e:
+                print(f"SQLite error while pruning old readings: {e}")
+
+        with self._stats_lock:
+            s = self._stats
+            s["flushes"] += 1
+            s["rows_written"] += len(batch)
+            s["state_rows_written"] += len(latest_per_device)
+            s["last_batch_rows"] = len(batch)
+            s["max_batch_rows"] = max(s["max_batch_rows"], len(batch))
+            s["last_flush_latency_ms"] = latency_ms
+            s["max_flush_latency_ms"] = max(s["max_flush_latency_ms"], latency_ms)
+            s["flush_time_s"] += latency_ms / 1000
+
+
+# --- Benchmark: synthetic publisher ---
+def run_benchmark(messages, devices, rate=None, db_path=None):
+    """
+    Pushes synthetic ESP32 readings through an IngestWriter and reports the sustained throughput.
+
+    Args:
+        messages (int): Total number of readings to publish.
+        devices (int): Number of distinct device ids the readings are spread over.
+        rate (float): Target messages per second, or None for as fast as possible.
+        db_path (str): Database to write into, defaults to a throwaway temp file.
+    """
+    cleanup = db_path is None
+    if cleanup:
+        fd, db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+
+    try:
+        writer = IngestWriter(db_path, create_schema=True)
+        interval = 1.0 / rate if rate else 0.0
+        started = time.perf_counter()
+        for i in range(messages):
+            writer.submit(1 + i % devices, {
+                "temperature": 24.0 + (i % 50) / 10,
+                "humidity": 70.0,
+                "occupancy": i % 20,
+                "power_usage": 1.5,
+            })
+            if interval:
+                sleep_for = started + (i + 1) * interval - time.perf_counter()
+                if sleep_for > 0:
+                    time.sleep(sleep_for)
+        writer.close()
+        elapsed = time.perf_counter() - started
+
+        stats = writer.stats()
+        print(f"Wrote {stats['rows_written']} readings from {devices} devices in {elapsed:.2f}s "
+              f"({stats['rows_written'] / elapsed:,.0f} msgs/s)")
+        print(f"  - flushes: {stats['flushes']}, avg batch: {stats['avg_batch_rows']:.1f} rows, "
+              f"max batch: {stats['max_batch_rows']} rows")
+        print(f"  - flush latency avg: {stats['avg_flush_latency_ms']:.2f} ms, "
+              f"max: {stats['max_flush_latency_ms']:.2f} ms")
+        return stats
+    finally:
+        if cleanup:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the batched SQLite ingest writer.")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=None, help="messages per second (default: unthrottled)")
+    parser.add_argument("--db", default=None, help="database path (default: temporary file)")
+    args = parser.parse_args()
+    run_benchmark(args.messages, args.devices, args.rate, args.db)
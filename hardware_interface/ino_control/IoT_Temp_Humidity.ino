@@ -7,6 +7,13 @@ const char* ssid = "WIFI ID HERE";
 const char* password = "PASSWORD HERE";
 const char* mqtt_server = "MQTT BROKER IP HERE";
 
+// ----------- Device Identity (must match the devices table)
+#define ROOM_ID 1
+#define DEVICE_ID 1
+char control_topic[64];
+char ack_topic[64];
+char condition_topic[64];
+
 WiFiClient espClient;
 PubSubClient client(espClient);
 
@@ -27,6 +34,26 @@ void callback(char* topic, byte* payload, unsigned int length)
   }
   Serial.println();
   // INSERT COMMAND HANDLING HERE.
+
+  // Acknowledge the command so the server's dispatcher stops retrying it.
+  // Payload: { "command_id": "<id>", "command": "<command>" }
+  char message[256];
+  unsigned int n = length < sizeof(message) - 1 ? length : sizeof(message) - 1;
+  memcpy(message, payload, n);
+  message[n] = '\0';
+
+  char* start = strstr(message, "\"command_id\"");
+  if (start == NULL) return;
+  start = strchr(start + 12, '"');
+  if (start == NULL) return;
+  start++;
+  char* end = strchr(start, '"');
+  if (end == NULL) return;
+  *end = '\0';
+
+  char ack[128];
+  snprintf(ack, sizeof(ack), "{ \"command_id\": \"%s\", \"status\": \"ok\" }", start);
+  client.publish(ack_topic, ack);
 }
 
 // ----------- MQTT Reconnect
@@ -39,7 +66,7 @@ void reconnect()
     if (client.connect("ESP32-DHT")) 
     {
       Serial.println("Connected.");
-      client.subscribe("commands/room"); // example subscription
+      client.subscribe(control_topic);
     } 
     else 
     {
@@ -65,6 +92,11 @@ void setup()
   }
   Serial.println("\nWiFi Connected.")
 
+  snprintf(control_topic, sizeof(control_topic), "room/%d/device/%d/control", ROOM_ID, DEVICE_ID);
+  snprintf(ack_topic, sizeof(ack_topic), "room/%d/device/%d/ack", ROOM_ID, DEVICE_ID);
+  // The device level lets the backend store the readings under this device (without it they are anonymous)
+  snprintf(condition_topic, sizeof(condition_topic), "sensors/room_condition/%d", DEVICE_ID);
+
   client.setServer(mqtt_server, 1883);
   client.setCallback(callback);
 }
@@ -97,7 +129,7 @@ void loop()
     char payload[100];
     snprintf(payload, sizeof(payload), "{ \"temperature\": %.2f, \"humidity\": %.2f }", temperature, humidity);
 
-    client.publish("sensors/room_condition", payload);
+    client.publish(condition_topic, payload);
     Serial.println(payload);
   }
 }
@@ -1,71 +1,56 @@
 import paho.mqtt.client as mqtt
 import sqlite3
-import json
 import time
 
+from ingest_writer import IngestWriter, INSERT_SENSOR_DATA, UPSERT_REALTIME_STATE, sensor_row
+from ingest_pipeline import IngestPipeline, DROP_OLDEST
+from topic_router import build_default_router
+from timeseries_store import TimeSeriesStore
+from command_dispatcher import CommandDispatcher, ACK_TOPIC
+
 DB_PATH = "INSERT DATABASE'S PATH HERE"
 
 def set_sensor_data(device_id, data):
-    conn = sqlite3.connection(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute
-    ("""
-        INSERT INTO sensor_data (device_id, timestamp, temperature, humidity, occupancy, power_usage)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-            device_id,
-            str(time.time()), 
-            data.get("temperature"),
-            data.get("humidity"),
-            data.get("occupancy"),
-            data.get("power_usage")
-        )
-    )
+    """
+    Writes a single reading straight to the database (one connection and commit per call).
+    The MQTT loop goes through the batched IngestWriter instead.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    row = sensor_row(device_id, data, time.time())
 
-    cursor.execute
-    ("""
-        INSERT INTO realtime_state (device_id, last_update, temperature, humidity, occupancy, power_usage)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(device_id) DO UPDATE SET
-            last_update=excluded.last_update,
-            temperature=excluded.temperature,
-            humidity=excluded.humidity,
-            occupancy=excluded.occupancy,
-            power_usage=excluded.power_usage
-    """, (
-            device_id,
-            str(time.time()),
-            data.get("temperature"),
-            data.get("humidity"),
-            data.get("occupancy"),
-            data.get("power_usage")
-        )
-    )
+    with conn:
+        conn.execute(INSERT_SENSOR_DATA, row)
+        conn.execute(UPSERT_REALTIME_STATE, row)
 
-    conn.commit()
     conn.close()
 
 def on_connect(client, userdata, flags, rc):
-    print("Connected with NQTT Broker with code : " + rc)
-    client.subscribe("room/+/device/+/sensor")
+    print("Connected with NQTT Broker with code : " + str(rc))
+    for pattern in userdata["pipeline"].router.subscriptions():
+        client.subscribe(pattern)
+    client.subscribe(ACK_TOPIC)
 
 def on_message(client, userdata, msg):
-    try:
-        payload = json.loads(msg.payload.decode())
-        print(f"[ESP32 > SERVER] -- {payload}")
+    # Runs on the paho network thread: only enqueue, decoding and SQLite writes happen in the pipeline
+    userdata["pipeline"].enqueue(msg.topic, msg.payload)
 
-        part = msg.topic.split('/')
-        device_id = int(part[3])
-        
-        set_sensor_data(device_id, payload)
-    
-    except Exception as e:
-        print(f"Error processing message: {e}")
+if __name__ == "__main__":
+    router = build_default_router()
+    writer = IngestWriter(DB_PATH, tables=router.tables(), store=TimeSeriesStore())
+    pipeline = IngestPipeline(writer, policy=DROP_OLDEST, router=router).start()
 
-client = mqtt.Client()
-client.on_connect = on_connect
-client.on_message = on_message 
+    client = mqtt.Client(userdata={"pipeline": pipeline})
+    client.on_connect = on_connect
+    client.on_message = on_message
 
-client.connect("INSERT MQTT BROKER'S IP HERE", 1883, 60)
-client.loop_forever()
\ No newline at end of file
+    # Control commands saved by the Firebase listener go out on room/<room>/device/<device>/control
+    dispatcher = CommandDispatcher(DB_PATH, publish=lambda topic, payload, qos: client.publish(topic, payload, qos=qos))
+    client.message_callback_add(ACK_TOPIC, dispatcher.on_message)
+    dispatcher.start()
+
+    client.connect("INSERT MQTT BROKER'S IP HERE", 1883, 60)
+    try:
+        client.loop_forever()
+    finally:
+        dispatcher.stop()
+        pipeline.stop()
@@ -0,0 +1,205 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+
+from topic_router import build_default_router
+
+try:
+    import aiomqtt
+except ImportError:  # Only needed when connecting to real brokers
+    aiomqtt = None
+
+# --- CONFIGURATION PARAMETERS ---
+PERSIST_QUEUE_SIZE = 20000   # Decoded readings waiting for the writer
+PERSIST_BATCH = 500          # Readings handed to the writer per executor call
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 30.0
+
+
+@dataclass
+class BrokerConfig:
+    """
+    One MQTT broker (typically one building segment) the gateway subscribes to.
+    """
+    name: str
+    host: str
+    port: int = 1883
+    topics: tuple = None  # Defaults to every pattern of the gateway's router
+    keepalive: int = 60
+
+
+@dataclass
+class BrokerStats:
+    connected: bool = False
+    connects: int = 0
+    disconnects: int = 0
+    messages: int = 0
+    invalid: int = 0
+    last_error: str = None
+    last_message_ts: float = None
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE_S, cap=BACKOFF_MAX_S):
+    """
+    Exponential backoff with full jitter, so brokers that dropped together do not reconnect in lockstep.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def aiomqtt_client_factory(config):
+    """
+    Default client factory backed by aiomqtt.
+    """
+    if aiomqtt is None:
+        raise RuntimeError("aiomqtt is required to connect to a real broker (pip install aiomqtt)")
+    return aiomqtt.Client(hostname=config.host, port=config.port, keepalive=config.keepalive)
+
+
+class MQTTGateway:
+    """
+    Asyncio MQTT gateway that holds subscriptions on several brokers concurrently.
+    - Every broker runs in its own task and reconnects with jittered backoff without affecting the others.
+    - Messages are routed and decoded by the same TopicRouter as the threaded pipeline.
+    - Decoded readings go through a bounded asyncio queue to the IngestWriter, whose blocking
+      submit is run in the default executor in batches so the event loop never waits on SQLite.
+
+    A client factory returns an async context manager exposing `await subscribe(topic)` and an async
+    iterable `messages` whose items have `.topic` and `.payload`; aiomqtt.Client satisfies this.
+    """
+
+    def __init__(self, brokers, writer, client_factory=aiomqtt_client_factory,
+                 queue_size=PERSIST_QUEUE_SIZE, persist_batch=PERSIST_BATCH, router=None):
+        """
+        Args:
+            brokers (list[BrokerConfig]): Brokers to subscribe to.
+            writer (IngestWriter): Persistence stage for decoded readings.
+            client_factory (callable): Builds a client for a BrokerConfig.
+            queue_size (int): Capacity of the queue between the broker tasks and the writer.
+            persist_batch (int): Maximum readings handed to the writer per executor call.
+            router (TopicRouter): Topic router/decoder, defaults to build_default_router().
+        """
+        self.brokers = list(brokers)
+        self.writer = writer
+        self.client_factory = client_factory
+        self.persist_batch = persist_batch
+        self.router = router if router is not None else build_default_router()
+        self.queue_size = queue_size
+        self.broker_stats = {b.name: BrokerStats() for b in self.brokers}
+        self.persisted = 0
+        self.persist_failed = 0       # Readings in batches the writer rejected
+        self.last_persist_error = None
+        self._queue = None
+        self._broker_tasks = []
+        self._persist_task = None
+
+    # ---------- Lifecycle ----------
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._persist_task = asyncio.create_task(self._persist_loop(), name="gateway-persist")
+        self._broker_tasks = [
+            asyncio.create_task(self._broker_loop(b), name=f"gateway-{b.name}") for b in self.brokers
+        ]
+
+    async def stop(self):
+        """
+        Cancels the broker tasks, then waits until every queued reading has been handed to the writer.
+        """
+        for task in self._broker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._broker_tasks, return_exceptions=True)
+        await self._queue.join()
+        self._persist_task.cancel()
+        await asyncio.gather(self._persist_task, return_exceptions=True)
+
+    async def run_forever(self):
+        await self.start()
+        try:
+            await asyncio.gather(*self._broker_tasks)
+        finally:
+            await self.stop()
+
+    # ---------- Broker tasks ----------
+    async def _broker_loop(self, config):
+        stats = self.broker_stats[config.name]
+        attempt = 0
+        while True:
+            try:
+                async with self.client_factory(config) as client:
+                    for topic in config.topics or self.router.subscriptions():
+                        await client.subscribe(topic)
+                    stats.connected = True
+                    stats.connects += 1
+                    attempt = 0
+                    print(f"[{config.name}] Connected to {config.host}:{config.port}")
+                    await self._consume(client, stats)
+                # The message stream ended without an error; treat it as a disconnect
+                raise ConnectionError("message stream closed")
+            except asyncio.CancelledError:
+                stats.connected = False
+                raise
+            except Exception as e:
+                if stats.connected:
+                    stats.disconnects += 1
+                stats.connected = False
+                stats.last_error = repr(e)
+                delay = backoff_delay(attempt)
+                attempt += 1
+                print(f"[{config.name}] Connection lost ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _consume(self, client, stats):
+        queue = self._queue
+        decode = self.router.decode
+        async for message in client.messages:
+            recv_ts = time.time()
+            stats.messages += 1
+            stats.last_message_ts = recv_ts
+            try:
+                route, record = decode(str(message.topic), message.payload)
+            except (ValueError, UnicodeDecodeError):
+                stats.invalid += 1
+                continue
+            if queue.full():
+                # Backpressure only stalls this broker; the other broker tasks keep running
+                await queue.put((route, record, recv_ts))
+            else:
+                queue.put_nowait((route, record, recv_ts))
+
+    # ---------- Async persistence ----------
+    async def _persist_loop(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.persist_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await loop.run_in_executor(None, self._submit_batch, batch)
+                self.persisted += len(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep consuming: a dead persist task would fill the queue and hang stop() on queue.join()
+                self.persist_failed += len(batch)
+                self.last_persist_error = repr(e)
+                print(f"Error persisting a batch of {len(batch)} readings: {e!r}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    def _submit_batch(self, batch):
+        writer = self.writer
+        for route, record, recv_ts in batch:
+            route.persist(writer, record, recv_ts)
+
+    # ---------- Metrics ----------
+    def stats(self):
+        return {
+            "brokers": {name: vars(s).copy() for name, s in self.broker_stats.items()},
+            "persist_queue_depth": self._queue.qsize() if self._queue else 0,
+            "persisted": self.persisted,
+            "persist_failed": self.persist_failed,
+            "last_persist_error": self.last_persist_error,
+            "writer": self.writer.stats(),
+        }
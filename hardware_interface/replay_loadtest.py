@@ -0,0 +1,363 @@
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from command_dispatcher import LatencyHistogram
+
+# --- CONFIGURATION PARAMETERS ---
+SENSOR_TOPIC = "room/{room_id}/device/{device_id}/sensor"
+PUBLISH_QOS = 1
+DEVICE_ID_BASE = 10000       # Virtual devices get ids from here on, away from the real ones in the devices table
+DEVICES_PER_ROOM = 4
+POLL_INTERVAL_S = 0.05       # How often sensor_data is read back for the ingest lag
+DRAIN_TIMEOUT_S = 10.0       # Wait this long after the last publish for the remaining rows to show up
+MAX_INFLIGHT = 1000          # paho QoS 1 window per connection
+
+# Dataset column -> sensor payload field (synthesize.py / dataset.csv / testset.csv / building.py Parquet)
+PAYLOAD_FIELDS = {
+    "room_temp": "temperature",
+    "outside_humidity": "humidity",
+    "occupancy_count": "occupancy",
+    "power_kw": "power_usage",
+}
+
+
+def load_series(path, limit=None):
+    """
+    Reads a synthetic dataset (CSV, Parquet file or building.py Parquet directory) and pre-encodes
+    one sensor payload per row, so replaying costs no JSON work.
+
+    Returns:
+        tuple: (list of payload lists, one per source room, sampling step in seconds).
+    """
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, usecols=["timestamp", *PAYLOAD_FIELDS])
+    else:
+        df = pd.read_parquet(path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    groups = [g for _, g in df.groupby("room_id", observed=True)] if "room_id" in df.columns else [df]
+
+    series = []
+    for g in groups:
+        g = g.sort_values("timestamp")
+        if limit:
+            g = g.iloc[:limit]
+        temperature = g["room_temp"].round(2).tolist()
+        humidity = g["outside_humidity"].round(1).tolist()
+        occupancy = g["occupancy_count"].fillna(0).astype(int).tolist()
+        power = g["power_kw"].round(3).tolist()
+        series.append([json.dumps({"temperature": t, "humidity": h, "occupancy": o, "power_usage": p}).encode()
+                       for t, h, o, p in zip(temperature, humidity, occupancy, power)])
+    step = np.diff(df["timestamp"].drop_duplicates().sort_values().to_numpy()[:1000]).astype("timedelta64[ms]")
+    step_s = float(np.median(step.astype(np.int64))) / 1000 if len(step) else 300.0
+    return series, step_s
+
+
+class IngestLagMonitor:
+    """
+    Reads sensor_data back while the replay runs and matches every new row of a virtual device
+    to the oldest unmatched publish of that device (QoS 1 on one connection keeps per-device order).
+    - receive lag: sensor_data.timestamp (set when the server took the message off MQTT) - publish time.
+    - visible lag: time the committed row was first seen by this monitor - publish time
+      (includes up to POLL_INTERVAL_S of polling delay).
+    """
+
+    def __init__(self, db_path, first_device, last_device, poll_interval=POLL_INTERVAL_S):
+        self.db_path = db_path
+        self.first_device = first_device
+        self.last_device = last_device
+        self.poll_interval = poll_interval
+        self.receive_lag = LatencyHistogram()
+        self.visible_lag = LatencyHistogram()
+        self.published = 0
+        self.ingested = 0
+        self.unmatched = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self._last_id = conn.execute("SELECT COALESCE(MAX(reading_id), 0) FROM sensor_data").fetchone()[0]
+        finally:
+            conn.close()
+
+    def expect(self, device_id, published_at):
+        with self._lock:
+            self._pending.setdefault(device_id, deque()).append(published_at)
+            self.published += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="IngestLagMonitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=5.0)
+        try:
+            while not self._stop.is_set():
+                self.poll(conn)
+                self._stop.wait(self.poll_interval)
+            self.poll(conn)
+        finally:
+            conn.close()
+
+    def poll(self, conn):
+        rows = conn.execute(
+            "SELECT reading_id, device_id, timestamp FROM sensor_data "
+            "WHERE reading_id > ? AND device_id BETWEEN ? AND ? ORDER BY reading_id",
+            (self._last_id, self.first_device, self.last_device)).fetchall()
+        if not rows:
+            return
+        seen_at = time.time()
+        self._last_id = rows[-1][0]
+        with self._lock:
+            for _, device_id, received_at in rows:
+                pending = self._pending.get(device_id)
+                if not pending:
+                    self.unmatched += 1
+                    continue
+                published_at = pending.popleft()
+                self.ingested += 1
+                self.receive_lag.record((float(received_at) - published_at) * 1000)
+                self.visible_lag.record((seen_at - published_at) * 1000)
+
+    def backlog(self):
+        with self._lock:
+            return self.published - self.ingested
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class ReplayLoadGenerator:
+    """
+    Replays synthetic sensor series as many virtual devices.
+    - Device k replays source series k % len(series), starting at its own offset so devices differ.
+    - Every device publishes one message per dataset step (5 min) divided by speedup, the devices
+      spread evenly over the step; speedup=None publishes as fast as possible.
+    - Devices are split over len(publishers) threads, one per MQTT connection.
+    """
+
+    def __init__(self, series, step_s, publishers, devices, devices_per_room=DEVICES_PER_ROOM, speedup=1.0,
+                 device_id_base=DEVICE_ID_BASE, monitor=None):
+        """
+        Args:
+            series (list): Pre-encoded payload lists, see load_series().
+            step_s (float): Dataset sampling step in seconds.
+            publishers (list): publish(topic, payload, qos) callables, one per connection/thread.
+            devices (int): Number of virtual devices.
+            devices_per_room (int): Virtual devices per room in the topic.
+            speedup (float): Replay speed relative to real time, None for as fast as possible.
+            device_id_base (int): Device id of the first virtual device.
+            monitor (IngestLagMonitor): Told about every successful publish.
+        """
+        self.series = series
+        self.step_s = step_s
+        self.publishers = publishers
+        self.devices = devices
+        self.speedup = speedup
+        self.monitor = monitor
+        self.device_ids = [device_id_base + k for k in range(devices)]
+        self.topics = [SENSOR_TOPIC.format(room_id=k // devices_per_room + 1, device_id=device_id)
+                       for k, device_id in enumerate(self.device_ids)]
+        shortest = min(len(s) for s in series)
+        self.offsets = [(k * 7919) % shortest for k in range(devices)]
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {"published": 0, "publish_errors": 0, "late_s": 0.0}
+        self.started = None
+        self.finished = None
+
+    def run(self, messages=None, duration=None):
+        """
+        Publishes until `messages` messages were sent or `duration` seconds passed. Returns stats().
+        """
+        per_thread = None if messages is None else -(-messages // len(self.publishers))
+        self.started = time.perf_counter()
+        threads = [threading.Thread(target=self._publish_loop, args=(i, publish, per_thread, duration),
+                                    name=f"Replay-{i}", daemon=True)
+                   for i, publish in enumerate(self.publishers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.finished = time.perf_counter()
+        return self.stats_summary()
+
+    def stop(self):
+        self._stop.set()
+
+    def _publish_loop(self, index, publish, budget, duration):
+        mine = list(range(index, self.devices, len(self.publishers)))
+        interval = None if not self.speedup else self.step_s / self.speedup
+        sent = errors = 0
+        late = 0.0
+        step = 0
+        while not self._stop.is_set():
+            for k in mine:
+                if budget is not None and sent + errors >= budget:
+                    break
+                if interval is not None:
+                    due = self.started + (step + k / self.devices) * interval
+                    wait = due - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                    else:
+                        late = max(late, -wait)
+                if duration is not None and time.perf_counter() - self.started >= duration:
+                    budget = sent + errors
+                    break
+                series = self.series[k % len(self.series)]
+                payload = series[(self.offsets[k] + step) % len(series)]
+                published_at = time.time()
+                try:
+                    info = publish(self.topics[k], payload, PUBLISH_QOS)
+                    if getattr(info, "rc", 0) != 0:
+                        raise ConnectionError(f"publish returned rc={info.rc}")
+                except Exception:
+                    errors += 1
+                    continue
+                sent += 1
+                if self.monitor is not None:
+                    self.monitor.expect(self.device_ids[k], published_at)
+            else:
+                step += 1
+                continue
+            break
+        with self._lock:
+            self.stats["published"] += sent
+            self.stats["publish_errors"] += errors
+            self.stats["late_s"] = max(self.stats["late_s"], late)
+
+    def stats_summary(self):
+        s = dict(self.stats)
+        end = self.finished or time.perf_counter()
+        elapsed = end - self.started if self.started else 0.0
+        s["elapsed_s"] = elapsed
+        s["publish_rate"] = s["published"] / elapsed if elapsed else 0.0
+        s["target_rate"] = self.devices * self.speedup / self.step_s if self.speedup else None
+        return s
+
+
+def _paho_publishers(host, port, connections):
+    import paho.mqtt.client as mqtt
+
+    clients, publishers = [], []
+    for i in range(connections):
+        client = mqtt.Client(client_id=f"replay-loadtest-{os.getpid()}-{i}")
+        client.max_inflight_messages_set(MAX_INFLIGHT)
+        client.connect(host, port, 60)
+        client.loop_start()
+        clients.append(client)
+        publishers.append(lambda topic, payload, qos, client=client: client.publish(topic, payload, qos=qos))
+    return clients, publishers
+
+
+def _in_process_backend():
+    """
+    The ingest path of mqtt_connection.py without a broker: publish() goes straight to IngestPipeline.enqueue.
+    """
+    from ingest_writer import IngestWriter
+    from ingest_pipeline import IngestPipeline, BLOCK
+    from topic_router import build_default_router
+
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    router = build_default_router()
+    writer = IngestWriter(db_path, create_schema=True, tables=router.tables())
+    pipeline = IngestPipeline(writer, policy=BLOCK, router=router).start()
+    return db_path, pipeline, lambda topic, payload, qos: pipeline.enqueue(topic, payload)
+
+
+def run_replay(dataset, devices, speedup, messages=None, duration=None, connections=1, broker=None, db_path=None,
+               devices_per_room=DEVICES_PER_ROOM, limit=None):
+    """
+    Replays a dataset into a broker (broker=(host, port)) or, without a broker, into an in-process
+    IngestPipeline on a temporary database. With a database the ingest lag is measured as well.
+    """
+    series, step_s = load_series(dataset, limit)
+    print(f"Loaded {len(series)} series of {min(len(s) for s in series)}+ rows, step {step_s:.0f} s")
+
+    pipeline = None
+    if broker is None:
+        db_path, pipeline, publish = _in_process_backend()
+        clients, publishers = [], [publish] * connections
+    else:
+        clients, publishers = _paho_publishers(broker[0], broker[1], connections)
+
+    monitor = None
+    if db_path:
+        monitor = IngestLagMonitor(db_path, DEVICE_ID_BASE, DEVICE_ID_BASE + devices - 1).start()
+    generator = ReplayLoadGenerator(series, step_s, publishers, devices, devices_per_room, speedup, monitor=monitor)
+    try:
+        s = generator.run(messages, duration)
+    except KeyboardInterrupt:
+        generator.stop()
+        s = generator.stats_summary()
+
+    speed = f"{speedup:g}x" if speedup else "max speed"
+    target = f" (target {s['target_rate']:,.0f}/s)" if s["target_rate"] else ""
+    print(f"Published {s['published']} messages from {devices} devices at {speed} in {s['elapsed_s']:.2f} s: "
+          f"{s['publish_rate']:,.0f} msgs/s{target}, {s['publish_errors']} errors, max schedule slip {s['late_s'] * 1000:.0f} ms")
+
+    if monitor is not None:
+        deadline = time.perf_counter() + DRAIN_TIMEOUT_S
+        while monitor.backlog() > 0 and time.perf_counter() < deadline:
+            time.sleep(POLL_INTERVAL_S)
+        monitor.stop()
+        s["ingested"] = monitor.ingested
+        s["missing"] = monitor.backlog()
+        s["receive_lag"] = monitor.receive_lag.summary()
+        s["visible_lag"] = monitor.visible_lag.summary()
+        print(f"Ingested {monitor.ingested}/{monitor.published} readings ({s['missing']} missing after "
+              f"{DRAIN_TIMEOUT_S:.0f} s, {monitor.unmatched} unmatched rows)")
+        for name in ("receive_lag", "visible_lag"):
+            lag = s[name]
+            if lag["count"]:
+                print(f"  - {name.replace('_', ' ')}: p50 {lag['p50_ms']:.1f} ms, p90 {lag['p90_ms']:.1f} ms, "
+                      f"p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms")
+
+    for client in clients:
+        client.loop_stop()
+        client.disconnect()
+    if pipeline is not None:
+        pipeline.stop()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    return s
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay synthetic HVAC data as MQTT sensor traffic and measure ingest lag.")
+    parser.add_argument("dataset", help="CSV from synthesize.py, dataset.csv/testset.csv, or building.py Parquet output")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--devices-per-room", type=int, default=DEVICES_PER_ROOM)
+    parser.add_argument("--speedup", type=float, default=1.0, help="1 = real time, 10 = 10x, 0 = as fast as possible")
+    parser.add_argument("--messages", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=None, help="seconds")
+    parser.add_argument("--connections", type=int, default=1, help="MQTT connections / publisher threads")
+    parser.add_argument("--broker", default=None, help="host[:port]; without it the replay feeds an in-process pipeline")
+    parser.add_argument("--db", default=None, help="database written by mqtt_connection.py, to measure ingest lag")
+    parser.add_argument("--limit", type=int, default=None, help="rows per source series")
+    args = parser.parse_args()
+    if args.messages is None and args.duration is None:
+        parser.error("give --messages and/or --duration")
+
+    broker = None
+    if args.broker:
+        host, _, port = args.broker.partition(":")
+        broker = (host, int(port or 1883))
+    run_replay(args.dataset, args.devices, args.speedup or None, args.messages, args.duration, args.connections,
+               broker, args.db, args.devices_per_room, args.limit)
@@ -0,0 +1,234 @@
+import time
+
+from ingest_writer import SENSOR_FIELDS
+
+# --- CONFIGURATION PARAMETERS ---
+# Rollup grids in seconds. '5m' matches TIME_FREQUENCY_MIN = 5 used to synthesize the ML training data.
+ROLLUP_INTERVALS = {"1m": 60, "5m": 300, "1h": 3600}
+RAW_RETENTION_DAYS = 30                 # Raw sensor_data rows older than this are pruned
+ROLLUP_RETENTION_DAYS = {"1m": 7}       # Rollups not listed here are kept forever
+PRUNE_INTERVAL_S = 3600                 # How often maybe_prune() actually deletes
+
+STAT_SUFFIXES = ("count", "sum", "min", "max")
+
+
+def rollup_table(interval):
+    return f"sensor_rollup_{interval}"
+
+
+def _rollup_columns():
+    return [f"{field}_{stat}" for field in SENSOR_FIELDS for stat in STAT_SUFFIXES]
+
+
+def _rollup_ddl(interval):
+    stats = ",\n            ".join(
+        f"{field}_count INTEGER NOT NULL DEFAULT 0, {field}_sum REAL NOT NULL DEFAULT 0, "
+        f"{field}_min REAL, {field}_max REAL"
+        for field in SENSOR_FIELDS
+    )
+    return f"""
+        CREATE TABLE IF NOT EXISTS {rollup_table(interval)} (
+            device_id INTEGER NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            {stats},
+            PRIMARY KEY (device_id, bucket_start)
+        ) WITHOUT ROWID;
+    """
+
+
+def _rollup_upsert(interval):
+    columns = ["device_id", "bucket_start"] + _rollup_columns()
+    updates = []
+    for field in SENSOR_FIELDS:
+        updates.append(f"{field}_count = {field}_count + excluded.{field}_count")
+        updates.append(f"{field}_sum = {field}_sum + excluded.{field}_sum")
+        # Scalar min()/max() return NULL if any argument is NULL, so fall back to the other side
+        updates.append(f"{field}_min = min(coalesce({field}_min, excluded.{field}_min), "
+                       f"coalesce(excluded.{field}_min, {field}_min))")
+        updates.append(f"{field}_max = max(coalesce({field}_max, excluded.{field}_max), "
+                       f"coalesce(excluded.{field}_max, {field}_max))")
+    return f"""
+        INSERT INTO {rollup_table(interval)} ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT(device_id, bucket_start) DO UPDATE SET
+            {', '.join(updates)}
+    """
+
+
+class TimeSeriesStore:
+    """
+    Time-series layer on top of the sensor_data table.
+    - Stores timestamps as numeric epoch seconds and indexes (device_id, timestamp).
+    - Maintains 1-min/5-min/1-hour rollups (count/sum/min/max per metric) incrementally,
+      inside the same transaction as every ingested batch.
+    - Prunes raw rows (and fine-grained rollups) older than the retention window.
+    """
+
+    def __init__(self, raw_retention_days=RAW_RETENTION_DAYS, rollup_retention_days=None,
+                 prune_interval=PRUNE_INTERVAL_S):
+        """
+        Args:
+            raw_retention_days (float): Age in days after which raw sensor_data rows are deleted, None to keep all.
+            rollup_retention_days (dict): Interval name -> retention in days for rollup tables.
+            prune_interval (float): Minimum number of seconds between two prune passes in maybe_prune().
+        """
+        self.raw_retention_days = raw_retention_days
+        self.rollup_retention_days = (ROLLUP_RETENTION_DAYS if rollup_retention_days is None
+                                      else rollup_retention_days)
+        self.prune_interval = prune_interval
+        self._upserts = {interval: _rollup_upsert(interval) for interval in ROLLUP_INTERVALS}
+        self._last_prune = 0.0
+
+    # ---------- Schema ----------
+    def ensure_schema(self, conn):
+        """
+        Migrates sensor_data to numeric timestamps if needed and creates indexes and rollup tables.
+        """
+        with conn:
+            # DDL does not open a transaction implicitly; keep the migration atomic
+            conn.execute("BEGIN")
+            self._migrate_sensor_data(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sensor_data_device_ts ON sensor_data (device_id, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sensor_data_ts ON sensor_data (timestamp)")
+            created = []
+            for interval in ROLLUP_INTERVALS:
+                exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                                      (rollup_table(interval),)).fetchone()
+                if not exists:
+                    conn.execute(_rollup_ddl(interval))
+                    created.append(interval)
+        if created:
+            # Only the new tables: existing rollups may cover raw rows that have been pruned since
+            self.rebuild_rollups(conn, created)
+
+    def _migrate_sensor_data(self, conn):
+        columns = {row[1]: row[2].upper() for row in conn.execute("PRAGMA table_info(sensor_data)")}
+        if columns.get("timestamp") == "REAL":
+            return
+        print("Migrating sensor_data.timestamp to numeric epoch seconds...")
+        conn.execute("""
+            CREATE TABLE sensor_data_migrated (
+                reading_id INTEGER PRIMARY KEY, device_id INTEGER NOT NULL REFERENCES devices (device_id),
+                timestamp REAL NOT NULL, temperature REAL, humidity REAL, occupancy INTEGER, power_usage REAL
+            )
+        """)
+        conn.execute("""
+            INSERT INTO sensor_data_migrated (reading_id, device_id, timestamp, temperature, humidity, occupancy, power_usage)
+            SELECT reading_id, device_id, CAST(timestamp AS REAL), temperature, humidity, occupancy, power_usage
+            FROM sensor_data
+        """)
+        conn.execute("DROP TABLE sensor_data")
+        conn.execute("ALTER TABLE sensor_data_migrated RENAME TO sensor_data")
+
+    def rebuild_rollups(self, conn, intervals=None):
+        """
+        Recomputes rollup tables from the raw rows still in sensor_data.
+
+        Args:
+            conn (sqlite3.Connection): The writer connection.
+            intervals (list[str]): Interval names to rebuild, all of ROLLUP_INTERVALS by default.
+        """
+        select = ", ".join(
+            f"COUNT({f}), TOTAL({f}), MIN({f}), MAX({f})" for f in SENSOR_FIELDS
+        )
+        with conn:
+            for interval in ROLLUP_INTERVALS if intervals is None else intervals:
+                width = ROLLUP_INTERVALS[interval]
+                table = rollup_table(interval)
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f"""
+                    INSERT INTO {table} (device_id, bucket_start, {', '.join(_rollup_columns())})
+                    SELECT device_id, CAST(timestamp / {width} AS INTEGER) * {width}, {select}
+                    FROM sensor_data GROUP BY 1, 2
+                """)
+
+    # ---------- Ingest ----------
+    def apply_batch(self, conn, rows):
+        """
+        Folds a batch of sensor_data rows into the rollup tables. Meant to run inside the
+        writer's transaction so raw rows and rollups are committed together.
+
+        Args:
+            conn (sqlite3.Connection): The writer connection.
+            rows (list[tuple]): (device_id, timestamp, temperature, humidity, occupancy, power_usage) rows.
+        """
+        n_fields = len(SENSOR_FIELDS)
+        for interval, width in ROLLUP_INTERVALS.items():
+            buckets = {}
+            for row in rows:
+                key = (row[0], int(row[1] // width) * width)
+                acc = buckets.get(key)
+                if acc is None:
+                    acc = buckets[key] = [0, 0.0, None, None] * n_fields
+                for i in range(n_fields):
+                    value = row[2 + i]
+                    if value is None:
+                        continue
+                    j = 4 * i
+                    acc[j] += 1
+                    acc[j + 1] += value
+                    if acc[j + 2] is None or value < acc[j + 2]:
+                        acc[j + 2] = value
+                    if acc[j + 3] is None or value > acc[j + 3]:
+                        acc[j + 3] = value
+            conn.executemany(self._upserts[interval], [key + tuple(acc) for key, acc in buckets.items()])
+
+    # ---------- Retention ----------
+    def maybe_prune(self, conn, now=None):
+        now = time.time() if now is None else now
+        if now - self._last_prune < self.prune_interval:
+            return None
+        self._last_prune = now
+        return self.prune(conn, now)
+
+    def prune(self, conn, now=None):
+        """
+        Deletes raw rows and rollup buckets older than their retention windows.
+
+        Returns:
+            dict: Number of rows deleted per table.
+        """
+        now = time.time() if now is None else now
+        deleted = {}
+        with conn:
+            if self.raw_retention_days is not None:
+                cutoff = now - self.raw_retention_days * 86400
+                deleted["sensor_data"] = conn.execute(
+                    "DELETE FROM sensor_data WHERE timestamp < ?", (cutoff,)).rowcount
+            for interval, days in self.rollup_retention_days.items():
+                cutoff = now - days * 86400
+                table = rollup_table(interval)
+                deleted[table] = conn.execute(f"DELETE FROM {table} WHERE bucket_start < ?", (cutoff,)).rowcount
+        return deleted
+
+    # ---------- Queries ----------
+    def query_rollup(self, conn, interval, device_id, start, end):
+        """
+        Returns the rollup buckets of one device in [start, end) as dicts with mean/min/max/count per metric.
+        """
+        table = rollup_table(interval)
+        cursor = conn.execute(
+            f"SELECT * FROM {table} WHERE device_id = ? AND bucket_start >= ? AND bucket_start < ? "
+            f"ORDER BY bucket_start", (device_id, start, end))
+        names = [d[0] for d in cursor.description]
+        results = []
+        for row in cursor:
+            record = dict(zip(names, row))
+            bucket = {"device_id": record["device_id"], "bucket_start": record["bucket_start"]}
+            for field in SENSOR_FIELDS:
+                count = record[f"{field}_count"]
+                bucket[f"{field}_mean"] = record[f"{field}_sum"] / count if count else None
+                bucket[f"{field}_min"] = record[f"{field}_min"]
+                bucket[f"{field}_max"] = record[f"{field}_max"]
+                bucket[f"{field}_count"] = count
+            results.append(bucket)
+        return results
+
+    def query_raw(self, conn, device_id, start, end):
+        """
+        Returns the raw readings of one device in [start, end), served from the (device_id, timestamp) index.
+        """
+        return conn.execute(
+            "SELECT timestamp, temperature, humidity, occupancy, power_usage FROM sensor_data "
+            "WHERE device_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+            (device_id, start, end)).fetchall()
@@ -0,0 +1,347 @@
+import json
+import time
+import random
+import argparse
+from dataclasses import dataclass
+
+from ingest_writer import SENSOR_TABLE, SENSOR_FIELDS, TableSpec
+
+# --- CONFIGURATION PARAMETERS ---
+ROUTE_CACHE_SIZE = 65536     # Resolved topics remembered by the router (devices reuse the same topic)
+
+SEAT_HOGGING_TABLE = TableSpec(
+    name="seat_hogging_readings",
+    columns=("t1_top", "t1_bottom", "t2_top", "t2_bottom"),
+    ddl="""
+        CREATE TABLE IF NOT EXISTS seat_hogging_readings (
+            reading_id INTEGER PRIMARY KEY, device_id INTEGER REFERENCES devices (device_id),
+            timestamp REAL NOT NULL, t1_top INTEGER, t1_bottom INTEGER, t2_top INTEGER, t2_bottom INTEGER
+        );
+    """,
+)
+
+ROOM_CONDITION_TABLE = TableSpec(
+    name="room_condition_readings",
+    columns=("temperature", "humidity"),
+    ddl="""
+        CREATE TABLE IF NOT EXISTS room_condition_readings (
+            reading_id INTEGER PRIMARY KEY, device_id INTEGER REFERENCES devices (device_id),
+            timestamp REAL NOT NULL, temperature REAL, humidity REAL
+        );
+    """,
+)
+
+
+# ---------- Typed payloads ----------
+@dataclass(frozen=True)
+class SensorReading:
+    """ room/<room_id>/device/<device_id>/sensor -> sensor_data + realtime_state """
+    device_id: int
+    temperature: float = None
+    humidity: float = None
+    occupancy: int = None
+    power_usage: float = None
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in SENSOR_FIELDS}
+
+
+@dataclass(frozen=True)
+class SeatHoggingReading:
+    """ sensors/seat_hogging[/<device_id>] -> seat_hogging_readings, distances in cm (-1 = no echo) """
+    device_id: int
+    t1_top: int
+    t1_bottom: int
+    t2_top: int
+    t2_bottom: int
+
+    def values(self):
+        return (self.device_id, self.t1_top, self.t1_bottom, self.t2_top, self.t2_bottom)
+
+
+@dataclass(frozen=True)
+class RoomConditionReading:
+    """ sensors/room_condition[/<device_id>] -> room_condition_readings """
+    device_id: int
+    temperature: float
+    humidity: float
+
+    def values(self):
+        return (self.device_id, self.temperature, self.humidity)
+
+
+def _number(data, key, kind=float, required=False):
+    value = data.get(key)
+    if value is None:
+        if required:
+            raise ValueError(f"Missing field '{key}'")
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Field '{key}' is not numeric: {value!r}")
+    return kind(value)
+
+
+def _optional_device_id(params):
+    # '#' captures the remaining levels. Without a device level the reading is stored anonymously (NULL device_id):
+    # IoT_Seat_Hogging.ino has no device identity, and the broker does not pass on the publisher's client id
+    rest = params[-1] if params else ""
+    if not rest:
+        return None
+    try:
+        return int(rest.split('/')[0])
+    except ValueError:
+        raise ValueError(f"Invalid device id in topic: {rest}")
+
+
+def decode_sensor(params, data):
+    try:
+        device_id = int(params[1])
+    except ValueError:
+        raise ValueError(f"Invalid device id in topic: {params[1]}")
+    return SensorReading(device_id, *(_number(data, field, int if field == "occupancy" else float)
+                                      for field in SENSOR_FIELDS))
+
+
+def decode_seat_hogging(params, data):
+    return SeatHoggingReading(
+        _optional_device_id(params),
+        _number(data, "T1_top", int, True),
+        _number(data, "T1_bottom", int, True),
+        _number(data, "T2_top", int, True),
+        _number(data, "T2_bottom", int, True),
+    )
+
+
+def decode_room_condition(params, data):
+    return RoomConditionReading(
+        _optional_device_id(params),
+        _number(data, "temperature", float, True),
+        _number(data, "humidity", float, True),
+    )
+
+
+# ---------- Router ----------
+class Route:
+    __slots__ = ("pattern", "decoder", "table", "order")
+
+    def __init__(self, pattern, decoder, table, order):
+        self.pattern = pattern
+        self.decoder = decoder
+        self.table = table
+        self.order = order
+
+    def persist(self, writer, record, recv_ts):
+        """
+        Hands a decoded record to the IngestWriter in the layout of this route's table.
+        """
+        if self.table == SENSOR_TABLE:
+            writer.submit(record.device_id, record.as_dict(), recv_ts)
+        else:
+            writer.submit_record(self.table, record.values(), recv_ts)
+
+
+class _Node:
+    __slots__ = ("children", "plus", "hash", "routes")
+
+    def __init__(self):
+        self.children = {}
+        self.plus = None
+        self.hash = None
+        self.routes = []
+
+
+class TopicRouter:
+    """
+    Pre-compiled MQTT topic router.
+    - Patterns (with '+' and '#' wildcards) are compiled into a trie once at registration.
+    - Routing walks the trie level by level, so the cost depends on the topic depth and not on
+      how many patterns are registered. Resolved topics are cached, since every device keeps
+      publishing on the same topic.
+    - When several patterns match, the one registered first wins.
+    """
+
+    def __init__(self, cache_size=ROUTE_CACHE_SIZE):
+        self._root = _Node()
+        self._routes = []
+        self._tables = {}
+        self._cache = {}
+        self.cache_size = cache_size
+
+    def add(self, pattern, decoder, table, table_spec=None):
+        """
+        Registers a topic pattern.
+
+        Args:
+            pattern (str): MQTT subscription pattern, e.g. "room/+/device/+/sensor".
+            decoder (callable): decoder(params, data) -> typed record; params holds the values matched
+                by '+' levels and, for a trailing '#', the remaining topic levels joined by '/'.
+            table (str): Table the records are written to.
+            table_spec (TableSpec): Schema of the table when it is not sensor_data.
+        """
+        levels = pattern.split('/')
+        for i, level in enumerate(levels):
+            if level == '#' and i != len(levels) - 1:
+                raise ValueError(f"'#' must be the last level of a pattern: {pattern}")
+            if level not in ('+', '#') and ('+' in level or '#' in level):
+                raise ValueError(f"Wildcards must occupy a whole level: {pattern}")
+
+        node = self._root
+        for level in levels:
+            if level == '+':
+                node.plus = node.plus or _Node()
+                node = node.plus
+            elif level == '#':
+                node.hash = node.hash or _Node()
+                node = node.hash
+            else:
+                node = node.children.setdefault(level, _Node())
+
+        route = Route(pattern, decoder, table, len(self._routes))
+        node.routes.append(route)
+        self._routes.append(route)
+        if table_spec is not None:
+            self._tables[table_spec.name] = table_spec
+        self._cache.clear()
+        return route
+
+    def subscriptions(self):
+        return [route.pattern for route in self._routes]
+
+    def tables(self):
+        """
+        TableSpecs of every non-sensor_data table, to be registered with the IngestWriter.
+        """
+        return list(self._tables.values())
+
+    def match(self, topic):
+        """
+        Returns (route, params) for the first registered pattern matching the topic, or (None, None).
+        """
+        hit = self._cache.get(topic)
+        if hit is not None:
+            return hit
+
+        levels = topic.split('/')
+        best = None
+        depth = len(levels)
+        # Iterative walk over (node, level index, captured params); '+' is the only branching point
+        stack = [(self._root, 0, ())]
+        while stack:
+            node, i, params = stack.pop()
+            if node.hash is not None:
+                # '#' also matches the parent level itself ("a/#" matches "a")
+                for route in node.hash.routes:
+                    if best is None or route.order < best[0].order:
+                        best = (route, params + ('/'.join(levels[i:]),))
+            if i == depth:
+                for route in node.routes:
+                    if best is None or route.order < best[0].order:
+                        best = (route, params)
+                continue
+            level = levels[i]
+            child = node.children.get(level)
+            if child is not None:
+                stack.append((child, i + 1, params))
+            if node.plus is not None:
+                stack.append((node.plus, i + 1, params + (level,)))
+
+        result = best if best is not None else (None, None)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[topic] = result
+        return result
+
+    def decode(self, topic, payload):
+        """
+        Routes and decodes one message.
+
+        Returns:
+            tuple: (route, record)
+
+        Raises:
+            ValueError: If no pattern matches or the payload does not match the route's schema.
+        """
+        route, params = self.match(topic)
+        if route is None:
+            raise ValueError(f"No route for topic: {topic}")
+        if isinstance(payload, (bytes, bytearray)):
+            payload = payload.decode()
+        data = json.loads(payload)
+        if not isinstance(data, dict):
+            raise ValueError(f"Payload is not a JSON object: {payload!r}")
+        return route, route.decoder(params, data)
+
+
+def build_default_router():
+    """
+    Router for every topic the ESP32 devices publish on.
+    """
+    router = TopicRouter()
+    router.add("room/+/device/+/sensor", decode_sensor, SENSOR_TABLE)
+    router.add("sensors/seat_hogging/#", decode_seat_hogging, SEAT_HOGGING_TABLE.name, SEAT_HOGGING_TABLE)
+    router.add("sensors/room_condition/#", decode_room_condition, ROOM_CONDITION_TABLE.name, ROOM_CONDITION_TABLE)
+    return router
+
+
+# --- Microbenchmark ---
+def _linear_match(patterns, topic):
+    """
+    Baseline: split and compare every registered pattern against the topic.
+    """
+    levels = topic.split('/')
+    for pattern in patterns:
+        parts = pattern.split('/')
+        if len(parts) != len(levels) and parts[-1] != '#':
+            continue
+        for p, level in zip(parts, levels):
+            if p == '#':
+                return pattern
+            if p != '+' and p != level:
+                break
+        else:
+            if len(parts) == len(levels):
+                return pattern
+    return None
+
+
+def run_benchmark(handler_counts, lookups, devices):
+    rng = random.Random(0)
+    print(f"{'handlers':>8} {'linear us':>10} {'trie us':>10} {'trie+cache us':>14}")
+    for n in handler_counts:
+        patterns = [f"building/{i}/room/+/device/+/sensor" for i in range(n)]
+        router = TopicRouter(cache_size=0)
+        cached = TopicRouter()
+        for pattern in patterns:
+            router.add(pattern, decode_sensor, SENSOR_TABLE)
+            cached.add(pattern, decode_sensor, SENSOR_TABLE)
+        # A fixed device population, as on a real broker where every device reuses its topic
+        population = [f"building/{rng.randrange(n)}/room/{rng.randrange(50)}/device/{rng.randrange(20)}/sensor"
+                      for _ in range(devices)]
+        topics = [rng.choice(population) for _ in range(lookups)]
+
+        started = time.perf_counter()
+        for topic in topics:
+            _linear_match(patterns, topic)
+        linear = (time.perf_counter() - started) / lookups * 1e6
+
+        started = time.perf_counter()
+        for topic in topics:
+            router._cache.clear()
+            router.match(topic)
+        trie = (time.perf_counter() - started) / lookups * 1e6
+
+        started = time.perf_counter()
+        for topic in topics:
+            cached.match(topic)
+        trie_cached = (time.perf_counter() - started) / lookups * 1e6
+
+        print(f"{n:>8} {linear:>10.2f} {trie:>10.2f} {trie_cached:>14.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark the trie topic router against linear matching.")
+    parser.add_argument("--handlers", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--devices", type=int, default=2000, help="distinct topics publishing")
+    args = parser.parse_args()
+    run_benchmark(args.handlers, args.lookups, args.devices)
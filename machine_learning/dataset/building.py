@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import synthesize as syn
+
+# --- CONFIGURATION PARAMETERS ---
+MEMORY_BUDGET_MB = 2048      # Upper bound for all worker processes together
+BYTES_PER_ROW = 400          # Peak worker memory per simulated row (arrays + Arrow table + Parquet encoding), with headroom
+WORKER_BASE_MB = 120         # Interpreter + numpy/pyarrow per worker process
+PARQUET_COMPRESSION = "snappy"
+
+ROOM_DEFAULTS = {
+    "heat_transfer": syn.HEAT_TRANSFER_COEFFICIENT,
+    "heat_from_occupant": syn.HEAT_FROM_OCCUPANT,
+    "max_cooling": syn.AC_MAX_COOLING_POWER,
+    "start_temp": syn.START_ROOM_TEMP,
+    "max_occupants": 20,          # Replaces the 20 of WEEKDAY_OCCUPANCY_PROB
+    "occupancy_scale": 1.0,       # Multiplies the hourly session start probabilities
+    "schedule_shift_h": 0,        # Moves the weekday schedule earlier (<0) or later (>0)
+    "weekend_prob": syn.WEEKEND_OCCUPANCY_PROB,
+    "weekend_max": syn.WEEKEND_MAX_OCCUPANTS,
+}
+
+WEATHER_CONDITIONS = ['cloudy', 'rainy', 'sunny']
+
+
+def random_rooms(n_rooms, seed=syn.SEED):
+    """
+    A building of n_rooms rooms with varied thermal parameters and schedules around the single-room defaults.
+    """
+    rng = np.random.default_rng([seed, n_rooms])
+    rooms = []
+    for room_id in range(1, n_rooms + 1):
+        rooms.append({
+            "room_id": room_id,
+            "heat_transfer": round(float(rng.uniform(0.010, 0.025)), 4),
+            "heat_from_occupant": round(float(rng.uniform(0.010, 0.030)), 4),
+            "max_cooling": round(float(rng.uniform(0.5, 0.9)), 3),
+            "start_temp": round(float(rng.uniform(25.0, 28.0)), 2),
+            "max_occupants": int(rng.integers(4, 41)),
+            "occupancy_scale": round(float(rng.uniform(0.6, 1.1)), 3),
+            "schedule_shift_h": int(rng.integers(-1, 2)),
+            "weekend_prob": round(float(rng.uniform(0.0, 0.1)), 3),
+        })
+    return rooms
+
+
+def room_schedule(room):
+    """
+    WEEKDAY_OCCUPANCY_PROB adapted to one room: shifted, scaled and with the room's occupant limit.
+    """
+    shift = int(room["schedule_shift_h"])
+    schedule = {}
+    for hour in range(24):
+        prob, max_occ = syn.WEEKDAY_OCCUPANCY_PROB[(hour - shift) % 24]
+        schedule[hour] = (min(prob * room["occupancy_scale"], 1.0), room["max_occupants"] if max_occ > 0 else 0)
+    return schedule
+
+
+def load_building(path):
+    """
+    Reads a building config (see building.example.json) and fills in ROOM_DEFAULTS for every room.
+    """
+    with open(path, "r") as f:
+        config = json.load(f)
+    defaults = {**ROOM_DEFAULTS, **config.get("defaults", {})}
+    config["rooms"] = [{**defaults, **room} for room in config["rooms"]]
+    return config
+
+
+def shared_weather(start_date, end_date, freq_min, seed):
+    """
+    One timeline and weather series for the whole building, as plain arrays for the workers.
+    """
+    df = syn.simulate_weather(syn.generate_base_timeline(start_date, end_date, freq_min), np.random.default_rng(seed))
+    months = df['timestamp'].dt.strftime('%Y-%m').to_numpy()
+    # Month partitions are contiguous: keep their [start, end) row ranges instead of a per-row column
+    boundaries = np.flatnonzero(months[1:] != months[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(df)]])
+    return {
+        "timestamp": df['timestamp'].to_numpy(),
+        "hour_of_day": df['hour_of_day'].to_numpy(dtype=np.int64),
+        "day_of_week": df['day_of_week'].to_numpy(dtype=np.int64),
+        "day_of_year": df['day_of_year'].to_numpy(dtype=np.int64),
+        "outside_temp": df['outside_temp'].to_numpy(dtype=np.float64),
+        "outside_humidity": df['outside_humidity'].to_numpy(dtype=np.float64),
+        "weather_code": np.searchsorted(WEATHER_CONDITIONS, df['weather_condition'].to_numpy().astype(str)).astype(np.int8),
+        "months": [(months[s], int(s), int(e)) for s, e in zip(starts, ends)],
+        "freq_min": freq_min,
+    }
+
+
+# --- Worker side ---
+_WEATHER = None
+_SETTINGS = None
+
+
+def _init_worker(weather, output_dir, seed):
+    global _WEATHER, _SETTINGS
+    _WEATHER = weather
+    _SETTINGS = {"output_dir": output_dir, "seed": seed}
+
+
+def _dictionary(codes, values):
+    # Arrow dictionaries must not repeat values (MODE_FAN_SPEED has 'off' and 'low' more than once):
+    # encode against the unique values and remap the codes onto them
+    unique, remap = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return pa.DictionaryArray.from_arrays(pa.array(remap[codes], type=pa.int8()), pa.array(unique, type=pa.string()))
+
+
+def simulate_room(room, weather, seed):
+    """
+    Simulates one room against the shared weather and returns it as an Arrow table
+    with the columns of synthesize.py (strings dictionary-encoded).
+    The room's random stream only depends on (seed, room_id), not on which worker runs it.
+    """
+    rng = np.random.default_rng([seed, int(room["room_id"])])
+    n = len(weather["outside_temp"])
+    starts, ends, occupants = syn.sample_sessions(weather["hour_of_day"], weather["day_of_week"], rng, weather["freq_min"],
+                                                  weekday_prob=room_schedule(room), weekend_prob=room["weekend_prob"],
+                                                  weekend_max=room["weekend_max"])
+    occupancy = syn.expand_sessions(starts, ends, occupants, n)
+    noise = rng.normal(0, 0.05, n)
+    room_temp, mode = syn.run_thermodynamics(weather["outside_temp"], occupancy, noise, room["start_temp"],
+                                             room["heat_transfer"], room["heat_from_occupant"], room["max_cooling"])
+    return pa.table({
+        "timestamp": weather["timestamp"],
+        "hour_of_day": weather["hour_of_day"],
+        "day_of_week": weather["day_of_week"],
+        "day_of_year": weather["day_of_year"],
+        "outside_temp": weather["outside_temp"],
+        "outside_humidity": weather["outside_humidity"],
+        "weather_condition": _dictionary(weather["weather_code"], WEATHER_CONDITIONS),
+        "occupancy_count": occupancy,
+        "is_occupied": (occupancy > 0).astype(np.int64),
+        "room_temp": room_temp,
+        "power_kw": syn.MODE_POWER_KW[mode],
+        "fan_speed": _dictionary(mode, syn.MODE_FAN_SPEED),
+        "ac_temp_setting": syn.MODE_AC_SETTING[mode],
+        "ac_control_reason": _dictionary(mode, syn.MODE_REASON),
+    })
+
+
+def _run_room(room):
+    started = time.perf_counter()
+    table = simulate_room(room, _WEATHER, _SETTINGS["seed"])
+    room_dir = os.path.join(_SETTINGS["output_dir"], f"room_id={room['room_id']}")
+    written = 0
+    for month, start, end in _WEATHER["months"]:
+        month_dir = os.path.join(room_dir, f"month={month}")
+        os.makedirs(month_dir, exist_ok=True)
+        path = os.path.join(month_dir, "part-0.parquet")
+        pq.write_table(table.slice(start, end - start), path, compression=PARQUET_COMPRESSION)
+        written += os.path.getsize(path)
+    power = table.column("power_kw").to_numpy()
+    occupied = table.column("is_occupied").to_numpy()
+    return {
+        "room_id": room["room_id"],
+        "rows": table.num_rows,
+        "occupied_frac": float(occupied.mean()),
+        "energy_kwh": float(power.sum() * _WEATHER["freq_min"] / 60),
+        "bytes": written,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+# --- Driver ---
+def _peak_worker_mb():
+    """
+    Peak RSS of the finished worker processes in MiB, None where the resource module does not exist (Windows).
+    """
+    if sys.platform == "win32":
+        return None
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def workers_for_budget(rows, memory_mb=MEMORY_BUDGET_MB, workers=None):
+    """
+    Number of worker processes: the requested (or CPU) count, reduced until one room per worker fits memory_mb.
+    """
+    per_worker_mb = WORKER_BASE_MB + rows * BYTES_PER_ROW / 2 ** 20
+    fits = max(1, int(memory_mb // per_worker_mb))
+    return max(1, min(workers or os.cpu_count() or 1, fits))
+
+
+def generate_building(rooms, output_dir, start_date=syn.DATA_START_DATE, end_date=syn.DATA_END_DATE,
+                      freq_min=syn.TIME_FREQUENCY_MIN, seed=syn.SEED, workers=None, memory_mb=MEMORY_BUDGET_MB):
+    """
+    Simulates every room in a process pool and writes <output_dir>/room_id=<r>/month=<YYYY-MM>/part-0.parquet.
+    Workers return only a small summary per room, so the parent never holds more than the shared weather;
+    each worker holds one room at a time, which keeps the total within memory_mb.
+
+    Returns:
+        dict: Per-room summaries and run metrics.
+    """
+    started = time.perf_counter()
+    weather = shared_weather(start_date, end_date, freq_min, seed)
+    rows = len(weather["outside_temp"])
+    workers = workers_for_budget(rows, memory_mb, workers)
+    print(f"Simulating {len(rooms)} rooms x {rows} rows with {workers} worker(s)...")
+
+    summaries = []
+    with Pool(workers, initializer=_init_worker, initargs=(weather, output_dir, seed), maxtasksperchild=50) as pool:
+        for summary in pool.imap_unordered(_run_room, rooms, chunksize=1):
+            summaries.append(summary)
+    summaries.sort(key=lambda s: s["room_id"])
+    elapsed = time.perf_counter() - started
+    peak_worker_mb = _peak_worker_mb()
+    return {
+        "rooms": summaries,
+        "workers": workers,
+        "seconds": elapsed,
+        "rows": rows * len(rooms),
+        "rows_per_s": rows * len(rooms) / elapsed if elapsed else 0.0,
+        "bytes": sum(s["bytes"] for s in summaries),
+        "peak_worker_mb": peak_worker_mb,
+    }
+
+
+def print_report(result):
+    peak = result['peak_worker_mb']
+    print(f"{len(result['rooms'])} rooms, {result['rows']} rows in {result['seconds']:.1f} s with "
+          f"{result['workers']} worker(s): {result['rows_per_s'] / 1e6:.2f} M rows/s, "
+          f"{result['bytes'] / 2 ** 20:.1f} MiB Parquet"
+          f"{f', peak worker RSS {peak:.0f} MiB' if peak is not None else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic multi-room building as partitioned Parquet.")
+    parser.add_argument("--config", default=None, help="building config, see building.example.json")
+    parser.add_argument("--rooms", type=int, default=10, help="number of random rooms when no config is given")
+    parser.add_argument("--start", default=syn.DATA_START_DATE)
+    parser.add_argument("--end", default=syn.DATA_END_DATE)
+    parser.add_argument("--seed", type=int, default=syn.SEED)
+    parser.add_argument("--output", default="building_data")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--memory-mb", type=float, default=MEMORY_BUDGET_MB)
+    parser.add_argument("--scaling", action="store_true", help="repeat with 1, 2, 4, ... workers and compare throughput")
+    args = parser.parse_args()
+
+    if args.config:
+        config = load_building(args.config)
+        rooms, start, end = config["rooms"], config.get("start", args.start), config.get("end", args.end)
+        seed = config.get("seed", args.seed)
+    else:
+        rooms = [{**ROOM_DEFAULTS, **room} for room in random_rooms(args.rooms, args.seed)]
+        start, end, seed = args.start, args.end, args.seed
+
+    if args.scaling:
+        counts, n = [], 1
+        while n <= (args.workers or os.cpu_count() or 1):
+            counts.append(n)
+            n *= 2
+        baseline = None
+        for n in counts:
+            result = generate_building(rooms, args.output, start, end, seed=seed, workers=n, memory_mb=args.memory_mb)
+            baseline = baseline or result["rows_per_s"]
+            print_report(result)
+            print(f"  -> speed-up {result['rows_per_s'] / baseline:.2f}x over 1 worker")
+    else:
+        result = generate_building(rooms, args.output, start, end, seed=seed, workers=args.workers,
+                                   memory_mb=args.memory_mb)
+        print_report(result)
+        print(f"Dataset written to '{args.output}' (partitioned by room_id and month)")
@@ -1,6 +1,13 @@
+import argparse
+import time
+
 import pandas as pd
 import numpy as np
-import datetime
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional: the recurrence then runs as plain Python over lists of floats
+    njit = None
 
 # --- CONFIGURATION PARAMETERS ---
 
@@ -8,11 +15,13 @@ import datetime
 DATA_START_DATE = "2024-01-01"
 DATA_END_DATE = "2024-12-31"
 TIME_FREQUENCY_MIN = 5
+SEED = 42                    # Same seed -> bit-identical dataset
 
 # Room thermal properties
 HEAT_TRANSFER_COEFFICIENT = 0.015
 HEAT_FROM_OCCUPANT = 0.02
 AC_MAX_COOLING_POWER = 0.7
+START_ROOM_TEMP = 26.0
 
 # Smart AC & Fan Control Parameters
 AC_TEMP_SETTING_MIN = 20.0
@@ -36,122 +45,218 @@ WEEKDAY_OCCUPANCY_PROB = {
     16: (0.5, 20), 17: (0.1, 20), 18: (0.05, 20), **{h: (0.0, 0) for h in range(19, 24)},
 }
 WEEKEND_OCCUPANCY_PROB = 0.05
+WEEKEND_MAX_OCCUPANTS = 2
+WEEKDAY_SESSION_MIN = (30, 240)
+WEEKEND_SESSION_MIN = (30, 120)
 
 # Thermostat simulation logic
 COMFORT_TEMP_MAX = 23.0
 COMFORT_TEMP_MIN = 21.0
 
-# --- DATA GENERATION FUNCTIONS (Unchanged) ---
+# Control modes of the thermostat: (compressor on, fan speed, AC setting, reason)
+CONTROL_MODES = [
+    (False, 'off', np.nan, "SYSTEM OFF: Room unoccupied"),
+    (True, 'high', AC_TEMP_SETTING_MIN, "ACTION: Aggressive cooling (very hot)"),
+    (True, 'medium', AC_TEMP_SETTING_HIGH, "ACTION: Normal cooling (warm)"),
+    (True, 'low', AC_TEMP_SETTING_ECO, "ACTION: Gentle cooling (slightly warm)"),
+    (False, 'low', np.nan, "MAINTAIN: Temp in comfort zone, circulating air"),
+    (False, 'off', np.nan, "SYSTEM OFF: Temp below comfort min"),
+]
+MODE_FAN_SPEED = np.array([m[1] for m in CONTROL_MODES], dtype=object)
+MODE_AC_SETTING = np.array([m[2] for m in CONTROL_MODES])
+MODE_REASON = np.array([m[3] for m in CONTROL_MODES], dtype=object)
+MODE_POWER_KW = np.array([POWER_CONSUMPTION_KW[f'fan_{fan}'] + (POWER_CONSUMPTION_KW['compressor'] if on else 0.0)
+                          for on, fan, _, _ in CONTROL_MODES])
+
+
+def _mode_cooling(max_cooling):
+    """
+    Temperature drop per step of every control mode (0 when the compressor is off).
+    """
+    return np.array([max_cooling * ((AC_TEMP_SETTING_ECO - setting) / (AC_TEMP_SETTING_ECO - AC_TEMP_SETTING_MIN))
+                     + FAN_COOLING_EFFECT[fan] if on else 0.0
+                     for on, fan, setting, _ in CONTROL_MODES])
+
+
+def _get_rng(rng):
+    return np.random.default_rng(SEED) if rng is None else rng
+
+
+# --- DATA GENERATION FUNCTIONS ---
 def generate_base_timeline(start_date, end_date, freq_min):
     print(f"Generating timeline from {start_date} to {end_date}...")
-    timeline = pd.DataFrame(pd.date_range(start=start_date, end=end_date, freq=f'{freq_min}T'), columns=['timestamp'])
+    timeline = pd.DataFrame(pd.date_range(start=start_date, end=end_date, freq=f'{freq_min}min'), columns=['timestamp'])
     timeline['hour_of_day'] = timeline['timestamp'].dt.hour; timeline['day_of_week'] = timeline['timestamp'].dt.dayofweek; timeline['day_of_year'] = timeline['timestamp'].dt.dayofyear
     return timeline
 
-def simulate_weather(df):
+def simulate_weather(df, rng=None):
     print("Simulating weather patterns...")
-    seasonal_effect = 1.5 * np.sin(2 * np.pi * df['day_of_year'] / 365.25); daily_effect = -4 * np.cos(2 * np.pi * (df['hour_of_day'] - 2) / 24)
-    df['outside_temp'] = 28 + seasonal_effect + daily_effect + np.random.normal(0, 0.2, len(df))
-    df['outside_humidity'] = np.clip(75 + (df['outside_temp'] - 28) * 5 + np.random.normal(0, 5, len(df)), 60, 95)
-    conditions = ['sunny', 'cloudy', 'rainy']
-    day_mask = (df['hour_of_day'] >= 7) & (df['hour_of_day'] <= 18)
-    df.loc[day_mask, 'weather_condition'] = np.random.choice(conditions, size=day_mask.sum(), p=[0.6, 0.3, 0.1])
-    df.loc[~day_mask, 'weather_condition'] = np.random.choice(conditions[1:], size=(~day_mask).sum(), p=[0.7, 0.3])
+    rng = _get_rng(rng); n = len(df)
+    hour = df['hour_of_day'].to_numpy(); day_of_year = df['day_of_year'].to_numpy()
+    seasonal_effect = 1.5 * np.sin(2 * np.pi * day_of_year / 365.25); daily_effect = -4 * np.cos(2 * np.pi * (hour - 2) / 24)
+    outside_temp = 28 + seasonal_effect + daily_effect + rng.normal(0, 0.2, n)
+    df['outside_temp'] = outside_temp
+    df['outside_humidity'] = np.clip(75 + (outside_temp - 28) * 5 + rng.normal(0, 5, n), 60, 95)
+    conditions = np.array(['sunny', 'cloudy', 'rainy'], dtype=object)
+    day_mask = (hour >= 7) & (hour <= 18)
+    weather = np.empty(n, dtype=object)
+    weather[day_mask] = rng.choice(conditions, size=int(day_mask.sum()), p=[0.6, 0.3, 0.1])
+    weather[~day_mask] = rng.choice(conditions[1:], size=int((~day_mask).sum()), p=[0.7, 0.3])
+    df['weather_condition'] = weather
     return df
 
-def simulate_occupancy(df):
+def sample_sessions(hour, day_of_week, rng, freq_min=TIME_FREQUENCY_MIN,
+                    weekday_prob=WEEKDAY_OCCUPANCY_PROB, weekend_prob=WEEKEND_OCCUPANCY_PROB,
+                    weekend_max=WEEKEND_MAX_OCCUPANTS):
+    """
+    Run-length session sampling.
+    A free step starts a session with the probability of its hour; a session keeps its occupant count for
+    int(length / freq_min) more steps, and the step after it is free again. All draws are made up front
+    with NumPy, so only the session starts are walked in Python (a few thousand per year, not every row).
+
+    Args:
+        hour (np.ndarray): Hour of day of every step.
+        day_of_week (np.ndarray): 0 = Monday of every step.
+        rng (np.random.Generator): Random source.
+
+    Returns:
+        tuple: (starts, ends, occupants) arrays, ends inclusive.
+    """
+    hour = np.asarray(hour); weekend = np.asarray(day_of_week) >= 5
+    hour_prob = np.array([weekday_prob[h][0] for h in range(24)])
+    hour_max = np.array([weekday_prob[h][1] for h in range(24)])
+    prob = np.where(weekend, weekend_prob, np.where(hour_max[hour] > 0, hour_prob[hour], 0.0))
+
+    candidates = np.flatnonzero(rng.random(len(hour)) < prob)
+    cand_weekend = weekend[candidates]
+    max_occ = np.where(cand_weekend, weekend_max, hour_max[hour[candidates]])
+    occupants = rng.integers(1, max_occ + 1)
+    minutes = rng.uniform(np.where(cand_weekend, WEEKEND_SESSION_MIN[0], WEEKDAY_SESSION_MIN[0]),
+                          np.where(cand_weekend, WEEKEND_SESSION_MIN[1], WEEKDAY_SESSION_MIN[1]))
+    ends = candidates + (minutes / freq_min).astype(np.int64)
+
+    # Candidates inside a running session are not sessions: jump from one session end to the next start
+    chosen = []
+    k = 0
+    while k < len(candidates):
+        chosen.append(k)
+        k = int(np.searchsorted(candidates, ends[k] + 1))
+    chosen = np.asarray(chosen, dtype=np.int64)
+    return candidates[chosen], np.minimum(ends[chosen], len(hour) - 1), occupants[chosen]
+
+def expand_sessions(starts, ends, occupants, n):
+    """
+    Occupant count of every step from sample_sessions() output.
+    Sessions never overlap, so +count at the start and -count after the end expands them row by row.
+    """
+    delta = np.bincount(starts, weights=occupants, minlength=n + 1) - np.bincount(ends + 1, weights=occupants, minlength=n + 1)
+    return np.cumsum(delta[:n])
+
+def simulate_occupancy(df, rng=None, freq_min=TIME_FREQUENCY_MIN):
     print("Simulating room occupancy...")
-    occupancy = np.zeros(len(df)); occupancy_duration_steps = 0; current_occupants = 0
-    for i, row in df.iterrows():
-        if occupancy_duration_steps > 0:
-            occupancy[i] = current_occupants; occupancy_duration_steps -= 1
-        else:
-            current_occupants = 0; occupancy[i] = 0; is_weekday = row['day_of_week'] < 5
-            if is_weekday:
-                prob, max_occ = WEEKDAY_OCCUPANCY_PROB[row['hour_of_day']]
-                if np.random.rand() < prob and max_occ > 0:
-                    current_occupants = np.random.randint(1, max_occ + 1); session_length_minutes = np.random.uniform(30, 240)
-                    occupancy_duration_steps = int(session_length_minutes / TIME_FREQUENCY_MIN); occupancy[i] = current_occupants
-            else:
-                if np.random.rand() < WEEKEND_OCCUPANCY_PROB:
-                    current_occupants = np.random.randint(1, 3); session_length_minutes = np.random.uniform(30, 120)
-                    occupancy_duration_steps = int(session_length_minutes / TIME_FREQUENCY_MIN); occupancy[i] = current_occupants
-    df['occupancy_count'] = occupancy; df['is_occupied'] = (df['occupancy_count'] > 0).astype(int)
+    rng = _get_rng(rng); n = len(df)
+    starts, ends, occupants = sample_sessions(df['hour_of_day'].to_numpy(), df['day_of_week'].to_numpy(), rng, freq_min)
+    df['occupancy_count'] = expand_sessions(starts, ends, occupants, n); df['is_occupied'] = (df['occupancy_count'] > 0).astype(int)
     return df
 
-def simulate_room_thermodynamics(df):
+def _thermo_kernel(outside_temp, occupancy, noise, start_temp, heat_transfer, heat_from_occupant, mode_cooling,
+                   room_temp, mode):
+    """
+    The thermostat/room recurrence over plain float sequences; fills room_temp and mode in place.
+    Kept to scalar arithmetic so numba can compile it unchanged.
+    """
+    current_temp = start_temp
+    for i in range(len(outside_temp)):
+        occupants = occupancy[i]
+        if occupants <= 0:
+            m = 0
+        elif current_temp > COMFORT_TEMP_MAX + 1.5:
+            m = 1
+        elif current_temp > COMFORT_TEMP_MAX + 0.5:
+            m = 2
+        elif current_temp > COMFORT_TEMP_MAX:
+            m = 3
+        elif current_temp >= COMFORT_TEMP_MIN:
+            m = 4
+        else:
+            m = 5
+        temp_delta = (outside_temp[i] - current_temp) * heat_transfer
+        temp_delta += occupants * heat_from_occupant
+        temp_delta -= mode_cooling[m]
+        current_temp += temp_delta + noise[i]
+        room_temp[i] = current_temp
+        mode[i] = m
+
+_thermo_kernel_jit = njit(cache=True)(_thermo_kernel) if njit is not None else None
+
+def run_thermodynamics(outside_temp, occupancy, noise, start_temp=START_ROOM_TEMP,
+                       heat_transfer=HEAT_TRANSFER_COEFFICIENT, heat_from_occupant=HEAT_FROM_OCCUPANT,
+                       max_cooling=AC_MAX_COOLING_POWER):
+    """
+    Returns (room_temp, mode) arrays; mode indexes CONTROL_MODES.
+    Uses the numba build of the kernel when numba is installed, plain Python over lists otherwise;
+    both evaluate the same float operations in the same order.
+    """
+    n = len(outside_temp)
+    mode_cooling = _mode_cooling(max_cooling)
+    if _thermo_kernel_jit is not None:
+        room_temp = np.empty(n); mode = np.empty(n, dtype=np.int8)
+        _thermo_kernel_jit(np.asarray(outside_temp, dtype=np.float64), np.asarray(occupancy, dtype=np.float64),
+                           np.asarray(noise, dtype=np.float64), start_temp, heat_transfer, heat_from_occupant,
+                           mode_cooling, room_temp, mode)
+        return room_temp, mode
+    room_temp = [0.0] * n; mode = [0] * n
+    _thermo_kernel(np.asarray(outside_temp, dtype=np.float64).tolist(), np.asarray(occupancy, dtype=np.float64).tolist(),
+                   np.asarray(noise, dtype=np.float64).tolist(), float(start_temp), heat_transfer, heat_from_occupant,
+                   mode_cooling.tolist(), room_temp, mode)
+    return np.array(room_temp), np.array(mode, dtype=np.int8)
+
+def simulate_room_thermodynamics(df, rng=None, start_temp=START_ROOM_TEMP, heat_transfer=HEAT_TRANSFER_COEFFICIENT,
+                                 heat_from_occupant=HEAT_FROM_OCCUPANT, max_cooling=AC_MAX_COOLING_POWER):
     """
     Simulates thermodynamics with a realistic power consumption model.
+    The control decision of every step is taken on the temperature before the step, as before; the
+    per-mode power, fan speed, setting and reason are looked up from the mode array afterwards.
     """
     print("Simulating room thermodynamics with detailed power consumption...")
-    room_temps = []
-    power_draws_kw = [] # REPLACES ac_power_states
-    ac_reasons = []
-    fan_speeds = []
-    ac_temp_settings = []
-
-    current_temp = 26.0
-    compressor_on = False
-
-    for _, row in df.iterrows():
-        # --- 1. SMART CONTROL DECISION LOGIC (Same logic, determines state) ---
-        if not row['is_occupied']:
-            compressor_on = False; fan_speed = 'off'; ac_temp_setting = np.nan
-            reason = "SYSTEM OFF: Room unoccupied"
-        elif current_temp > COMFORT_TEMP_MAX:
-            compressor_on = True
-            if current_temp > COMFORT_TEMP_MAX + 1.5:
-                fan_speed = 'high'; ac_temp_setting = AC_TEMP_SETTING_MIN; reason = "ACTION: Aggressive cooling (very hot)"
-            elif current_temp > COMFORT_TEMP_MAX + 0.5:
-                fan_speed = 'medium'; ac_temp_setting = AC_TEMP_SETTING_HIGH; reason = "ACTION: Normal cooling (warm)"
-            else:
-                fan_speed = 'low'; ac_temp_setting = AC_TEMP_SETTING_ECO; reason = "ACTION: Gentle cooling (slightly warm)"
-        elif current_temp >= COMFORT_TEMP_MIN and current_temp <= COMFORT_TEMP_MAX:
-            compressor_on = False; fan_speed = 'low'; ac_temp_setting = np.nan
-            reason = "MAINTAIN: Temp in comfort zone, circulating air"
-        else: # current_temp < COMFORT_TEMP_MIN
-            compressor_on = False; fan_speed = 'off'; ac_temp_setting = np.nan
-            reason = "SYSTEM OFF: Temp below comfort min"
-
-        # --- 2. CALCULATE POWER CONSUMPTION FOR THE CURRENT STATE ---
-        current_power = POWER_CONSUMPTION_KW[f'fan_{fan_speed}']
-        if compressor_on:
-            current_power += POWER_CONSUMPTION_KW['compressor']
-        
-        # --- 3. CALCULATE TEMPERATURE CHANGE ---
-        temp_delta = (row['outside_temp'] - current_temp) * HEAT_TRANSFER_COEFFICIENT
-        temp_delta += row['occupancy_count'] * HEAT_FROM_OCCUPANT
-        if compressor_on:
-            base_cooling = AC_MAX_COOLING_POWER * ((AC_TEMP_SETTING_ECO - ac_temp_setting) / (AC_TEMP_SETTING_ECO - AC_TEMP_SETTING_MIN))
-            total_cooling = base_cooling + FAN_COOLING_EFFECT[fan_speed]
-            temp_delta -= total_cooling
-
-        # --- 4. UPDATE STATE FOR NEXT ITERATION ---
-        current_temp += temp_delta + np.random.normal(0, 0.05)
-        
-        room_temps.append(current_temp)
-        power_draws_kw.append(current_power)
-        ac_reasons.append(reason)
-        fan_speeds.append(fan_speed)
-        ac_temp_settings.append(ac_temp_setting)
-
-    df['room_temp'] = room_temps
-    df['power_kw'] = power_draws_kw
-    df['fan_speed'] = fan_speeds
-    df['ac_temp_setting'] = ac_temp_settings
-    df['ac_control_reason'] = ac_reasons
+    rng = _get_rng(rng)
+    noise = rng.normal(0, 0.05, len(df))
+    room_temp, mode = run_thermodynamics(df['outside_temp'].to_numpy(), df['occupancy_count'].to_numpy(), noise,
+                                         start_temp, heat_transfer, heat_from_occupant, max_cooling)
+    df['room_temp'] = room_temp
+    df['power_kw'] = MODE_POWER_KW[mode]
+    df['fan_speed'] = MODE_FAN_SPEED[mode]
+    df['ac_temp_setting'] = MODE_AC_SETTING[mode]
+    df['ac_control_reason'] = MODE_REASON[mode]
     return df
 
+def synthesize(start_date=DATA_START_DATE, end_date=DATA_END_DATE, freq_min=TIME_FREQUENCY_MIN, seed=SEED):
+    """
+    Builds the full dataset for one room. The same seed always gives the same (bit-identical) data.
+    """
+    rng = np.random.default_rng(seed)
+    df = generate_base_timeline(start_date, end_date, freq_min)
+    df = simulate_weather(df, rng)
+    df = simulate_occupancy(df, rng, freq_min)
+    return simulate_room_thermodynamics(df, rng)
+
 # --- Main Script Execution ---
 if __name__ == "__main__":
-    main_df = generate_base_timeline(DATA_START_DATE, DATA_END_DATE, TIME_FREQUENCY_MIN)
-    main_df = simulate_weather(main_df)
-    main_df = simulate_occupancy(main_df)
-    main_df = simulate_room_thermodynamics(main_df)
+    parser = argparse.ArgumentParser(description="Synthesize the smart HVAC dataset.")
+    parser.add_argument("--start", default=DATA_START_DATE)
+    parser.add_argument("--end", default=DATA_END_DATE)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default="smart_hvac_control_data_v7_final.csv")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    main_df = synthesize(args.start, args.end, TIME_FREQUENCY_MIN, args.seed)
+    print(f"Simulated {len(main_df)} rows in {time.perf_counter() - started:.2f} s "
+          f"({'numba' if _thermo_kernel_jit is not None else 'pure Python'} recurrence)")
 
     print("\nSaving dataset for Final Advanced HVAC Model...")
-    main_df.to_csv("smart_hvac_control_data_v7_final.csv", index=False)
-    print("Dataset saved as 'smart_hvac_control_data_v7_final.csv'")
+    main_df.to_csv(args.output, index=False)
+    print(f"Dataset saved as '{args.output}'")
 
     print("\n--- Sample of Final Data with Detailed Power Consumption ---")
     maintain_examples = main_df[main_df['ac_control_reason'].str.contains("MAINTAIN")]
@@ -164,4 +269,4 @@ if __name__ == "__main__":
     else:
         print("No 'MAINTAIN' state examples found in the first few rows.")
 
-    print("\nData generation complete!")
\ No newline at end of file
+    print("\nData generation complete!")
@@ -0,0 +1,218 @@
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "occupancy_pred_model"))
+sys.path.insert(0, os.path.join(BASE_DIR, "temperature_control_model"))
+sys.path.insert(0, os.path.join(BASE_DIR, "time_to_cool_model"))
+
+from OccupancyPred import OccupancyPred  # noqa: E402
+from occupancy_features import N_FEATURES  # noqa: E402
+from fused_control import FusedControlPredictor, FAN_SPEED_CLASSES  # noqa: E402
+from time_to_cool_features import TimeToCoolFeatureEngine  # noqa: E402
+from model_registry import default_registry  # noqa: E402
+
+# --- CONFIGURATION PARAMETERS ---
+OCCUPANCY_MODEL_PATH = os.path.join(BASE_DIR, "occupancy_pred_model", "occupancy_pred.joblib")
+TIME_TO_COOL_MODEL_PATH = os.path.join(BASE_DIR, "time_to_cool_model", "time_to_cool_model.pkl")
+FAN_MODEL_PATH = os.path.join(BASE_DIR, "temperature_control_model", "best_fan_model.joblib")
+TEMP_MODEL_PATH = os.path.join(BASE_DIR, "temperature_control_model", "best_temp_model.joblib")
+POWER_MODEL_PATH = os.path.join(BASE_DIR, "temperature_control_model", "best_power_model.joblib")
+
+CONTROL_COLUMNS = ['room_temp', 'outside_temp', 'weather_condition', 'is_peak_hour', 'temp_diff', 'set_point_diff',
+                   'hour_sin', 'hour_cos', 'dayofweek_sin', 'dayofweek_cos']
+
+RoomPrediction = namedtuple("RoomPrediction", ["room_id", "occupancy_prob", "time_to_cool_min", "fan_speed",
+                                               "ac_temp_setting", "power_kw"])
+
+
+class BatchPredictor:
+    """
+    Loads the occupancy, time-to-cool and temperature-control (fan/temp/power) models once and
+    scores many rooms with one vectorized call per model.
+    - Occupancy and time-to-cool features come from per-room streaming states (lags and 15-minute rolling
+      windows), so predict_batch() must be called with every new reading of a room (e.g. every 5 minutes),
+      in time order.
+    - With a ModelRegistry every model comes from the registry, so it is loaded once per process and
+      shared with every other user of that registry.
+    """
+
+    def __init__(self, occupancy_path=OCCUPANCY_MODEL_PATH, time_to_cool_path=TIME_TO_COOL_MODEL_PATH,
+                 fan_path=FAN_MODEL_PATH, temp_path=TEMP_MODEL_PATH, power_path=POWER_MODEL_PATH, registry=None):
+        if registry is not None:
+            self.occupancy = OccupancyPred(model=registry.get("occupancy_pred"))
+            time_to_cool = registry.get("time_to_cool_model")
+            # fan/temp/power share one fitted preprocessing step, run once per batch
+            self.control = FusedControlPredictor.from_registry(registry)
+        else:
+            self.occupancy = OccupancyPred(occupancy_path)
+            time_to_cool = joblib.load(time_to_cool_path)
+            self.control = FusedControlPredictor({"fan_speed": fan_path, "ac_temp_setting": temp_path,
+                                                  "power_kw": power_path})
+        # The Booster, not the LGBMRegressor wrapper: the pickled wrapper's predict() fails on newer lightgbm versions
+        self.time_to_cool = time_to_cool.booster_
+        # Rolling-window state per room, laid out in the booster's feature order
+        self.time_to_cool_state = TimeToCoolFeatureEngine(self.time_to_cool.feature_name())
+
+    # ---------- Feature matrices ----------
+    @staticmethod
+    def _frame(rooms):
+        df = pd.DataFrame(rooms)
+        if not {'hour_of_day', 'day_of_week'} <= set(df.columns):
+            ts = pd.to_datetime(df['timestamp'])
+            df['hour_of_day'] = ts.dt.hour
+            df['day_of_week'] = ts.dt.dayofweek
+        return df
+
+    def occupancy_matrix(self, rooms):
+        """
+        Advances every room's feature state by its reading and returns the (rooms, 21) feature matrix.
+        """
+        X = np.empty((len(rooms), N_FEATURES))
+        for i, room in enumerate(rooms):
+            self.occupancy.features.update(room['room_id'], room, out=X[i])
+        return X
+
+    def time_to_cool_matrix(self, rooms):
+        """
+        Advances every room's rolling time-to-cool state by its reading and returns the aligned feature matrix.
+        """
+        X = np.empty((len(rooms), self.time_to_cool_state.layout.n_features))
+        for i, room in enumerate(rooms):
+            self.time_to_cool_state.update(room['room_id'], room, out=X[i])
+        return X
+
+    @staticmethod
+    def control_frame(df):
+        """
+        Inputs of the temperature-control pipelines (same engineering as temperature_control.ipynb).
+        """
+        hour = df['hour_of_day'].to_numpy(dtype=np.float64)
+        dow = df['day_of_week'].to_numpy(dtype=np.float64)
+        room_temp = df['room_temp'].to_numpy(dtype=np.float64)
+        outside_temp = df['outside_temp'].to_numpy(dtype=np.float64)
+        setting = pd.to_numeric(df['ac_temp_setting'], errors='coerce').to_numpy(dtype=np.float64)
+        set_point_diff = room_temp - setting
+        return pd.DataFrame({
+            'room_temp': room_temp,
+            'outside_temp': outside_temp,
+            'weather_condition': df['weather_condition'].to_numpy(),
+            'is_peak_hour': ((hour >= 12) & (hour <= 17)).astype(int),
+            'temp_diff': room_temp - outside_temp,
+            'set_point_diff': np.where(np.isnan(set_point_diff), 0.0, set_point_diff),
+            'hour_sin': np.sin(2 * np.pi * hour / 24.0),
+            'hour_cos': np.cos(2 * np.pi * hour / 24.0),
+            'dayofweek_sin': np.sin(2 * np.pi * dow / 7.0),
+            'dayofweek_cos': np.cos(2 * np.pi * dow / 7.0),
+        }, columns=CONTROL_COLUMNS)
+
+    # ---------- Prediction ----------
+    def observe(self, rooms):
+        """
+        Advances the occupancy and time-to-cool states of the rooms by their readings without scoring,
+        for callers that only score some of the rooms (see precooling_scheduler.py).
+        """
+        for room in rooms:
+            self.occupancy.features.update(room['room_id'], room)
+            self.time_to_cool_state.update(room['room_id'], room)
+
+    def score(self, room_ids, time_to_cool_overrides=None):
+        """
+        Occupancy probability and time-to-cool of the rooms from their latest observed readings.
+
+        Args:
+            room_ids (list): Rooms to score, all observed before.
+            time_to_cool_overrides (dict): Feature name -> value replacing the observed one in every row,
+                e.g. the AC features of a control action to predict the time-to-cool under that action.
+
+        Returns:
+            tuple: (occupancy_prob, time_to_cool_min) arrays in the order of room_ids.
+        """
+        if not room_ids:
+            return np.empty(0), np.empty(0)
+        occupancy = self.occupancy.predict_vector(self.occupancy.features.matrix(room_ids))
+        X = self.time_to_cool_state.matrix(room_ids)
+        for name, value in (time_to_cool_overrides or {}).items():
+            X[:, self.time_to_cool_state.layout.index[name]] = value
+        time_to_cool = self.time_to_cool.predict(X)
+        return occupancy, time_to_cool
+
+    def predict_batch(self, rooms):
+        """
+        Args:
+            rooms (list): One dict per room: room_id plus the latest reading with the dataset columns
+                (timestamp, room_temp, outside_temp, outside_humidity, weather_condition, occupancy_count,
+                is_occupied, power_kw, fan_speed, ac_temp_setting, ...).
+
+        Returns:
+            list: RoomPrediction per room, in the order of rooms.
+        """
+        if not rooms:
+            return []
+        df = self._frame(rooms)
+        occupancy = self.occupancy.predict_vector(self.occupancy_matrix(rooms))
+        time_to_cool = self.time_to_cool.predict(self.time_to_cool_matrix(rooms))
+        control = self.control.predict(self.control_frame(df))
+        fan, temp, power = control["fan_speed"], control["ac_temp_setting"], control["power_kw"]
+        return [RoomPrediction(room['room_id'], float(occupancy[i]), float(time_to_cool[i]),
+                               FAN_SPEED_CLASSES.get(int(fan[i]), str(fan[i])), float(temp[i]), float(power[i]))
+                for i, room in enumerate(rooms)]
+
+
+# --- Batched vs per-room scoring ---
+def _per_room(predictor, rooms):
+    """
+    One call per room and model, as OccupancyPred/demo_prediction.py/run_simulation.py are used today.
+    """
+    results = []
+    for room in rooms:
+        df = predictor._frame([room])
+        occupancy = predictor.occupancy.predict_vector(predictor.occupancy.features.update(room['room_id'], room))
+        time_to_cool = predictor.time_to_cool.predict(predictor.time_to_cool_state.update(room['room_id'], room)[None, :])[0]
+        control = predictor.control.predict_pipelines(predictor.control_frame(df))
+        results.append((occupancy, time_to_cool, control["fan_speed"][0], control["ac_temp_setting"][0],
+                        control["power_kw"][0]))
+    return results
+
+
+def run_benchmark(n_rooms, csv_path, steps):
+    rows = pd.read_csv(csv_path).to_dict("records")
+    # Both predictors share the models of the process-wide registry; only their per-room feature states differ
+    registry = default_registry()
+    batched, single = BatchPredictor(registry=registry), BatchPredictor(registry=registry)
+
+    batch_s = single_s = 0.0
+    for step in range(steps):
+        rooms = [{**rows[(room_id + step) % len(rows)], 'room_id': room_id} for room_id in range(n_rooms)]
+        started = time.perf_counter()
+        results = batched.predict_batch(rooms)
+        batch_s += time.perf_counter() - started
+        started = time.perf_counter()
+        reference = _per_room(single, rooms)
+        single_s += time.perf_counter() - started
+        for r, (occ, ttc, fan, temp, power) in zip(results, reference):
+            assert abs(r.occupancy_prob - occ) < 1e-6 and abs(r.time_to_cool_min - ttc) < 1e-6
+            assert r.fan_speed == FAN_SPEED_CLASSES[int(fan)] and abs(r.ac_temp_setting - temp) < 1e-6
+            assert abs(r.power_kw - power) < 1e-6
+
+    print(f"{n_rooms} rooms x {steps} steps, identical results")
+    print(f"  - predict_batch: {batch_s * 1000 / steps:.1f} ms per step ({batch_s * 1e6 / steps / n_rooms:.0f} us/room)")
+    print(f"  - per room:      {single_s * 1000 / steps:.1f} ms per step ({single_s * 1e6 / steps / n_rooms:.0f} us/room)")
+    print(f"  - speed-up {single_s / batch_s:.1f}x")
+    print(f"Example: {results[0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score many rooms with all models and compare with per-room calls.")
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--steps", type=int, default=4, help="consecutive 5-minute readings per room")
+    parser.add_argument("--csv", default=os.path.join(BASE_DIR, "occupancy_pred_model", "testset.csv"))
+    args = parser.parse_args()
+    run_benchmark(args.rooms, args.csv, args.steps)
@@ -0,0 +1,429 @@
+import argparse
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- CONFIGURATION PARAMETERS ---
+COMPILED_DIR = os.path.join(BASE_DIR, "compiled")
+CHUNK_CELLS = 1 << 18        # rows x trees evaluated per block, keeps the working set in cache
+LGBM_ZERO_THRESHOLD = 1e-35  # |x| below this is 'zero' for LightGBM missing_type='Zero'
+
+# Aggregation of the per-tree leaf values
+MEAN = "mean"                # sklearn forests
+SUM = "sum"                  # gradient boosting, raw score
+SUM_LOGISTIC = "sum_logistic"
+
+# Per-node handling of NaN inputs
+MISSING_DEFAULT = 0          # NaN follows default_left
+MISSING_AS_ZERO = 1          # LightGBM missing_type='None': NaN is compared as 0.0
+MISSING_ZERO_DEFAULT = 2     # LightGBM missing_type='Zero': NaN and 0 follow default_left
+
+
+class FlatForest:
+    """
+    A tree ensemble as flat node arrays (feature, threshold, left/right child, default direction, leaf values).
+    - All trees live in one node array; all (row, tree) pairs of a batch are advanced one level at a time
+      with a few vectorized gathers and no per-node Python.
+    - Every split is "x <= threshold goes left"; XGBoost's "x < split" is stored as the next float32 below split.
+    - float32_inputs: inputs are rounded to float32 first, as sklearn and XGBoost do.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, missing, value, roots, max_depth,
+                 aggregation, base_score=0.0, classes=None, float32_inputs=False, n_features=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing = np.asarray(missing, dtype=np.int8)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.max_depth = int(max_depth)
+        self.aggregation = aggregation
+        self.base_score = float(base_score)
+        self.classes = None if classes is None else np.asarray(classes)
+        self.float32_inputs = bool(float32_inputs)
+        self.n_features = int(n_features if n_features is not None else self.feature.max() + 1)
+        self._compile()
+
+    def _compile(self):
+        """
+        Derives the evaluation arrays. Each split becomes one comparison "sign * x > cut" whose False outcome
+        (which includes NaN) selects children[2 * node] = the default child and True selects the other one.
+        Leaves compare against +inf and point to themselves.
+        """
+        n = self.n_nodes
+        nodes = np.arange(n)
+        self._is_leaf = self.left == nodes
+        default_left = self.default_left | self._is_leaf
+        self._sign = np.where(default_left, 1.0, -1.0)
+        # Default right: x <= t  <=>  x < next(t)  <=>  -x > -next(t)
+        self._cut = np.where(default_left, self.threshold, -np.nextafter(self.threshold, np.inf))
+        self._cut[self._is_leaf] = np.inf
+        self._children = np.empty(2 * n, dtype=np.int32)
+        self._children[0::2] = np.where(default_left, self.left, self.right)
+        self._children[1::2] = np.where(default_left, self.right, self.left)
+
+        # LightGBM missing_type='None' on every split of a feature: NaN can be replaced by 0 up front
+        split = ~self._is_leaf
+        special = split & (self.missing != MISSING_DEFAULT)
+        per_feature = {}
+        for f, m in zip(self.feature[split], self.missing[split]):
+            per_feature.setdefault(int(f), set()).add(int(m))
+        self._zero_fill = np.array(sorted(f for f, kinds in per_feature.items() if kinds == {MISSING_AS_ZERO}), dtype=np.int64)
+        filled = np.isin(self.feature, self._zero_fill)
+        self._as_zero = special & (self.missing == MISSING_AS_ZERO) & ~filled
+        self._zero_default = special & (self.missing == MISSING_ZERO_DEFAULT)
+        self._per_node_missing = bool(self._as_zero.any() or self._zero_default.any())
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    # ---------- Evaluation ----------
+    def _leaves(self, X):
+        """
+        Leaf index of every (row, tree) pair, shape (rows, trees).
+        Pairs that reached their leaf are dropped from the working set, so the cost follows the
+        actual path lengths rather than the deepest tree.
+        """
+        n, n_features = X.shape
+        n_trees = self.n_trees
+        flat_x = X.ravel()
+        offset = np.repeat(np.arange(n, dtype=np.int64) * n_features, n_trees)
+        position = np.arange(n * n_trees)
+        idx = np.tile(self.roots, n)
+        out = np.empty(n * n_trees, dtype=np.int32)
+        special = self._per_node_missing and bool(np.isnan(X).any() or self._zero_default.any())
+        while len(idx):
+            x = flat_x[offset + self.feature[idx]]
+            if special:
+                x = np.where(np.isnan(x) & self._as_zero[idx], 0.0, x)
+                x = np.where(self._zero_default[idx] & (np.abs(x) <= LGBM_ZERO_THRESHOLD), np.nan, x)
+            idx = self._children[2 * idx + (self._sign[idx] * x > self._cut[idx])]
+            done = self._is_leaf[idx]
+            if done.any():
+                out[position[done]] = idx[done]
+                keep = ~done
+                idx, offset, position = idx[keep], offset[keep], position[keep]
+        return out.reshape(n, n_trees)
+
+    def raw(self, X):
+        """
+        Aggregated leaf values before the link function: (rows,) or (rows, classes) for forest classifiers.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.float32_inputs:
+            X = X.astype(np.float32).astype(np.float64)
+        if len(self._zero_fill):
+            X = X.copy() if not self.float32_inputs else X
+            cols = X[:, self._zero_fill]
+            cols[np.isnan(cols)] = 0.0
+            X[:, self._zero_fill] = cols
+        chunk = max(1, CHUNK_CELLS // max(self.n_trees, 1))
+        out = []
+        for start in range(0, len(X), chunk):
+            leaf_values = self.value[self._leaves(X[start:start + chunk])]
+            if self.aggregation == MEAN:
+                out.append(leaf_values.mean(axis=1))
+            else:
+                out.append(self.base_score + leaf_values.sum(axis=1))
+        return np.concatenate(out) if out else np.zeros((0,) + self.value.shape[1:])
+
+    def predict_proba(self, X):
+        raw = self.raw(X)
+        if self.aggregation == SUM_LOGISTIC:
+            p = 1.0 / (1.0 + np.exp(-raw))
+            return np.column_stack([1.0 - p, p])
+        if raw.ndim == 2:
+            return raw
+        raise ValueError("predict_proba needs a classifier")
+
+    def predict(self, X):
+        """
+        Same semantics as the original model's predict(): class labels for classifiers, values for regressors.
+        """
+        raw = self.raw(X)
+        if self.aggregation == SUM_LOGISTIC:
+            labels = (raw > 0).astype(int)
+            return self.classes[labels] if self.classes is not None else labels
+        if raw.ndim == 2:
+            return self.classes[np.argmax(raw, axis=1)]
+        return raw
+
+    # ---------- Persistence ----------
+    def save(self, path):
+        meta = {"max_depth": self.max_depth, "aggregation": self.aggregation, "base_score": self.base_score,
+                "float32_inputs": self.float32_inputs, "n_features": self.n_features}
+        arrays = dict(feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                      default_left=self.default_left, missing=self.missing, value=self.value, roots=self.roots)
+        if self.classes is not None:
+            arrays["classes"] = self.classes
+        np.savez_compressed(path, meta=json.dumps(meta), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            classes = data["classes"] if "classes" in data.files else None
+            return cls(data["feature"], data["threshold"], data["left"], data["right"], data["default_left"],
+                       data["missing"], data["value"], data["roots"], meta["max_depth"], meta["aggregation"],
+                       meta["base_score"], classes, meta["float32_inputs"], meta["n_features"])
+
+
+class _Builder:
+    def __init__(self, value_width=None):
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.default_left, self.missing, self.value, self.roots = [], [], [], []
+        self.value_width = value_width
+        self.max_depth = 0
+
+    def node(self):
+        i = len(self.feature)
+        self.feature.append(0)
+        self.threshold.append(np.inf)
+        self.left.append(i)
+        self.right.append(i)
+        self.default_left.append(True)
+        self.missing.append(MISSING_DEFAULT)
+        self.value.append(0.0 if self.value_width is None else np.zeros(self.value_width))
+        return i
+
+    def build(self, aggregation, **kwargs):
+        return FlatForest(self.feature, self.threshold, self.left, self.right, self.default_left, self.missing,
+                          np.array(self.value), self.roots, self.max_depth, aggregation, **kwargs)
+
+
+# --- Exporters ---
+def from_sklearn_forest(forest):
+    """
+    RandomForestClassifier/Regressor (and other sklearn tree ensembles averaging their trees).
+    """
+    is_classifier = hasattr(forest, "classes_")
+    builder = _Builder(len(forest.classes_) if is_classifier else None)
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        offset = len(builder.feature)
+        missing_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=bool))
+        for i in range(tree.node_count):
+            node = builder.node()
+            if tree.children_left[i] == -1:
+                leaf = tree.value[i, 0]
+                builder.value[node] = leaf / leaf.sum() if is_classifier else float(leaf[0])
+            else:
+                builder.feature[node] = int(tree.feature[i])
+                builder.threshold[node] = float(tree.threshold[i])
+                builder.left[node] = offset + int(tree.children_left[i])
+                builder.right[node] = offset + int(tree.children_right[i])
+                builder.default_left[node] = bool(missing_left[i])
+        builder.roots.append(offset)
+        builder.max_depth = max(builder.max_depth, int(tree.max_depth))
+    return builder.build(MEAN, classes=forest.classes_ if is_classifier else None, float32_inputs=True,
+                         n_features=forest.n_features_in_)
+
+
+def from_lightgbm(booster):
+    """
+    lightgbm.Booster of a regression model (numerical splits only).
+    """
+    dump = booster.dump_model()
+    if dump.get("num_class", 1) != 1:
+        raise ValueError("Only single-output LightGBM models are supported")
+    missing_codes = {"None": MISSING_AS_ZERO, "Zero": MISSING_ZERO_DEFAULT, "NaN": MISSING_DEFAULT}
+    builder = _Builder()
+
+    def add(node, depth):
+        i = builder.node()
+        builder.max_depth = max(builder.max_depth, depth)
+        if "leaf_value" in node:
+            builder.value[i] = float(node["leaf_value"])
+            return i
+        if node["decision_type"] != "<=":
+            raise ValueError(f"Unsupported LightGBM split '{node['decision_type']}' (categorical features)")
+        builder.feature[i] = int(node["split_feature"])
+        builder.threshold[i] = float(node["threshold"])
+        builder.default_left[i] = bool(node["default_left"])
+        builder.missing[i] = missing_codes[node["missing_type"]]
+        builder.left[i] = add(node["left_child"], depth + 1)
+        builder.right[i] = add(node["right_child"], depth + 1)
+        return i
+
+    for tree in dump["tree_info"]:
+        builder.roots.append(add(tree["tree_structure"], 0))
+    return builder.build(SUM, n_features=booster.num_feature())
+
+
+def from_xgboost(booster, classes=None):
+    """
+    xgboost.Booster with a binary:logistic or reg:squarederror objective.
+    """
+    config = json.loads(booster.save_config())
+    objective = config["learner"]["objective"]["name"]
+    base_score = float(config["learner"]["learner_model_param"]["base_score"].strip("[]"))
+    if objective == "binary:logistic":
+        aggregation, base_margin = SUM_LOGISTIC, float(np.log(base_score / (1 - base_score)))
+    elif objective.startswith("reg:squarederror"):
+        aggregation, base_margin = SUM, base_score
+    else:
+        raise ValueError(f"Unsupported XGBoost objective '{objective}'")
+
+    df = booster.trees_to_dataframe()
+    names = booster.feature_names or [f"f{i}" for i in range(booster.num_features())]
+    index = {name: i for i, name in enumerate(names)}
+    builder = _Builder()
+    ids = {}
+    for tree_id, node_id in zip(df["Tree"], df["ID"]):
+        ids[node_id] = builder.node()
+    for row in df.itertuples(index=False):
+        i = ids[row.ID]
+        if row.Feature == "Leaf":
+            builder.value[i] = float(np.float32(row.Gain))
+            continue
+        split = np.float32(row.Split)
+        builder.feature[i] = index[row.Feature]
+        builder.threshold[i] = float(np.nextafter(split, np.float32(-np.inf)))   # x < split  <=>  x <= below(split)
+        builder.left[i] = ids[row.Yes]
+        builder.right[i] = ids[row.No]
+        builder.default_left[i] = row.Missing == row.Yes
+    for tree_id in sorted(df["Tree"].unique()):
+        builder.roots.append(ids[f"{tree_id}-0"])
+    depth = {}
+    for row in df.itertuples(index=False):
+        d = depth.get(row.ID, 0)
+        if row.Feature != "Leaf":
+            depth[row.Yes] = depth[row.No] = d + 1
+        builder.max_depth = max(builder.max_depth, d)
+    return builder.build(aggregation, base_score=base_margin, classes=classes, float32_inputs=True,
+                         n_features=len(names))
+
+
+# --- The repo's models ---
+def _estimator(pipeline):
+    return pipeline.steps[-1][1]
+
+
+MODELS = {
+    "fan": (os.path.join("temperature_control_model", "best_fan_model.joblib"), lambda m: from_sklearn_forest(_estimator(m))),
+    "temp": (os.path.join("temperature_control_model", "best_temp_model.joblib"), lambda m: from_sklearn_forest(_estimator(m))),
+    "power": (os.path.join("temperature_control_model", "best_power_model.joblib"),
+              lambda m: from_lightgbm(_estimator(m).booster_)),
+    "time_to_cool": (os.path.join("time_to_cool_model", "time_to_cool_model.pkl"), lambda m: from_lightgbm(m.booster_)),
+    "occupancy": (os.path.join("occupancy_pred_model", "occupancy_pred.joblib"),
+                  lambda m: from_xgboost(m.get_booster(), m.classes_)),
+}
+
+
+def export_all(out_dir=COMPILED_DIR):
+    """
+    Flattens every model of MODELS into <out_dir>/<name>.npz. Returns {name: FlatForest}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    flat = {}
+    for name, (path, convert) in MODELS.items():
+        forest = convert(joblib.load(os.path.join(BASE_DIR, path)))
+        out = os.path.join(out_dir, f"{name}.npz")
+        forest.save(out)
+        flat[name] = FlatForest.load(out)
+        print(f"  - {name}: {forest.n_trees} trees, {forest.n_nodes} nodes, depth {forest.max_depth} -> "
+              f"{os.path.getsize(out) / 1024:.0f} KiB (original {os.path.getsize(os.path.join(BASE_DIR, path)) / 1024:.0f} KiB)")
+    return flat
+
+
+def _inputs(n, seed=0):
+    """
+    Model inputs built from the repo's test data by the inference code itself, jittered to n rows.
+    Occupancy rows include the NaN lags of a room's first readings.
+    """
+    import pandas as pd
+    from batch_inference import BatchPredictor
+
+    rng = np.random.default_rng(seed)
+    predictor = BatchPredictor()
+    rows = pd.read_csv(os.path.join(BASE_DIR, "occupancy_pred_model", "testset.csv")).to_dict("records")
+    rooms = [{**rows[rng.integers(len(rows))], "room_id": i % max(1, n // 3)} for i in range(n)]
+    for room in rooms:
+        for column in ("room_temp", "outside_temp", "outside_humidity", "power_kw"):
+            room[column] = float(room[column]) + rng.normal(0, 0.3)
+    df = predictor._frame(rooms)
+    control = predictor.control.preprocess(predictor.control_frame(df))
+    control = next(iter(control.values()))
+    return predictor, {
+        "fan": control, "temp": control, "power": control,
+        "time_to_cool": predictor.time_to_cool_matrix(rooms),
+        "occupancy": predictor.occupancy_matrix(rooms),
+    }
+
+
+def _original(predictor, name):
+    estimators = {target: est for target, (_, est) in predictor.control.estimators.items()}
+    return {
+        "fan": estimators["fan_speed"].predict,
+        "temp": estimators["ac_temp_setting"].predict,
+        "power": estimators["power_kw"].predict,
+        "time_to_cool": predictor.time_to_cool.predict,
+        "occupancy": lambda X: predictor.occupancy.model.predict_proba(X)[:, 1],
+    }[name]
+
+
+def _flat(forest, name):
+    return (lambda X: forest.predict_proba(X)[:, 1]) if name == "occupancy" else forest.predict
+
+
+def run_benchmark(sizes, repeats, out_dir=COMPILED_DIR):
+    print("Exporting flattened models:")
+    flat = export_all(out_dir)
+    predictor, inputs = _inputs(max(sizes))
+
+    print("Parity on", max(sizes), "rows:")
+    for name, forest in flat.items():
+        X = inputs[name]
+        expected, got = _original(predictor, name)(X), _flat(forest, name)(X)
+        if name == "fan":
+            assert np.array_equal(expected, got), f"{name}: predictions differ"
+            diff = 0.0
+        else:
+            diff = float(np.max(np.abs(np.asarray(expected, dtype=np.float64) - got)))
+            assert diff <= (1e-6 if name == "occupancy" else 1e-9) * max(1.0, float(np.max(np.abs(expected)))), \
+                f"{name}: max difference {diff}"
+        print(f"  - {name}: max |difference| {diff:.1e}")
+
+    print("Latency (original -> flattened):")
+    for name, forest in flat.items():
+        original, flattened = _original(predictor, name), _flat(forest, name)
+        cells = []
+        for n in sizes:
+            X = inputs[name][:n]
+            timings = []
+            for fn in (original, flattened):
+                fn(X)
+                r = repeats if n < 1000 else max(1, repeats // 10)
+                started = time.perf_counter()
+                for _ in range(r):
+                    fn(X)
+                timings.append((time.perf_counter() - started) * 1000 / r)
+            cells.append(f"{n} rows {timings[0]:.2f} -> {timings[1]:.2f} ms")
+        print(f"  - {name}: " + ", ".join(cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the tree models to flat arrays, check parity and time them.")
+    parser.add_argument("--out", default=COMPILED_DIR)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--export-only", action="store_true")
+    args = parser.parse_args()
+    if args.export_only:
+        export_all(args.out)
+    else:
+        run_benchmark(args.sizes, args.repeats, args.out)
@@ -0,0 +1,285 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- CONFIGURATION PARAMETERS ---
+ARTIFACT_PATTERNS = ("*.joblib", "*.pkl")
+SIDECAR_SUFFIX = ".meta.json"
+MMAP_MODE = "r"              # numpy arrays inside the artifacts are mapped read-only and shared between processes
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _library_versions():
+    versions = {}
+    for module in ("sklearn", "lightgbm", "xgboost", "joblib", "numpy"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    return versions
+
+
+def model_metadata(model):
+    """
+    Input features, outputs and estimator type of a loaded model, as far as the model exposes them.
+    """
+    meta = {"model_class": f"{type(model).__module__}.{type(model).__name__}"}
+    estimator = model.steps[-1][1] if hasattr(model, "steps") else model
+    if estimator is not model:
+        meta["estimator_class"] = f"{type(estimator).__module__}.{type(estimator).__name__}"
+
+    features = None
+    if hasattr(model, "feature_names_in_"):
+        features = list(model.feature_names_in_)
+    elif hasattr(model, "feature_name_"):
+        features = list(model.feature_name_)
+    elif hasattr(model, "get_booster"):
+        features = model.get_booster().feature_names
+    meta["features"] = [str(f) for f in features] if features is not None else None
+    meta["n_features"] = len(features) if features is not None else getattr(model, "n_features_in_", None)
+    if hasattr(estimator, "classes_"):
+        meta["task"] = "classification"
+        meta["classes"] = [c.item() if hasattr(c, "item") else c for c in estimator.classes_]
+    else:
+        meta["task"] = "regression"
+    return meta
+
+
+class ModelInfo:
+    """
+    One artifact found under models/<group>/: where it is and its sidecar metadata.
+    """
+
+    def __init__(self, name, group, path):
+        self.name = name
+        self.group = group
+        self.path = path
+        self.sidecar = path + SIDECAR_SUFFIX
+
+    def __repr__(self):
+        return f"ModelInfo({self.name!r}, group={self.group!r})"
+
+
+class ModelRegistry:
+    """
+    Discovers model artifacts under machine_learning/models/* and loads them lazily.
+    - Discovery only lists files; nothing is unpickled and sklearn/lightgbm/xgboost are not imported.
+    - describe() answers version/feature questions from the <artifact>.meta.json sidecar without loading
+      the model; only write_metadata() (`python model_registry.py index`) writes sidecars.
+    - get() loads a model on first use with joblib.load(mmap_mode='r') and keeps it for the process,
+      so every caller shares one instance and memory-mapped arrays share pages across worker processes.
+    """
+
+    def __init__(self, models_dir=BASE_DIR, mmap_mode=MMAP_MODE):
+        self.models_dir = models_dir
+        self.mmap_mode = mmap_mode
+        self.models = {}
+        self._loaded = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.stats = {"discover_s": 0.0, "loads": 0, "load_s": 0.0}
+        self.discover()
+
+    def discover(self):
+        started = time.perf_counter()
+        models = {}
+        for group in sorted(os.listdir(self.models_dir)):
+            group_dir = os.path.join(self.models_dir, group)
+            if not os.path.isdir(group_dir) or group.startswith((".", "__")):
+                continue
+            for pattern in ARTIFACT_PATTERNS:
+                for path in sorted(glob.glob(os.path.join(group_dir, pattern))):
+                    name = os.path.splitext(os.path.basename(path))[0]
+                    if name in models:
+                        raise ValueError(f"Duplicate model name '{name}' in {group} and {models[name].group}")
+                    models[name] = ModelInfo(name, group, path)
+        self.models = models
+        self.stats["discover_s"] = time.perf_counter() - started
+        return list(models)
+
+    def names(self, group=None):
+        return [name for name, info in self.models.items() if group is None or info.group == group]
+
+    def info(self, name):
+        try:
+            return self.models[name]
+        except KeyError:
+            raise KeyError(f"Unknown model '{name}', available: {sorted(self.models)}")
+
+    def path(self, name):
+        return self.info(name).path
+
+    # ---------- Metadata ----------
+    def describe(self, name, verify=False):
+        """
+        Sidecar metadata of a model without loading it. Never writes: a missing sidecar, or a stale one
+        (the artifact's size, or with verify=True its sha256, changed), raises until
+        `python model_registry.py index <name>` rewrites it.
+        """
+        info = self.info(name)
+        if not os.path.exists(info.sidecar):
+            raise FileNotFoundError(f"No metadata for '{name}', run `python model_registry.py index {name}`")
+        with open(info.sidecar, "r") as f:
+            meta = json.load(f)
+        stale = meta.get("bytes") != os.path.getsize(info.path)
+        if not stale and verify:
+            stale = meta.get("sha256") != _sha256(info.path)
+        if stale:
+            raise ValueError(f"Metadata of '{name}' does not match {info.path}, "
+                             f"run `python model_registry.py index {name}`")
+        return meta
+
+    def write_metadata(self, name):
+        info = self.info(name)
+        sha = _sha256(info.path)
+        meta = {
+            "name": name,
+            "group": info.group,
+            "file": os.path.basename(info.path),
+            "bytes": os.path.getsize(info.path),
+            "sha256": sha,
+            "version": sha[:12],
+            **model_metadata(self.get(name)),
+            "indexed_with": _library_versions(),
+        }
+        with open(info.sidecar, "w") as f:
+            json.dump(meta, f, indent=2)
+            f.write("\n")
+        return meta
+
+    def features(self, name):
+        return self.describe(name)["features"]
+
+    # ---------- Loading ----------
+    def get(self, name):
+        """
+        The loaded model, loading it on first use (thread-safe, once per process).
+        """
+        model = self._loaded.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._loaded:
+                import joblib
+
+                started = time.perf_counter()
+                self._loaded[name] = joblib.load(self.path(name), mmap_mode=self.mmap_mode)
+                self.stats["loads"] += 1
+                self.stats["load_s"] += time.perf_counter() - started
+            return self._loaded[name]
+
+    def is_loaded(self, name):
+        return name in self._loaded
+
+    def unload(self, name):
+        self._loaded.pop(name, None)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_registry():
+    """
+    Process-wide registry over machine_learning/models.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ModelRegistry()
+        return _default
+
+
+# --- Startup and memory per worker ---
+def memory_mb():
+    """
+    (total RSS, private anonymous, file-backed/shared) in MiB from /proc/self/status (Linux).
+    """
+    values = {}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile"):
+                    values[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return values.get("VmRSS"), values.get("RssAnon"), values.get("RssFile")
+
+
+def _worker_profile(mmap_mode):
+    started = time.perf_counter()
+    registry = ModelRegistry(mmap_mode=mmap_mode)
+    for name in registry.names():
+        registry.describe(name)
+    described = time.perf_counter() - started
+    rss_described = memory_mb()
+    for name in registry.names():
+        registry.get(name)
+    return {"describe_s": described, "load_s": time.perf_counter() - started - described,
+            "rss_described": rss_described, "rss_loaded": memory_mb(), "pid": os.getpid()}
+
+
+def run_benchmark(workers):
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    for mmap_mode in (MMAP_MODE, None):
+        with ctx.Pool(workers) as pool:
+            # One task per worker: every process starts cold
+            results = pool.map(_worker_profile, [mmap_mode] * workers, chunksize=1)
+        print(f"mmap_mode={mmap_mode!r}, {workers} worker process(es):")
+        for r in results:
+            total, anon, shared = r["rss_loaded"]
+            print(f"  - pid {r['pid']}: discover+describe {r['describe_s'] * 1000:.1f} ms "
+                  f"(RSS {r['rss_described'][0]:.0f} MiB), load all {r['load_s'] * 1000:.0f} ms "
+                  f"(RSS {total:.0f} MiB = {anon:.0f} private + {shared:.0f} file-backed)")
+        private = sum(r["rss_loaded"][1] for r in results)
+        print(f"  total private memory {private:.0f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model registry: list, index sidecar metadata, measure startup/RSS.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show the models and their metadata without loading them")
+    index = sub.add_parser("index", help="(re)write the <artifact>.meta.json sidecars")
+    index.add_argument("names", nargs="*")
+    bench = sub.add_parser("bench", help="startup time and RSS per worker process")
+    bench.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.command == "index":
+        registry = ModelRegistry()
+        for name in args.names or registry.names():
+            meta = registry.write_metadata(name)
+            print(f"  - {name}: {meta['model_class']}, {meta['n_features']} features, version {meta['version']}")
+    elif args.command == "list":
+        registry = ModelRegistry()
+        for name in registry.names():
+            try:
+                meta = registry.describe(name)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"{name} ({registry.info(name).group}): {e}")
+                continue
+            features = ", ".join(meta["features"] or [])
+            print(f"{name} ({meta['group']}, {meta['bytes'] / 1024:.0f} KiB, version {meta['version']}): "
+                  f"{meta['task']}, {meta['n_features']} features [{features}]")
+        print(f"{len(registry.names())} models described in {registry.stats['discover_s'] * 1000:.1f} ms discovery, "
+              f"{registry.stats['loads']} loaded")
+    else:
+        run_benchmark(args.workers)
@@ -3,15 +3,20 @@ import numpy as np
 import joblib
 from sklearn.preprocessing import LabelEncoder
 
+from occupancy_features import OccupancyFeatureEngine
+
 class OccupancyPred:
-    def __init__(self, model_path):
-        # Load trained ML model
-        self.model = joblib.load(model_path)
+    def __init__(self, model_path=None, model=None):
+        # Load trained ML model, unless an already loaded one is given (e.g. from the model registry)
+        self.model = model if model is not None else joblib.load(model_path)
 
         # Label encoder for weather
         self.le_weather = LabelEncoder()
         self.le_weather.fit(["cloudy", "rainy", "sunny"])
 
+        # Incremental per-room feature state for predict_online()
+        self.features = OccupancyFeatureEngine()
+
     def _encode_cyclical(self, df, col, max_val):
         df[col + "_sin"] = np.sin(2 * np.pi * df[col] / max_val)
         df[col + "_cos"] = np.cos(2 * np.pi * df[col] / max_val)
@@ -63,6 +68,22 @@ class OccupancyPred:
         prediction = self.model.predict_proba(features)
         return prediction[0][1]
 
+    def predict_vector(self, features):
+        """
+        Prediction on ready feature vectors (FEATURE_COLUMNS order), one row or a (rooms, features) matrix.
+        Returns the probability for one row, an array of probabilities for a matrix.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        prediction = self.model.predict_proba(features.reshape(-1, features.shape[-1]))[:, 1]
+        return prediction[0] if features.ndim == 1 else prediction
+
+    def predict_online(self, room_id, reading):
+        """
+        Streaming alternative to predict(): feed every new reading (dict) of a room once, in time order.
+        Lags and rolling means are kept per room, so no history has to be passed or re-processed.
+        """
+        return self.predict_vector(self.features.update(room_id, reading))
+
 # Notes
 """
 For real deployment need to take care of missing value.
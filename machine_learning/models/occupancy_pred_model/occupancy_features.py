@@ -0,0 +1,180 @@
+import argparse
+import math
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Column order of the trained model (occupancy_pred.joblib feature_names_in_)
+FEATURE_COLUMNS = [
+    "hour_of_day", "day_of_week", "day_of_year", "outside_temp", "outside_humidity", "is_occupied", "room_temp",
+    "month_of_year", "is_weekend", "occ_lag1", "occ_lag2", "occ_lag3", "temp_lag1", "temp_lag2",
+    "occ_rolling_mean_3", "temp_rolling_mean_3", "hour_of_day_sin", "hour_of_day_cos", "day_of_week_sin",
+    "day_of_week_cos", "weather_encoded",
+]
+N_FEATURES = len(FEATURE_COLUMNS)
+WEATHER_CODES = {"cloudy": 0, "rainy": 1, "sunny": 2}   # LabelEncoder order used in OccupancyPred
+HISTORY = 4                                              # Current reading + 3 lags
+
+# Cyclical encodings only depend on the integer hour/weekday: computed once
+_HOUR_SIN = [math.sin(2 * math.pi * h / 24) for h in range(24)]
+_HOUR_COS = [math.cos(2 * math.pi * h / 24) for h in range(24)]
+_DOW_SIN = [math.sin(2 * math.pi * d / 7) for d in range(7)]
+_DOW_COS = [math.cos(2 * math.pi * d / 7) for d in range(7)]
+_NAN = float("nan")
+
+
+def _to_datetime(timestamp):
+    if isinstance(timestamp, datetime):   # also pd.Timestamp
+        return timestamp
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp)
+    return datetime.fromisoformat(str(timestamp))
+
+
+def _number(value):
+    return _NAN if value is None else float(value)
+
+
+class OccupancyFeatureState:
+    """
+    Incremental feature state of one room.
+    Keeps the last HISTORY readings of is_occupied and room_temp in a ring buffer, so every new
+    reading updates lags and 3-step rolling means in O(1) and yields the model's feature vector
+    without pandas. Until enough readings were seen the lag/rolling features are NaN, exactly
+    like shift()/rolling() in OccupancyPred._preprocess.
+    """
+
+    __slots__ = ("_occ", "_temp", "_pos", "count", "vector")
+
+    def __init__(self):
+        self._occ = [_NAN] * HISTORY
+        self._temp = [_NAN] * HISTORY
+        self._pos = -1
+        self.count = 0
+        self.vector = np.full(N_FEATURES, np.nan)
+
+    def update(self, reading, out=None):
+        """
+        Args:
+            reading (dict): One row as stored in the dataset/database: timestamp, is_occupied, room_temp,
+                outside_temp, outside_humidity, weather_condition and optionally hour_of_day, day_of_week,
+                day_of_year (derived from the timestamp when missing).
+            out (np.ndarray): Row to write the features into, e.g. a row of a batch matrix.
+
+        Returns:
+            np.ndarray: The feature vector in FEATURE_COLUMNS order (self.vector unless out is given).
+        """
+        ts = _to_datetime(reading["timestamp"])
+        hour = reading.get("hour_of_day")
+        hour = ts.hour if hour is None else int(hour)
+        dow = reading.get("day_of_week")
+        dow = ts.weekday() if dow is None else int(dow)
+        doy = reading.get("day_of_year")
+        doy = ts.timetuple().tm_yday if doy is None else int(doy)
+        weather = reading["weather_condition"]
+        try:
+            weather_code = WEATHER_CODES[weather]
+        except KeyError:
+            raise ValueError(f"Unknown weather condition '{weather}', expected one of {list(WEATHER_CODES)}")
+
+        occ = _number(reading["is_occupied"])
+        temp = _number(reading["room_temp"])
+        pos = (self._pos + 1) % HISTORY
+        self._pos = pos
+        self._occ[pos] = occ
+        self._temp[pos] = temp
+        self.count += 1
+
+        o, t, n = self._occ, self._temp, self.count
+        occ1 = o[pos - 1] if n > 1 else _NAN
+        occ2 = o[pos - 2] if n > 2 else _NAN
+        occ3 = o[pos - 3] if n > 3 else _NAN
+        temp1 = t[pos - 1] if n > 1 else _NAN
+        temp2 = t[pos - 2] if n > 2 else _NAN
+
+        out = self.vector if out is None else out
+        out[:] = (
+            hour, dow, doy, _number(reading["outside_temp"]), _number(reading["outside_humidity"]), occ, temp,
+            ts.month, 1 if dow >= 5 else 0, occ1, occ2, occ3, temp1, temp2,
+            (occ + occ1 + occ2) / 3, (temp + temp1 + temp2) / 3,
+            _HOUR_SIN[hour], _HOUR_COS[hour], _DOW_SIN[dow], _DOW_COS[dow], weather_code,
+        )
+        return out
+
+
+class OccupancyFeatureEngine:
+    """
+    Feature states for many rooms, keyed by room id.
+    """
+
+    def __init__(self):
+        self.rooms = {}
+
+    def update(self, room_id, reading, out=None):
+        state = self.rooms.get(room_id)
+        if state is None:
+            state = self.rooms[room_id] = OccupancyFeatureState()
+        return state.update(reading, out)
+
+    def matrix(self, room_ids):
+        """
+        Latest feature vectors of the given rooms stacked in one (len(room_ids), N_FEATURES) matrix.
+        """
+        return np.vstack([self.rooms[room_id].vector for room_id in room_ids])
+
+
+# --- Parity and latency against OccupancyPred._preprocess ---
+def run_benchmark(csv_path, model_path):
+    from OccupancyPred import OccupancyPred
+
+    model = OccupancyPred(model_path)
+    df = pd.read_csv(csv_path)
+    records = df.to_dict("records")
+
+    state = OccupancyFeatureState()
+    max_diff = 0.0
+    pandas_s = online_s = 0.0
+    for i, record in enumerate(records):
+        started = time.perf_counter()
+        expected = model._preprocess(df.iloc[max(0, i - HISTORY + 1):i + 1].copy())
+        pandas_s += time.perf_counter() - started
+        started = time.perf_counter()
+        vector = state.update(record)
+        online_s += time.perf_counter() - started
+        assert list(expected.columns) == FEATURE_COLUMNS, "model column order changed"
+        expected = expected.to_numpy(dtype=np.float64)[0]
+        same_nan = np.array_equal(np.isnan(expected), np.isnan(vector))
+        assert same_nan, f"row {i}: NaN pattern differs"
+        max_diff = max(max_diff, float(np.nanmax(np.abs(expected - vector))))
+
+    # Steady-state update cost, without the one-off parity work in between
+    state = OccupancyFeatureState()
+    repeats = max(1, 20000 // len(records))
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for record in records:
+            state.update(record)
+    update_us = (time.perf_counter() - started) * 1e6 / (repeats * len(records))
+
+    x = state.vector.reshape(1, -1)
+    started = time.perf_counter()
+    for _ in range(200):
+        model.predict_vector(x)
+    predict_us = (time.perf_counter() - started) * 1e6 / 200
+
+    print(f"{len(records)} rows: max |difference| to _preprocess {max_diff:.2e}")
+    print(f"Features: pandas _preprocess {pandas_s * 1e3 / len(records):.2f} ms/row, "
+          f"online {online_s * 1e6 / len(records):.1f} us/row (steady state {update_us:.1f} us)")
+    print(f"Model call on the ready vector: {predict_us:.0f} us")
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Check the online occupancy features against OccupancyPred._preprocess.")
+    parser.add_argument("--csv", default=os.path.join(base_dir, "testset.csv"))
+    parser.add_argument("--model", default=os.path.join(base_dir, "occupancy_pred.joblib"))
+    args = parser.parse_args()
+    run_benchmark(args.csv, args.model)
@@ -1,12 +1,15 @@
 import pandas as pd
 import os
+import sys
 
 from OccupancyPred import OccupancyPred
 
-BASE_DIR = os.path.dirname(__file__)  # folder where current .py file lives
-MODEL_PATH = os.path.join(BASE_DIR, "occupancy_pred.joblib")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # folder where current .py file lives
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+from model_registry import default_registry  # noqa: E402
 
-model = OccupancyPred(MODEL_PATH)
+# occupancy_pred.joblib, loaded once per process by the model registry
+model = OccupancyPred(model=default_registry().get("occupancy_pred"))
 
 # The input for the prediction have to be at least 4 row time series data
 # Simulation of getting 4 rows of time series data from database
@@ -15,4 +18,10 @@ df = df.iloc[-4:]
 
 result = model.predict(df)
 
-print("The probability of next 1 hours for occupancy is:", result)
\ No newline at end of file
+print("The probability of next 1 hours for occupancy is:", result)
+
+# Streaming alternative: feed every reading once as it arrives, the model keeps lags/rolling means per room
+for reading in pd.read_csv("testset.csv").to_dict("records"):
+    online_result = model.predict_online(room_id=1, reading=reading)
+
+print("Same prediction from the online feature state:", online_result)
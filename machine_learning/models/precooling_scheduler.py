@@ -0,0 +1,309 @@
+import argparse
+import heapq
+import itertools
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from batch_inference import BatchPredictor
+from model_registry import default_registry
+from time_to_cool_features import TARGET_TEMP
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- CONFIGURATION PARAMETERS ---
+TICK_MIN = 5                   # Sensor cadence: readings arrive and due rooms are scored every 5 minutes
+OCCUPANCY_THRESHOLD = 0.5      # P(occupied within the next hour) from OccupancyPred that counts as predicted occupancy
+OCCUPANCY_HORIZON_MIN = 60     # Horizon of OccupancyPred
+SAFETY_MARGIN_MIN = 10         # Start this much earlier than the predicted time-to-cool requires
+MAX_PRECOOL_MIN = 240          # Longest pre-cooling run (MAX_HORIZON_MIN of the time-to-cool labels)
+IDLE_RECHECK_MIN = 15          # Re-evaluation interval of unoccupied rooms without a due start
+PRECOOL_RECHECK_MIN = 15       # Re-evaluation interval while pre-cooling
+OCCUPIED_RECHECK_MIN = 30      # Occupied rooms belong to the temperature-control model; an occupancy change re-evaluates at once
+
+ARRIVAL_GAP_MIN = 60           # Simulation: an arrival counts if the room was empty at least this long before
+
+# Device commands per decision, in the control_commands 'key:value' format of hardware_interface/command_dispatcher.py
+PRECOOL_AC_SETTING = 20.0
+PRECOOL_POWER_KW = 1.7         # Compressor + high fan (POWER_CONSUMPTION_KW in dataset/synthesize.py)
+# Time-to-cool is predicted for the room under pre-cooling, not its current AC-off state: the model was trained
+# with AC-off rows labelled as not cooling (censored), so the observed state would predict the censoring horizon
+PRECOOL_FEATURES = {"power_kw": PRECOOL_POWER_KW, "power_kw_roll_15": PRECOOL_POWER_KW, "fan_speed_num": 3,
+                    "ac_temp_setting": PRECOOL_AC_SETTING, "ac_on_frac_15": 1.0}
+COMMANDS = {
+    "precool": (f"ac_temp_setting:{PRECOOL_AC_SETTING:g}", "fan_speed:high"),
+    "standby": ("fan_speed:off",),
+    "occupied": (),            # Hand-over: the temperature-control model drives occupied rooms
+}
+
+RoomDecision = namedtuple("RoomDecision", ["room_id", "action", "start_at", "arrival_at", "occupancy_prob",
+                                           "time_to_cool_min", "reason"])
+PrecoolCommand = namedtuple("PrecoolCommand", ["timestamp", "room_id", "command", "reason"])
+
+
+class RoomState:
+    __slots__ = ("room_id", "reading", "occupied", "action", "arrival_at", "start_at", "due")
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.reading = None
+        self.occupied = False
+        self.action = "standby"             # Rooms are assumed to start with the AC off
+        self.arrival_at = None
+        self.start_at = None
+        self.due = None
+
+
+class PrecoolScheduler:
+    """
+    Decides for every room when to start pre-cooling so it reaches TARGET_TEMP before predicted occupancy.
+    - observe() advances each room's feature states with its 5-minute reading (cheap, O(1) per room).
+    - tick() scores only the rooms whose next decision time has come, in one batch call per tick,
+      using a heap keyed by next decision time. A change of a room's occupancy makes it due at once.
+    - A room's latest start is its predicted arrival minus the predicted time-to-cool and a safety margin;
+      commands are emitted only when a room's decision changes.
+    """
+
+    def __init__(self, predictor=None, threshold=OCCUPANCY_THRESHOLD, margin_min=SAFETY_MARGIN_MIN, log=print):
+        self.predictor = predictor if predictor is not None else BatchPredictor(registry=default_registry())
+        self.threshold = threshold
+        self.margin = timedelta(minutes=margin_min)
+        self.log = log
+        self.rooms = {}
+        self.queue = []
+        self._seq = itertools.count()
+        self.stats = {"ticks": 0, "observed": 0, "evaluations": 0, "commands": 0, "missed_arrivals": 0,
+                      "observe_s": 0.0, "score_s": 0.0, "tick_s": 0.0}
+
+    def _schedule(self, state, due):
+        state.due = due
+        heapq.heappush(self.queue, (due, next(self._seq), state.room_id))
+
+    def observe(self, readings):
+        """
+        Args:
+            readings (list): The latest reading of each room (dict with room_id, timestamp and the dataset columns).
+        """
+        started = time.perf_counter()
+        self.predictor.observe(readings)
+        for reading in readings:
+            room_id = reading['room_id']
+            state = self.rooms.get(room_id)
+            if state is None:
+                state = self.rooms[room_id] = RoomState(room_id)
+            occupied = bool(reading['is_occupied'])
+            changed = state.reading is not None and occupied != state.occupied
+            state.reading, state.occupied = reading, occupied
+            if state.due is None or changed:
+                self._schedule(state, pd.Timestamp(reading['timestamp']))
+        self.stats["observed"] += len(readings)
+        self.stats["observe_s"] += time.perf_counter() - started
+
+    def due_rooms(self, now):
+        rooms = []
+        while self.queue and self.queue[0][0] <= now:
+            due, _, room_id = heapq.heappop(self.queue)
+            state = self.rooms[room_id]
+            if state.due == due:     # Otherwise a stale entry of a rescheduled room
+                state.due = None
+                rooms.append(state)
+        return rooms
+
+    def decide(self, state, now, occupancy_prob, time_to_cool):
+        """
+        New decision of one room and the time it has to be re-evaluated.
+        """
+        if state.occupied:
+            state.arrival_at = state.start_at = None
+            return "occupied", "room occupied", now + timedelta(minutes=OCCUPIED_RECHECK_MIN)
+
+        if state.arrival_at is not None and state.arrival_at <= now:
+            self.stats["missed_arrivals"] += 1
+            if self.log:
+                self.log(f"Room {state.room_id}: predicted occupancy at {state.arrival_at} did not happen")
+            state.arrival_at = None
+
+        arrival = reason = None
+        if occupancy_prob >= self.threshold:
+            # OccupancyPred only says "within the next hour": its end is the latest arrival it predicts
+            arrival = now + timedelta(minutes=OCCUPANCY_HORIZON_MIN)
+            reason = f"occupancy predicted within {OCCUPANCY_HORIZON_MIN} min (p={occupancy_prob:.2f})"
+        # Keep the earliest arrival predicted so far: re-predicting "within the hour" every tick must not push it back
+        if state.arrival_at is not None and (arrival is None or state.arrival_at < arrival):
+            arrival, reason = state.arrival_at, "earlier prediction"
+        state.arrival_at = arrival
+
+        if arrival is None:
+            state.start_at = None
+            return "standby", "no occupancy predicted", now + timedelta(minutes=IDLE_RECHECK_MIN)
+        cool_min = min(max(float(time_to_cool), 0.0), MAX_PRECOOL_MIN)
+        if cool_min <= 0.0:
+            state.start_at = None
+            return "standby", f"at {TARGET_TEMP:g}°C already", now + timedelta(minutes=IDLE_RECHECK_MIN)
+        start_at = arrival - timedelta(minutes=cool_min) - self.margin
+        state.start_at = start_at
+        if start_at <= now:
+            return "precool", f"{cool_min:.0f} min to {TARGET_TEMP:g}°C, {reason}", \
+                min(arrival, now + timedelta(minutes=PRECOOL_RECHECK_MIN))
+        return "standby", f"pre-cooling starts at {start_at:%H:%M}, {reason}", \
+            min(start_at, now + timedelta(minutes=IDLE_RECHECK_MIN))
+
+    def tick(self, now):
+        """
+        Scores the rooms due at `now` in one batch and returns the commands of the decisions that changed.
+
+        Returns:
+            tuple: (list of RoomDecision of the evaluated rooms, list of PrecoolCommand)
+        """
+        started = time.perf_counter()
+        now = pd.Timestamp(now)
+        due = self.due_rooms(now)
+        scoring = time.perf_counter()
+        occupancy, time_to_cool = self.predictor.score([state.room_id for state in due], PRECOOL_FEATURES)
+        self.stats["score_s"] += time.perf_counter() - scoring
+        decisions, commands = [], []
+        for i, state in enumerate(due):
+            action, reason, next_due = self.decide(state, now, float(occupancy[i]), float(time_to_cool[i]))
+            decisions.append(RoomDecision(state.room_id, action, state.start_at, state.arrival_at,
+                                          float(occupancy[i]), float(time_to_cool[i]), reason))
+            if action != state.action:
+                for command in COMMANDS[action]:
+                    commands.append(PrecoolCommand(now, state.room_id, command, reason))
+                state.action = action
+            self._schedule(state, max(next_due, now + timedelta(minutes=TICK_MIN)))
+        self.stats["ticks"] += 1
+        self.stats["evaluations"] += len(due)
+        self.stats["commands"] += len(commands)
+        self.stats["tick_s"] += time.perf_counter() - started
+        return decisions, commands
+
+    def step(self, now, readings):
+        self.observe(readings)
+        return self.tick(now)
+
+
+# --- Simulation against synthesized rooms ---
+def _simulated_rooms(n_rooms, start_date, days, seed, input_path=None):
+    """
+    Per-room reading lists: from a synthesize.py CSV / building.py Parquet output, or simulated here with building.py.
+    """
+    if input_path:
+        df = pd.read_parquet(input_path) if not input_path.endswith(".csv") else pd.read_csv(input_path)
+        if 'room_id' not in df:
+            df['room_id'] = 1
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = df.sort_values(['room_id', 'timestamp'])
+        end = df['timestamp'].min() + pd.Timedelta(days=days)
+        df = df[df['timestamp'] < end]
+        rooms = {room_id: group.drop(columns='room_id') for room_id, group in df.groupby('room_id', observed=True)}
+        rooms = dict(list(rooms.items())[:n_rooms])
+    else:
+        sys.path.insert(0, os.path.join(BASE_DIR, "..", "dataset"))
+        import building
+
+        end_date = (pd.Timestamp(start_date) + pd.Timedelta(days=days) - pd.Timedelta(minutes=TICK_MIN)).strftime("%Y-%m-%d %H:%M")
+        weather = building.shared_weather(start_date, end_date, TICK_MIN, seed)
+        rooms = {}
+        for room in building.random_rooms(n_rooms, seed):
+            table = building.simulate_room({**building.ROOM_DEFAULTS, **room}, weather, seed)
+            rooms[room['room_id']] = table.to_pandas()
+    records = {}
+    for room_id, df in rooms.items():
+        df = df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+        records[room_id] = [{**r, 'room_id': room_id} for r in df.to_dict("records")]
+    return records
+
+
+def _arrivals(occupied):
+    """
+    Readings at which people arrive in a room that was empty for at least ARRIVAL_GAP_MIN.
+    """
+    gap = ARRIVAL_GAP_MIN // TICK_MIN
+    starts = np.flatnonzero(occupied[1:] & ~occupied[:-1]) + 1
+    return [a for a in starts if a >= gap and not occupied[a - gap:a].any()]
+
+
+def run_simulation(n_rooms, days, start_date, seed, input_path=None, warmup_days=1, threshold=OCCUPANCY_THRESHOLD):
+    records = _simulated_rooms(n_rooms, start_date, days + warmup_days, seed, input_path)
+    room_ids = list(records)
+    n_steps = min(len(r) for r in records.values())
+    warmup = min(n_steps, warmup_days * 24 * 60 // TICK_MIN)
+    print(f"Replaying {len(room_ids)} rooms x {n_steps} readings ({warmup} warm-up readings)...")
+
+    scheduler = PrecoolScheduler(threshold=threshold, log=None)
+    actions = {room_id: np.empty(n_steps, dtype=object) for room_id in room_ids}
+    commands = []
+    full_score_s = 0.0
+    for step in range(n_steps):
+        readings = [records[room_id][step] for room_id in room_ids]
+        now = readings[0]['timestamp']
+        if step == warmup:
+            scheduler.stats.update({k: 0 if isinstance(v, int) else 0.0 for k, v in scheduler.stats.items()})
+        _, emitted = scheduler.step(now, readings)
+        if step >= warmup:
+            commands.extend(emitted)
+            # Baseline: scoring every room at every tick
+            started = time.perf_counter()
+            scheduler.predictor.score(room_ids, PRECOOL_FEATURES)
+            full_score_s += time.perf_counter() - started
+        for room_id in room_ids:
+            actions[room_id][step] = scheduler.rooms[room_id].action
+
+    # Arrival coverage: was the room pre-cooling when people arrived, and for how long
+    arrivals = covered = 0
+    leads, precool_ticks, wasted_ticks = [], 0, 0
+    for room_id in room_ids:
+        occupied = np.array([bool(r['is_occupied']) for r in records[room_id]])
+        room_actions = actions[room_id]
+        precool = room_actions == "precool"
+        for a in _arrivals(occupied):
+            if a <= warmup:
+                continue
+            arrivals += 1
+            if precool[a - 1]:
+                covered += 1
+                start = a - 1
+                while start > 0 and precool[start - 1]:
+                    start -= 1
+                leads.append((a - start) * TICK_MIN)
+        run_start = None
+        for i in range(warmup, n_steps):
+            if precool[i]:
+                precool_ticks += 1
+                run_start = i if run_start is None else run_start
+            elif run_start is not None:
+                # A pre-cooling run that ended without people arriving was wasted
+                if not occupied[i]:
+                    wasted_ticks += i - run_start
+                run_start = None
+
+    stats = scheduler.stats
+    ticks = max(stats["ticks"], 1)
+    print(f"Arrivals after warm-up: {arrivals}, pre-cooling when they arrived: {covered} "
+          f"({100.0 * covered / max(arrivals, 1):.0f}%), median lead {np.median(leads) if leads else 0:.0f} min")
+    print(f"Pre-cooling {precool_ticks * TICK_MIN / 60:.1f} h in total, {wasted_ticks * TICK_MIN / 60:.1f} h "
+          f"ended without arrival; {stats['missed_arrivals']} predicted arrivals did not happen")
+    print(f"Commands emitted: {len(commands)} ({len(commands) / len(room_ids) / max(days, 1):.1f} per room per day)")
+    print(f"Per tick: {stats['evaluations'] / ticks:.1f} of {len(room_ids)} rooms re-evaluated; "
+          f"observe {stats['observe_s'] * 1000 / ticks:.2f} ms + tick {stats['tick_s'] * 1000 / ticks:.2f} ms, "
+          f"of which scoring {stats['score_s'] * 1000 / ticks:.2f} ms (all rooms every tick: {full_score_s * 1000 / ticks:.2f} ms)")
+    for command in commands[:5]:
+        print(f"  {command.timestamp} room {command.room_id}: {command.command} ({command.reason})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pre-cooling scheduler against synthesized room data.")
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--days", type=int, default=7, help="simulated days after the warm-up")
+    parser.add_argument("--warmup-days", type=int, default=1, help="days replayed before measuring (feature history)")
+    parser.add_argument("--threshold", type=float, default=OCCUPANCY_THRESHOLD)
+    parser.add_argument("--start", default="2024-03-04")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--input", help="synthesize.py CSV or building.py Parquet output instead of simulating rooms")
+    args = parser.parse_args()
+    run_simulation(args.rooms, args.days, args.start, args.seed, args.input, args.warmup_days, args.threshold)
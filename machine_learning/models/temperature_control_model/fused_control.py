@@ -0,0 +1,178 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- CONFIGURATION PARAMETERS ---
+MODEL_PATHS = {
+    "fan_speed": os.path.join(BASE_DIR, "best_fan_model.joblib"),
+    "ac_temp_setting": os.path.join(BASE_DIR, "best_temp_model.joblib"),
+    "power_kw": os.path.join(BASE_DIR, "best_power_model.joblib"),
+}
+# Names of the same pipelines in the model registry (machine_learning/models/model_registry.py)
+MODEL_NAMES = {"fan_speed": "best_fan_model", "ac_temp_setting": "best_temp_model", "power_kw": "best_power_model"}
+FAN_SPEED_CLASSES = {0: 'high', 1: 'low', 2: 'medium', 3: 'off', 4: 'on'}
+
+
+class SharedPreprocessor:
+    """
+    NumPy re-implementation of the fitted 'preprocess' ColumnTransformer of the temperature-control
+    pipelines (StandardScaler on the numeric columns, OneHotEncoder(handle_unknown='ignore') on the
+    categorical ones). Uses the fitted parameters and the same float operations, so the matrix is
+    identical to ColumnTransformer.transform().
+    """
+
+    def __init__(self, column_transformer):
+        self.parts = []
+        self.input_columns = []
+        for name, transformer, columns in column_transformer.transformers_:
+            if name == "remainder":
+                if transformer != "drop" and len(columns):
+                    raise ValueError("Remainder columns are not supported by the fused preprocessor")
+                continue
+            columns = list(columns)
+            if isinstance(transformer, StandardScaler):
+                mean = transformer.mean_ if transformer.with_mean else None
+                scale = transformer.scale_ if transformer.with_std else None
+                self.parts.append(("num", columns, (mean, scale)))
+            elif isinstance(transformer, OneHotEncoder) and transformer.drop is None:
+                self.parts.append(("cat", columns, [np.asarray(c, dtype=object) for c in transformer.categories_]))
+            else:
+                raise ValueError(f"Unsupported transformer in '{name}': {transformer!r}")
+            self.input_columns.extend(columns)
+
+    def transform(self, df):
+        """
+        Returns the (rows, n_features) float64 matrix the estimators were trained on.
+        """
+        blocks = []
+        for kind, columns, params in self.parts:
+            if kind == "num":
+                mean, scale = params
+                X = df[columns].to_numpy(dtype=np.float64)
+                if mean is not None:
+                    X = X - mean
+                if scale is not None:
+                    X = X / scale
+                blocks.append(X)
+            else:
+                for column, categories in zip(columns, params):
+                    values = df[column].to_numpy(dtype=object)
+                    blocks.append((values[:, None] == categories[None, :]).astype(np.float64))
+        return np.hstack(blocks)
+
+
+class FusedControlPredictor:
+    """
+    The fan, AC-temperature and power pipelines with their shared preprocessing run once.
+    Pipelines whose fitted 'preprocess' step is identical (same joblib hash) share one SharedPreprocessor;
+    each estimator is then fed from that single matrix.
+    Already loaded pipelines (e.g. from the model registry) can be passed as pipelines={target: pipeline}.
+    """
+
+    def __init__(self, model_paths=MODEL_PATHS, pipelines=None):
+        if pipelines is None:
+            pipelines = {target: joblib.load(path) for target, path in model_paths.items()}
+        self.pipelines = dict(pipelines)
+        self.preprocessors = {}
+        self.estimators = {}
+        for target, pipeline in self.pipelines.items():
+            key = joblib.hash(pipeline.steps[0][1])
+            if key not in self.preprocessors:
+                self.preprocessors[key] = SharedPreprocessor(pipeline.steps[0][1])
+            self.estimators[target] = (key, pipeline.steps[-1][1])
+        self.input_columns = next(iter(self.preprocessors.values())).input_columns
+
+    @classmethod
+    def from_registry(cls, registry):
+        """
+        Predictor over the pipelines of a ModelRegistry, shared with every other user of that registry.
+        """
+        return cls(pipelines={target: registry.get(name) for target, name in MODEL_NAMES.items()})
+
+    def preprocess(self, df):
+        return {key: p.transform(df) for key, p in self.preprocessors.items()}
+
+    def predict(self, df):
+        """
+        Args:
+            df (pd.DataFrame): Rows with the pipeline input columns (see testing_data.csv).
+
+        Returns:
+            dict: target -> prediction array (raw class codes for fan_speed, see FAN_SPEED_CLASSES).
+        """
+        matrices = self.preprocess(df)
+        return {target: estimator.predict(matrices[key]) for target, (key, estimator) in self.estimators.items()}
+
+    def predict_pipelines(self, df):
+        """
+        Reference path: every pipeline on its own, as run_simulation.py does.
+        """
+        return {target: pipeline.predict(df) for target, pipeline in self.pipelines.items()}
+
+    def check_parity(self, df):
+        """
+        Raises AssertionError unless the fused matrices and predictions equal the pipelines' exactly.
+        """
+        matrices = self.preprocess(df)
+        for target, (key, _) in self.estimators.items():
+            expected = self.pipelines[target].steps[0][1].transform(df)
+            assert np.array_equal(np.asarray(expected), matrices[key]), f"{target}: preprocessed matrix differs"
+        fused, reference = self.predict(df), self.predict_pipelines(df)
+        for target in reference:
+            assert np.array_equal(fused[target], reference[target]), f"{target}: predictions differ"
+        return True
+
+
+# --- Parity and throughput against the three pipelines ---
+def _rows(df, n, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+    numeric = [c for c in rows.columns if c != "weather_condition"]
+    rows[numeric] = rows[numeric] + rng.normal(0, 0.1, (n, len(numeric)))
+    return rows
+
+
+def run_benchmark(csv_path, sizes, repeats):
+    predictor = FusedControlPredictor()
+    data = pd.read_csv(csv_path)
+    predictor.check_parity(data)
+    print(f"{len(predictor.pipelines)} pipelines share {len(predictor.preprocessors)} preprocessing step(s); "
+          f"fused output identical on {csv_path}")
+
+    for n in sizes:
+        df = _rows(data, n)
+        predictor.check_parity(df)
+        timings = {}
+        for name, fn in (("pipelines", predictor.predict_pipelines), ("fused", predictor.predict)):
+            started = time.perf_counter()
+            for _ in range(repeats):
+                fn(df)
+            timings[name] = (time.perf_counter() - started) * 1000 / repeats
+        started = time.perf_counter()
+        for _ in range(repeats):
+            for target, pipeline in predictor.pipelines.items():
+                pipeline.steps[0][1].transform(df)
+        pre_pipelines = (time.perf_counter() - started) * 1000 / repeats
+        started = time.perf_counter()
+        for _ in range(repeats):
+            predictor.preprocess(df)
+        pre_fused = (time.perf_counter() - started) * 1000 / repeats
+        print(f"{n:>6} rows: pipelines {timings['pipelines']:.2f} ms, fused {timings['fused']:.2f} ms "
+              f"({timings['pipelines'] / timings['fused']:.1f}x); preprocessing {pre_pipelines:.2f} -> {pre_fused:.2f} ms "
+              f"({pre_pipelines / pre_fused:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and time the fused temperature-control predictor.")
+    parser.add_argument("--csv", default=os.path.join(BASE_DIR, "testing_data.csv"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    run_benchmark(args.csv, args.sizes, args.repeats)
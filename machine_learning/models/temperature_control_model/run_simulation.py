@@ -1,15 +1,23 @@
-import joblib
+import os
+import sys
+
 import pandas as pd
 
-loaded_fan_model = joblib.load('best_fan_model.joblib')
-loaded_temp_model = joblib.load('best_temp_model.joblib')
-loaded_power_model = joblib.load('best_power_model.joblib')
+from fused_control import FusedControlPredictor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_registry import default_registry  # noqa: E402
+
+# best_fan/temp/power_model.joblib from the model registry; their shared preprocessing runs once per call
+predictor = FusedControlPredictor.from_registry(default_registry())
 
 new_data = pd.read_csv("testing_data.csv")
 
-fan_prediction = loaded_fan_model.predict(new_data)
-temp_prediction = loaded_temp_model.predict(new_data)
-power_prediction = loaded_power_model.predict(new_data)
+predictor.check_parity(new_data)
+predictions = predictor.predict(new_data)
+fan_prediction = predictions["fan_speed"]
+temp_prediction = predictions["ac_temp_setting"]
+power_prediction = predictions["power_kw"]
 
 print("New Fan Speed Predictions {0:high, 1:low, 2:medium, 3:off, 4:on}:", fan_prediction)
 print("New AC Temperature Predictions:", temp_prediction)
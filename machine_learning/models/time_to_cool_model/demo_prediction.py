@@ -1,12 +1,29 @@
-import pandas as pd
-import numpy as np
-import joblib
+import os
+import sys
 
-# ---------- Load model ----------
-MODEL_PATH = "machine_learning/models/time_to_cool_model/time_to_cool_model.pkl"
-model = joblib.load(MODEL_PATH)
+from time_to_cool_features import TimeToCoolFeatureEngine, TARGET_TEMP
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_registry import default_registry  # noqa: E402
 
-# ---------- Example input ----------
+# ---------- Load model ----------
+# time_to_cool_model.pkl, loaded once per process by the model registry
+model = default_registry().get("time_to_cool_model")
+# The Booster, not the LGBMRegressor wrapper: the pickled wrapper's predict() fails on newer lightgbm versions
+booster = model.booster_
+
+# ---------- Example input: the room's last 5-minute readings, oldest first ----------
+history = [
+    {'timestamp': '2024-02-01 16:05', 'hour_of_day': 16, 'outside_temp': 31.61, 'outside_humidity': 89.8,
+     'weather_condition': 'sunny', 'occupancy_count': 18, 'is_occupied': 1, 'room_temp': 25.21, 'power_kw': 1.6,
+     'fan_speed': 'medium', 'ac_temp_setting': 22, 'ac_control_reason': 'ACTION: Normal cooling (warm)'},
+    {'timestamp': '2024-02-01 16:10', 'hour_of_day': 16, 'outside_temp': 31.58, 'outside_humidity': 90.0,
+     'weather_condition': 'sunny', 'occupancy_count': 19, 'is_occupied': 1, 'room_temp': 24.98, 'power_kw': 1.6,
+     'fan_speed': 'medium', 'ac_temp_setting': 22, 'ac_control_reason': 'ACTION: Normal cooling (warm)'},
+    {'timestamp': '2024-02-01 16:15', 'hour_of_day': 16, 'outside_temp': 31.55, 'outside_humidity': 90.2,
+     'weather_condition': 'sunny', 'occupancy_count': 19, 'is_occupied': 1, 'room_temp': 24.76, 'power_kw': 1.6,
+     'fan_speed': 'medium', 'ac_temp_setting': 22, 'ac_control_reason': 'ACTION: Normal cooling (warm)'},
+]
 example_row = {
     'timestamp': '2024-02-01 16:20',
     'hour_of_day': 16,
@@ -24,47 +41,13 @@ example_row = {
     'ac_control_reason': 'ACTION: Normal cooling (warm)'
 }
 
-df = pd.DataFrame([example_row])
-
 # ---------- Feature engineering ----------
-TARGET_TEMP = 23.0
-df['temp_diff'] = df['room_temp'] - TARGET_TEMP
-df['cooling_rate_5min'] = 0.0
-df['room_temp_roll_mean_15'] = df['room_temp']
-df['power_kw_roll_15'] = df['power_kw']
-
-# Fan speed numeric
-fan_map = {'off': 0, 'low': 1, 'medium': 2, 'med': 2, 'high': 3}
-df['fan_speed_num'] = df['fan_speed'].str.lower().map(fan_map).fillna(0)
-
-# Cyclic time features
-df['hour_sin'] = np.sin(2 * np.pi * df['hour_of_day'] / 24.0)
-df['hour_cos'] = np.cos(2 * np.pi * df['hour_of_day'] / 24.0)
-
-# AC on fraction
-df['ac_on_frac_15'] = ((df['power_kw'] > 0.05) |
-                       (df['fan_speed_num'] > 0) |
-                       df['ac_control_reason'].str.contains('cool', case=False, na=False)).astype(float)
-
-# ---------- One-hot weather (ensure same columns as model) ----------
-weather_dummies = pd.get_dummies(df['weather_condition'].fillna('unknown'), prefix='weather')
-
-# Get the weather columns expected by the model
-model_weather_cols = [c for c in model.feature_name_ if c.startswith('weather_')]
-
-# Add missing weather columns as 0
-for col in model_weather_cols:
-    if col not in weather_dummies:
-        weather_dummies[col] = 0
-
-# Reorder columns to match model
-weather_dummies = weather_dummies[model_weather_cols]
-
-df = pd.concat([df, weather_dummies], axis=1)
-
-# ---------- Select features ----------
-FEATURES = model.feature_name_  # exact features from trained model
+# Rolling windows (cooling_rate_5min, *_roll_15, ac_on_frac_15) from the stored history,
+# columns (including the weather one-hot) in the model's own feature order
+features = TimeToCoolFeatureEngine(booster.feature_name())
+features.warm_up("demo_room", history)
+x = features.update("demo_room", example_row)
 
 # ---------- Prediction ----------
-t_pred = float(model.predict(df[FEATURES])[0])
+t_pred = float(booster.predict(x.reshape(1, -1))[0])
 print(f"Predicted time to reach {TARGET_TEMP}°C: {t_pred:.1f} minutes")
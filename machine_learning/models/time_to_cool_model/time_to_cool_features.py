@@ -0,0 +1,250 @@
+import argparse
+import math
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Column order of the trained model (time_to_cool_model.pkl feature_name_)
+FEATURE_COLUMNS = [
+    "room_temp", "temp_diff", "cooling_rate_5min", "room_temp_roll_mean_15", "outside_temp", "outside_humidity",
+    "occupancy_count", "is_occupied", "power_kw", "power_kw_roll_15", "fan_speed_num", "ac_temp_setting",
+    "hour_sin", "hour_cos", "ac_on_frac_15", "weather_cloudy", "weather_rainy", "weather_sunny",
+]
+TARGET_TEMP = 23.0
+CADENCE_MIN = 5.0                                           # Sensor history is stored every 5 minutes
+WINDOW = max(1, int(round(15.0 / CADENCE_MIN)))             # Readings in the 15-minute rolling windows (notebook: win)
+FAN_SPEED_NUM = {'off': 0, 'low': 1, 'medium': 2, 'med': 2, 'high': 3}
+
+_HOUR_SIN = [math.sin(2 * math.pi * h / 24) for h in range(24)]
+_HOUR_COS = [math.cos(2 * math.pi * h / 24) for h in range(24)]
+_NAN = float("nan")
+
+
+def _to_datetime(timestamp):
+    if isinstance(timestamp, datetime):   # also pd.Timestamp
+        return timestamp
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp)
+    return datetime.fromisoformat(str(timestamp))
+
+
+def _number(value):
+    if value is None or value == "":
+        return _NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _NAN
+
+
+def _text(value):
+    return value.lower() if isinstance(value, str) else None
+
+
+class FeatureLayout:
+    """
+    Position of every feature in a model's input, computed once per model.
+    The weather one-hot columns are taken from the model's own feature names, so a weather value the
+    model was not trained on simply sets no column (pd.get_dummies + reindex in the notebook).
+    """
+
+    def __init__(self, feature_names=FEATURE_COLUMNS):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self.index = index = {name: i for i, name in enumerate(self.feature_names)}
+        missing = [c for c in FEATURE_COLUMNS[:15] if c not in index]
+        if missing:
+            raise ValueError(f"Model features {missing} cannot be built by TimeToCoolFeatureState")
+        self.base = [index[c] for c in FEATURE_COLUMNS[:15]]
+        self.weather = {name[len("weather_"):]: i for name, i in index.items() if name.startswith("weather_")}
+
+
+class TimeToCoolFeatureState:
+    """
+    Incremental time-to-cool features of one room, fed with its 5-minute readings in time order.
+    Keeps the last WINDOW room_temp/power_kw/ac_on values in a ring buffer, so the rolling features of
+    time_to_cool.ipynb (cooling_rate_5min, room_temp_roll_mean_15, power_kw_roll_15, ac_on_frac_15)
+    are updated in O(1) per reading. Like rolling(window, min_periods=1) they use the readings
+    available so far, and cooling_rate_5min is 0.0 on the first reading (fillna(0.0)).
+    """
+
+    __slots__ = ("_temp", "_power", "_ac_on", "_pos", "count", "last_time", "last_temp")
+
+    def __init__(self):
+        self._temp = [_NAN] * WINDOW
+        self._power = [_NAN] * WINDOW
+        self._ac_on = [_NAN] * WINDOW
+        self._pos = -1
+        self.count = 0
+        self.last_time = None
+        self.last_temp = _NAN
+
+    @staticmethod
+    def _mean(values):
+        # Mean of the non-NaN values, NaN if none (pandas rolling mean)
+        total = 0.0
+        n = 0
+        for v in values:
+            if v == v:
+                total += v
+                n += 1
+        return total / n if n else _NAN
+
+    def update(self, reading, layout, out):
+        """
+        Args:
+            reading (dict): One row as stored in the dataset/database: timestamp, room_temp, outside_temp,
+                outside_humidity, weather_condition, occupancy_count, is_occupied, power_kw, fan_speed,
+                ac_temp_setting, ac_control_reason and optionally hour_of_day.
+            layout (FeatureLayout): Column positions of the model.
+            out (np.ndarray): Row to write the features into, e.g. a row of a batch matrix.
+
+        Returns:
+            np.ndarray: out
+        """
+        ts = _to_datetime(reading["timestamp"])
+        hour = reading.get("hour_of_day")
+        hour = ts.hour if hour is None else int(hour)
+        temp = _number(reading["room_temp"])
+        power = _number(reading["power_kw"])
+        setting = _number(reading.get("ac_temp_setting"))
+        fan = _text(reading.get("fan_speed"))
+        reason = _text(reading.get("ac_control_reason"))
+        # AC considered on as in time_to_cool.ipynb (an unknown fan speed counts as not 'off')
+        ac_on = float(power > 0.05 or fan != 'off' or (reason is not None and 'cool' in reason)
+                      or (setting == setting and setting < temp))
+
+        if self.last_time is None:
+            rate = 0.0
+        else:
+            minutes = (ts - self.last_time).total_seconds() / 60.0
+            rate = (self.last_temp - temp) / minutes if minutes > 0 else _NAN
+            rate = 0.0 if rate != rate else rate
+        self.last_time, self.last_temp = ts, temp
+
+        pos = (self._pos + 1) % WINDOW
+        self._pos = pos
+        self._temp[pos] = temp
+        self._power[pos] = power
+        self._ac_on[pos] = ac_on
+        self.count += 1
+
+        values = (
+            temp, temp - TARGET_TEMP, rate, self._mean(self._temp), _number(reading["outside_temp"]),
+            _number(reading["outside_humidity"]), _number(reading["occupancy_count"]), _number(reading["is_occupied"]),
+            power, self._mean(self._power), FAN_SPEED_NUM.get(fan, 0), setting,
+            _HOUR_SIN[hour], _HOUR_COS[hour], self._mean(self._ac_on),
+        )
+        if len(layout.weather):
+            out[:] = 0.0
+        for i, value in zip(layout.base, values):
+            out[i] = value
+        weather = layout.weather.get(reading.get("weather_condition"))
+        if weather is not None:
+            out[weather] = 1.0
+        return out
+
+
+class TimeToCoolFeatureEngine:
+    """
+    Time-to-cool feature states for many rooms, keyed by room id, aligned to one model's feature order.
+    """
+
+    def __init__(self, feature_names=FEATURE_COLUMNS):
+        self.layout = FeatureLayout(feature_names)
+        self.rooms = {}
+        self.vectors = {}
+
+    def update(self, room_id, reading, out=None):
+        state = self.rooms.get(room_id)
+        if state is None:
+            state = self.rooms[room_id] = TimeToCoolFeatureState()
+            self.vectors[room_id] = np.zeros(self.layout.n_features)
+        vector = self.vectors[room_id]
+        state.update(reading, self.layout, vector)
+        if out is not None:
+            out[:] = vector
+            return out
+        return vector
+
+    def warm_up(self, room_id, history):
+        """
+        Replays stored readings of a room (oldest first), e.g. the last WINDOW rows from the database,
+        so the rolling windows are filled before the first live reading.
+        """
+        for reading in history:
+            self.update(room_id, reading)
+        return self.vectors.get(room_id)
+
+    def matrix(self, room_ids):
+        """
+        Latest feature vectors of the given rooms stacked in one (len(room_ids), n_features) matrix.
+        """
+        return np.vstack([self.vectors[room_id] for room_id in room_ids])
+
+
+def notebook_features(df, feature_names=FEATURE_COLUMNS):
+    """
+    Feature engineering of time_to_cool.ipynb on a whole history of one room (reference for update()).
+    """
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    df['ac_on'] = (df['power_kw'] > 0.05) | (df['fan_speed'].str.lower() != 'off') \
+        | df['ac_control_reason'].str.contains('cool', case=False, na=False) \
+        | ((pd.to_numeric(df['ac_temp_setting'], errors='coerce').notnull())
+           & (pd.to_numeric(df['ac_temp_setting'], errors='coerce') < df['room_temp']))
+    median_dt = df['timestamp'].diff().dt.total_seconds().div(60.0).median()
+    lag_5min = max(1, int(round(5.0 / median_dt)))
+    df['temp_diff'] = df['room_temp'] - TARGET_TEMP
+    time_lag = (df['timestamp'] - df['timestamp'].shift(lag_5min)).dt.total_seconds().div(60.0)
+    df['cooling_rate_5min'] = ((df['room_temp'].shift(lag_5min) - df['room_temp']) / time_lag).fillna(0.0)
+    win = max(1, int(round(15.0 / median_dt)))
+    df['room_temp_roll_mean_15'] = df['room_temp'].rolling(window=win, min_periods=1).mean()
+    df['power_kw_roll_15'] = df['power_kw'].rolling(window=win, min_periods=1).mean()
+    df['ac_on_frac_15'] = df['ac_on'].rolling(window=win, min_periods=1).mean()
+    df['fan_speed_num'] = pd.to_numeric(df['fan_speed'].str.lower().map(FAN_SPEED_NUM), errors='coerce').fillna(0)
+    df['ac_temp_setting'] = pd.to_numeric(df['ac_temp_setting'], errors='coerce')
+    df['hour_sin'] = np.sin(2 * np.pi * df['hour_of_day'] / 24.0)
+    df['hour_cos'] = np.cos(2 * np.pi * df['hour_of_day'] / 24.0)
+    weather = pd.get_dummies(df['weather_condition'].fillna('unknown').astype(str), prefix='weather')
+    df = pd.concat([df, weather], axis=1).reindex(columns=list(feature_names), fill_value=0)
+    return df.to_numpy(dtype=np.float64)
+
+
+# --- Parity and latency against the notebook's pandas features ---
+def run_benchmark(csv_path):
+    df = pd.read_csv(csv_path)
+    records = df.to_dict("records")
+    expected = notebook_features(df)
+
+    engine = TimeToCoolFeatureEngine()
+    started = time.perf_counter()
+    online = np.vstack([engine.update(0, record).copy() for record in records])
+    online_s = time.perf_counter() - started
+    assert np.array_equal(np.isnan(expected), np.isnan(online)), "NaN pattern differs"
+    max_diff = float(np.nanmax(np.abs(expected - online)))
+
+    # One tick of many rooms into a preallocated batch matrix
+    n_rooms = 1000
+    X = np.empty((n_rooms, engine.layout.n_features))
+    started = time.perf_counter()
+    for step in range(WINDOW + 1):
+        for room_id in range(n_rooms):
+            engine.update(room_id, records[(room_id + step) % len(records)], out=X[room_id])
+    tick_ms = (time.perf_counter() - started) * 1000 / (WINDOW + 1)
+
+    print(f"{len(records)} rows: max |difference| to the notebook features {max_diff:.2e}")
+    print(f"Online update {online_s * 1e6 / len(records):.1f} us/reading; "
+          f"{n_rooms} rooms per 5-minute tick {tick_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Check the online time-to-cool features against the notebook's.")
+    parser.add_argument("--csv", default=os.path.join(base_dir, "..", "occupancy_pred_model", "testset.csv"))
+    args = parser.parse_args()
+    run_benchmark(args.csv)
@@ -0,0 +1,257 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# --- CONFIGURATION PARAMETERS ---
+FILE_QUEUE_SIZE = 8          # Decoded frames buffered ahead of inference when reading a file
+RENDER_QUEUE_SIZE = 8        # Inferred frames waiting for the render/encode stage
+STATS_WINDOW = 1000          # Recent end-to-end latencies kept for percentiles
+
+_STOP = object()
+
+
+class LatestFrameCapture:
+    """
+    Capture thread around cv2.VideoCapture.
+    - live=True: only the newest frame is kept; frames the consumer did not pick up in time are dropped,
+      so a slow inference stage never works on stale images of a network stream.
+    - live=False (video files): frames are queued and none are dropped.
+    """
+
+    def __init__(self, source, live=False, queue_size=FILE_QUEUE_SIZE, api=cv2.CAP_ANY):
+        self.cap = cv2.VideoCapture(source, api)
+        self.live = live
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = int(self.cap.get(cv2.CAP_PROP_FPS)) or 25
+        self.frames_read = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._latest = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._done = False
+        self._thread = None
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="Capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        frame_index = 0
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            item = (frame_index, frame, time.perf_counter())
+            frame_index += 1
+            self.frames_read += 1
+            if self.live:
+                with self._cond:
+                    if self._latest is not None:
+                        self.dropped += 1
+                    self._latest = item
+                    self._cond.notify()
+            else:
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        with self._cond:
+            self._done = True
+            self._cond.notify()
+        if not self.live:
+            # The consumer may already be gone: make room for the end marker instead of blocking
+            while True:
+                try:
+                    self._queue.put_nowait(_STOP)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def read(self):
+        """
+        Returns (frame_index, frame, captured_at), or None once the source is exhausted.
+        """
+        if not self.live:
+            item = self._queue.get()
+            return None if item is _STOP else item
+        with self._cond:
+            while self._latest is None and not self._done:
+                self._cond.wait()
+            item, self._latest = self._latest, None
+            return item
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.cap.release()
+
+
+class CVPipeline:
+    """
+    Capture -> inference -> render pipeline, one thread per stage.
+    - infer(frame, frame_index) runs on the inference thread and returns any result object.
+    - render(frame, frame_index, result) runs on the calling (main) thread, where cv2.imshow must live;
+      pass render=None in headless production to skip drawing and encoding entirely.
+    - Reports per-stage FPS and end-to-end latency from capture to the last stage.
+    """
+
+    def __init__(self, capture, infer, render=None, render_queue_size=RENDER_QUEUE_SIZE):
+        """
+        Args:
+            capture (LatestFrameCapture): Started or not yet started frame source.
+            infer (callable): infer(frame, frame_index) -> result.
+            render (callable): render(frame, frame_index, result) -> False to stop the pipeline, or None.
+            render_queue_size (int): Inferred frames waiting for the render stage.
+        """
+        self.capture = capture
+        self.infer = infer
+        self.render = render
+        self._render_queue = queue.Queue(maxsize=render_queue_size)
+        self._stop = threading.Event()
+        self._render_done = threading.Event()
+        self._lock = threading.Lock()
+        self._latencies = []
+        self._stats = {"inferred": 0, "rendered": 0, "render_dropped": 0, "infer_s": 0.0, "render_s": 0.0}
+        self._started = None
+        self._finished = None
+
+    def run(self):
+        """
+        Runs until the source is exhausted or render() returns False. Returns stats().
+        """
+        self._started = time.perf_counter()
+        if self.capture._thread is None:
+            self.capture.start()
+        infer_thread = threading.Thread(target=self._infer_loop, name="Inference", daemon=True)
+        infer_thread.start()
+        try:
+            if self.render is None:
+                infer_thread.join()
+            else:
+                self._render_loop()
+        finally:
+            self._stop.set()
+            self.capture.stop()
+            infer_thread.join()
+            self._finished = time.perf_counter()
+        return self.stats()
+
+    def stop(self):
+        self._stop.set()
+
+    def _infer_loop(self):
+        try:
+            while not self._stop.is_set():
+                item = self.capture.read()
+                if item is None:
+                    break
+                frame_index, frame, captured_at = item
+                started = time.perf_counter()
+                result = self.infer(frame, frame_index)
+                done = time.perf_counter()
+                with self._lock:
+                    self._stats["inferred"] += 1
+                    self._stats["infer_s"] += done - started
+                if self.render is None:
+                    self._record_latency(done - captured_at)
+                    continue
+                item = (frame_index, frame, captured_at, result)
+                if self.capture.live:
+                    # Never let the display hold up a live stream: replace what is waiting instead
+                    try:
+                        self._render_queue.put_nowait(item)
+                    except queue.Full:
+                        try:
+                            self._render_queue.get_nowait()
+                            with self._lock:
+                                self._stats["render_dropped"] += 1
+                        except queue.Empty:
+                            pass
+                        self._render_queue.put_nowait(item)
+                else:
+                    while not self._stop.is_set():
+                        try:
+                            self._render_queue.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+        finally:
+            # If render() raised, nobody drains the queue any more: never block on a full queue then
+            while True:
+                try:
+                    self._render_queue.put(_STOP, timeout=0.1)
+                    break
+                except queue.Full:
+                    if self._render_done.is_set():
+                        break
+
+    def _render_loop(self):
+        try:
+            self._render_items()
+        finally:
+            self._render_done.set()
+
+    def _render_items(self):
+        while True:
+            item = self._render_queue.get()
+            if item is _STOP:
+                return
+            frame_index, frame, captured_at, result = item
+            started = time.perf_counter()
+            keep_going = self.render(frame, frame_index, result)
+            done = time.perf_counter()
+            with self._lock:
+                self._stats["rendered"] += 1
+                self._stats["render_s"] += done - started
+            self._record_latency(done - captured_at)
+            if keep_going is False:
+                self._stop.set()
+                # Let the inference thread finish the frame it holds
+                while self._render_queue.get() is not _STOP:
+                    pass
+                return
+
+    def _record_latency(self, latency_s):
+        with self._lock:
+            self._latencies.append(latency_s)
+            if len(self._latencies) > STATS_WINDOW:
+                del self._latencies[:len(self._latencies) - STATS_WINDOW]
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            latencies = np.array(self._latencies) * 1000
+        end = self._finished or time.perf_counter()
+        elapsed = end - self._started if self._started else 0.0
+        s["capture_fps"] = self.capture.frames_read / elapsed if elapsed else 0.0
+        s["capture_dropped"] = self.capture.dropped
+        s["infer_fps"] = s["inferred"] / elapsed if elapsed else 0.0
+        s["render_fps"] = s["rendered"] / elapsed if elapsed else 0.0
+        s["avg_infer_ms"] = s["infer_s"] * 1000 / s["inferred"] if s["inferred"] else 0.0
+        s["avg_render_ms"] = s["render_s"] * 1000 / s["rendered"] if s["rendered"] else 0.0
+        s["latency_avg_ms"] = float(latencies.mean()) if len(latencies) else 0.0
+        s["latency_p95_ms"] = float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+        return s
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"Capture {s['capture_fps']:.1f} fps ({s['capture_dropped']} stale frames dropped), "
+              f"inference {s['infer_fps']:.1f} fps ({s['avg_infer_ms']:.1f} ms/frame), "
+              f"render {s['render_fps']:.1f} fps ({s['avg_render_ms']:.1f} ms/frame)")
+        print(f"End-to-end frame latency: avg {s['latency_avg_ms']:.1f} ms, p95 {s['latency_p95_ms']:.1f} ms")
+        return s
@@ -0,0 +1,324 @@
+import argparse
+import collections
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from roi_index import DeskROIIndex
+from roi_crop import CropPlan, person_detections
+
+# --- CONFIGURATION PARAMETERS ---
+MODEL_PATH = "yolov8l.pt"
+CONFIDENCE = 0.1
+BATCH_SIZE = 8               # Frames (from any camera) passed to one model([...]) call
+BATCH_WAIT_S = 0.02          # How long the worker waits for a batch to fill up once a frame is queued
+MAX_PENDING_PER_CAMERA = 4   # Older frames of a camera are dropped when it produces faster than we infer
+
+OCCUPIED = "Occupied"
+VACANT = "Vacant"
+
+
+def load_desk_rois(path):
+    """
+    Reads desk_roi_pos.json ({desk name: [[x, y], ...]}) into int32 polygons.
+    """
+    with open(path, "r") as f:
+        desk_rois_json = json.load(f)
+    return {desk: np.array(roi, dtype=np.int32) for desk, roi in desk_rois_json.items()}
+
+
+def person_boxes(result, person_cls):
+    """
+    Returns the xyxy boxes of one ultralytics result that belong to the 'person' class, as an (N, 4) int array.
+    """
+    return person_detections(result, person_cls)[0].astype(np.int32)
+
+
+class DeskOccupancy:
+    """
+    Result of one frame of one camera.
+    - status: desk name -> 'Occupied' / 'Vacant', including the smoothing window of the camera.
+    - detected: desks with a person inside in this very frame.
+    - boxes: (N, 4) person boxes, assignment: desk -> indices into boxes.
+    """
+    __slots__ = ("camera_id", "frame_index", "captured_at", "status", "detected", "boxes", "assignment",
+                 "inferred_at")
+
+    def __init__(self, camera_id, frame_index, captured_at, status, detected, boxes, assignment, inferred_at):
+        self.camera_id = camera_id
+        self.frame_index = frame_index
+        self.captured_at = captured_at
+        self.status = status
+        self.detected = detected
+        self.boxes = boxes
+        self.assignment = assignment
+        self.inferred_at = inferred_at
+
+    @property
+    def latency_s(self):
+        return self.inferred_at - self.captured_at
+
+
+class _Camera:
+    def __init__(self, camera_id, desk_rois, smooth_frames, crop, tile_size):
+        self.camera_id = camera_id
+        self.desk_rois = desk_rois
+        self.smooth_frames = smooth_frames
+        self.crop = crop
+        self.tile_size = tile_size
+        self.crop_plan = None
+        self.desk_last_seen = {desk: -999 for desk in desk_rois}
+        self.pending = collections.deque()
+        self.roi_index = None
+
+    def index_for(self, frame):
+        # Built on the first frame, once the camera's resolution is known
+        if self.roi_index is None or (self.roi_index.height, self.roi_index.width) != frame.shape[:2]:
+            self.roi_index = DeskROIIndex(self.desk_rois, frame.shape)
+        return self.roi_index
+
+    def plan_for(self, frame):
+        if self.crop_plan is None or (self.crop_plan.height, self.crop_plan.width) != frame.shape[:2]:
+            self.crop_plan = CropPlan(self.desk_rois, frame.shape, tile_size=self.tile_size)
+        return self.crop_plan
+
+
+class InferenceService:
+    """
+    Long-running YOLO person detector shared by several cameras.
+    - The model is loaded once when the service is created.
+    - Cameras submit frames through per-camera queues; a worker thread builds batches round-robin
+      across cameras and runs one model([...]) call per batch.
+    - Every frame resolves to a DeskOccupancy with per-desk status for that camera.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, model=None, conf=CONFIDENCE, batch_size=BATCH_SIZE,
+                 batch_wait=BATCH_WAIT_S, max_pending=MAX_PENDING_PER_CAMERA, imgsz=None):
+        """
+        Args:
+            model_path (str): YOLO weights loaded with ultralytics when no model is given.
+            model: An already loaded ultralytics YOLO model (or compatible callable with .names).
+            conf (float): Detection confidence threshold.
+            batch_size (int): Maximum frames per inference call.
+            batch_wait (float): Seconds to wait for more frames before running a partial batch.
+            max_pending (int): Frames queued per camera before the oldest one is dropped.
+            imgsz (int): Optional inference input size passed to the model.
+        """
+        if model is None:
+            from ultralytics import YOLO
+            model = YOLO(model_path)
+        self.model = model
+        self.person_cls = next(int(k) for k, v in model.names.items() if v == "person")
+        self.conf = conf
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_pending = max_pending
+        self.imgsz = imgsz
+
+        self._cameras = {}
+        self._order = collections.deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._stats = {"frames": 0, "batches": 0, "dropped": 0, "max_batch": 0, "images": 0, "infer_s": 0.0}
+
+    # ---------- Public API ----------
+    def register_camera(self, camera_id, desk_rois, smooth_frames=0, crop=False, tile_size=None):
+        """
+        Args:
+            camera_id: Any hashable id of the camera.
+            desk_rois (dict): desk name -> int32 polygon, as returned by load_desk_rois().
+            smooth_frames (int): A desk stays 'Occupied' for this many frames after the last detection.
+            crop (bool): Run inference on crops around the desks only (see roi_crop.CropPlan).
+            tile_size (int): With crop, split large desk regions into tiles of this size.
+        """
+        with self._cond:
+            self._cameras[camera_id] = _Camera(camera_id, desk_rois, smooth_frames, crop, tile_size)
+            self._order.append(camera_id)
+
+    def submit(self, camera_id, frame, frame_index, captured_at=None):
+        """
+        Queues a frame of a registered camera.
+
+        Returns:
+            Future: Resolves to a DeskOccupancy. Cancelled if the frame is dropped because the camera is too far ahead.
+        """
+        future = Future()
+        item = (frame, frame_index, time.perf_counter() if captured_at is None else captured_at, future)
+        with self._cond:
+            camera = self._cameras[camera_id]
+            camera.pending.append(item)
+            if len(camera.pending) > self.max_pending:
+                camera.pending.popleft()[3].cancel()
+                self._stats["dropped"] += 1
+            self._cond.notify()
+        return future
+
+    def infer(self, camera_id, frame, frame_index):
+        """
+        Synchronous helper: submits one frame and waits for its result.
+        """
+        return self.submit(camera_id, frame, frame_index).result()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="InferenceService", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s["pending"] = sum(len(c.pending) for c in self._cameras.values())
+        s["avg_batch"] = s["frames"] / s["batches"] if s["batches"] else 0.0
+        s["avg_infer_ms_per_frame"] = s["infer_s"] * 1000 / s["frames"] if s["frames"] else 0.0
+        return s
+
+    # ---------- Worker ----------
+    def _pending_count(self):
+        return sum(len(c.pending) for c in self._cameras.values())
+
+    def _take_batch(self):
+        """
+        Takes up to batch_size frames, one per camera per round, so a fast camera cannot starve the others.
+        """
+        batch = []
+        while len(batch) < self.batch_size:
+            took = False
+            for _ in range(len(self._order)):
+                camera = self._cameras[self._order[0]]
+                self._order.rotate(-1)
+                if camera.pending:
+                    batch.append((camera,) + camera.pending.popleft())
+                    took = True
+                    if len(batch) == self.batch_size:
+                        break
+            if not took:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not self._pending_count():
+                    self._cond.wait()
+                if self._stopping and not self._pending_count():
+                    return
+                deadline = time.monotonic() + self.batch_wait
+                while not self._stopping and self._pending_count() < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            self._process(batch)
+
+    def _process(self, batch):
+        batch = [item for item in batch if item[4].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # Any error fails the futures of this batch instead of killing the only worker thread
+        try:
+            self._infer(batch)
+        except Exception as e:
+            for item in batch:
+                if not item[4].done():
+                    item[4].set_exception(e)
+
+    def _infer(self, batch):
+        # Cropping cameras contribute one image per crop; all images go into the same model call
+        images, spans = [], []
+        for camera, frame, _, _, _ in batch:
+            crops = camera.plan_for(frame).crops(frame) if camera.crop else [frame]
+            spans.append((len(images), len(images) + len(crops)))
+            images.extend(crops)
+        kwargs = {"conf": self.conf, "verbose": False}
+        if self.imgsz is not None:
+            kwargs["imgsz"] = self.imgsz
+        started = time.perf_counter()
+        results = list(self.model(images, **kwargs))
+        inferred_at = time.perf_counter()
+
+        with self._cond:
+            self._stats["frames"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+            self._stats["images"] += len(images)
+            self._stats["infer_s"] += inferred_at - started
+
+        for (camera, frame, frame_index, captured_at, future), (start, end) in zip(batch, spans):
+            if camera.crop:
+                detections = [person_detections(r, self.person_cls) for r in results[start:end]]
+                boxes, _ = camera.crop_plan.merge(detections)
+            else:
+                boxes = person_boxes(results[start], self.person_cls)
+            assignment = camera.index_for(frame).assign(boxes)
+            detected = {desk for desk, people in assignment.items() if people}
+            status = {}
+            for desk_name in camera.desk_rois:
+                if desk_name in detected:
+                    camera.desk_last_seen[desk_name] = frame_index
+                occupied = frame_index - camera.desk_last_seen[desk_name] <= camera.smooth_frames
+                status[desk_name] = OCCUPIED if occupied else VACANT
+            future.set_result(DeskOccupancy(camera.camera_id, frame_index, captured_at, status, detected,
+                                            boxes, assignment, inferred_at))
+
+
+# --- Benchmark: several video files as cameras ---
+def run_benchmark(sources, desk_rois_path, batch_size, frames_per_camera, model_path=MODEL_PATH):
+    """
+    Feeds frames of every source as a separate camera and reports frames/s for the given batch size.
+    """
+    desk_rois = load_desk_rois(desk_rois_path)
+    service = InferenceService(model_path, batch_size=batch_size).start()
+    captures = {}
+    for i, source in enumerate(sources):
+        camera_id = f"cam{i}"
+        captures[camera_id] = cv2.VideoCapture(source)
+        service.register_camera(camera_id, desk_rois)
+
+    started = time.perf_counter()
+    futures = []
+    for frame_index in range(frames_per_camera):
+        for camera_id, cap in captures.items():
+            ret, frame = cap.read()
+            if not ret:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = cap.read()
+                if not ret:
+                    continue
+            futures.append(service.submit(camera_id, frame, frame_index))
+        # Keep at most a couple of batches in flight, like live cameras would
+        while service.stats()["pending"] > batch_size * 2:
+            time.sleep(0.001)
+    done = [f.result() for f in futures if not f.cancelled()]
+    elapsed = time.perf_counter() - started
+    service.stop()
+    for cap in captures.values():
+        cap.release()
+
+    stats = service.stats()
+    print(f"{len(sources)} cameras, batch {batch_size}: {len(done)} frames in {elapsed:.2f}s "
+          f"({len(done) / elapsed:.1f} frames/s), avg batch {stats['avg_batch']:.1f}, dropped {stats['dropped']}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched YOLO inference across several cameras.")
+    parser.add_argument("sources", nargs="+", help="video files or stream URLs, one per camera")
+    parser.add_argument("--rois", default="occupancy_cv/desk_roi_pos.json")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--frames", type=int, default=100, help="frames per camera")
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+    run_benchmark(args.sources, args.rois, args.batch, args.frames, args.model)
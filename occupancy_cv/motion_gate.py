@@ -0,0 +1,171 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+# --- CONFIGURATION PARAMETERS ---
+MOTION_SCALE = 0.25          # Frames are differenced at this fraction of their resolution
+DIFF_THRESHOLD = 25          # Grey-level change that counts as a moving pixel
+MOTION_FRACTION = 0.01       # Fraction of a desk's (dilated) area that must move to trigger detection
+ROI_MARGIN_PX = 20           # Motion this close to a desk polygon (full-resolution pixels) counts as well
+HEARTBEAT_S = 60             # Longest gap between two detections in a static room
+
+
+class MotionGatedScheduler:
+    """
+    Decides per frame whether full YOLO inference is worth running.
+    - Every frame gets a cheap grey, downscaled frame difference, measured inside each desk polygon
+      (dilated by ROI_MARGIN_PX).
+    - Detection runs when a desk shows motion, at most every min_interval frames.
+    - Without motion the gap between detections doubles after every run, up to a heartbeat interval.
+    - Desks without motion since the last detection keep that detection's result (see static_desks()).
+    """
+
+    def __init__(self, desk_rois, frame_shape, min_interval, heartbeat, scale=MOTION_SCALE,
+                 diff_threshold=DIFF_THRESHOLD, motion_fraction=MOTION_FRACTION, margin=ROI_MARGIN_PX):
+        """
+        Args:
+            desk_rois (dict): desk name -> int32 polygon in frame coordinates.
+            frame_shape (tuple): (height, width) of the frames.
+            min_interval (int): Minimum frames between two detections (the old DETECTION_INTERVAL).
+            heartbeat (int): Maximum frames between two detections, even in a static room.
+            scale (float): Downscale factor for the frame differencing.
+            diff_threshold (int): Grey-level difference of a moving pixel.
+            motion_fraction (float): Fraction of a desk's area that must move.
+            margin (int): Dilation of the desk polygons in full-resolution pixels.
+        """
+        self.names = list(desk_rois)
+        self.min_interval = max(1, int(min_interval))
+        self.heartbeat = max(self.min_interval, int(heartbeat))
+        self.scale = scale
+        self.diff_threshold = diff_threshold
+        self.motion_fraction = motion_fraction
+
+        height, width = frame_shape[:2]
+        self.size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        margin_px = max(1, int(round(margin * scale)))
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * margin_px + 1, 2 * margin_px + 1))
+        # Per desk: bounding-box slice of the small frame and the dilated polygon mask inside it
+        self._regions = []
+        for name in self.names:
+            polygon = np.round(np.asarray(desk_rois[name], dtype=np.float64) * scale).astype(np.int32)
+            x1, y1 = np.maximum(polygon.min(axis=0) - margin_px, 0)
+            x2, y2 = np.minimum(polygon.max(axis=0) + margin_px + 1, self.size)
+            mask = np.zeros((max(y2 - y1, 0), max(x2 - x1, 0)), dtype=np.uint8)
+            if mask.size:
+                cv2.fillPoly(mask, [polygon - (x1, y1)], 1)
+                mask = cv2.dilate(mask, kernel)
+            mask = mask.astype(bool)
+            self._regions.append((slice(y1, y2), slice(x1, x2), mask, max(int(mask.sum()), 1)))
+
+        self._previous = None
+        self._last_run = None
+        self._interval = self.min_interval
+        self._moved_since_run = set(self.names)
+        self.stats = {"frames": 0, "runs": 0, "skipped": 0, "motion_runs": 0, "heartbeat_runs": 0,
+                      "gate_s": 0.0}
+
+    def measure(self, frame):
+        """
+        Returns the set of desks with motion between the previous frame and this one.
+        """
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        previous, self._previous = self._previous, small
+        if previous is None:
+            return set(self.names)
+        moving = cv2.absdiff(small, previous) > self.diff_threshold
+        moved = set()
+        for name, (rows, cols, mask, area) in zip(self.names, self._regions):
+            if np.count_nonzero(moving[rows, cols] & mask) >= self.motion_fraction * area:
+                moved.add(name)
+        return moved
+
+    def should_detect(self, frame, frame_index):
+        """
+        Measures motion in this frame and tells whether YOLO should run on it. Call once per frame.
+        """
+        started = time.perf_counter()
+        moved = self.measure(frame)
+        self._moved_since_run |= moved
+        self.stats["frames"] += 1
+
+        since = None if self._last_run is None else frame_index - self._last_run
+        if since is None:
+            run, reason = True, "motion_runs"
+        elif self._moved_since_run and since >= self.min_interval:
+            run, reason = True, "motion_runs"
+        elif since >= self._interval:
+            run, reason = True, "heartbeat_runs"
+        else:
+            run, reason = False, None
+
+        if run:
+            # Back off while the room stays static, reset as soon as something moves
+            if reason == "heartbeat_runs":
+                self._interval = min(self._interval * 2, self.heartbeat)
+            else:
+                self._interval = self.min_interval
+            self._last_run = frame_index
+            self._moved_since_run = set()
+            self.stats["runs"] += 1
+            self.stats[reason] += 1
+        else:
+            self.stats["skipped"] += 1
+        self.stats["gate_s"] += time.perf_counter() - started
+        return run
+
+    def static_desks(self):
+        """
+        Desks without motion since the last detection: their last detection result still holds.
+        """
+        return set(self.names) - self._moved_since_run
+
+    def metrics(self):
+        s = dict(self.stats)
+        s["skip_ratio"] = s["skipped"] / s["frames"] if s["frames"] else 0.0
+        s["avg_gate_ms"] = s["gate_s"] * 1000 / s["frames"] if s["frames"] else 0.0
+        s["current_interval"] = self._interval
+        return s
+
+
+# --- Replay a video through the gate without running YOLO ---
+def run_replay(video_path, desk_rois_path, heartbeat_s):
+    from inference_service import load_desk_rois
+
+    desk_rois = load_desk_rois(desk_rois_path)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open file {video_path}")
+        return None
+    fps = max(int(cap.get(cv2.CAP_PROP_FPS)), 1)
+    frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    scheduler = MotionGatedScheduler(desk_rois, frame_shape, min_interval=fps, heartbeat=fps * heartbeat_s)
+
+    frame_index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        scheduler.should_detect(frame, frame_index)
+        frame_index += 1
+    cap.release()
+
+    m = scheduler.metrics()
+    fixed_runs = (frame_index + fps - 1) // fps
+    print(f"{m['frames']} frames: YOLO would run {m['runs']} times ({m['motion_runs']} motion, "
+          f"{m['heartbeat_runs']} heartbeat) vs {fixed_runs} with a fixed 1 s interval; "
+          f"skip ratio {m['skip_ratio']:.3f}, gate cost {m['avg_gate_ms']:.2f} ms/frame")
+    return m
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a video through the motion gate and count YOLO runs.")
+    parser.add_argument("video")
+    parser.add_argument("--rois", default="occupancy_cv/desk_roi_pos.json")
+    parser.add_argument("--heartbeat", type=float, default=HEARTBEAT_S, help="seconds")
+    args = parser.parse_args()
+    run_replay(args.video, args.rois, args.heartbeat)
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# --- CONFIGURATION PARAMETERS ---
+LOG_PATH = "occupancy_cv/occupancy_log.ndjson"
+FLUSH_EVERY = 64             # Buffered events written out together
+FLUSH_INTERVAL_S = 1.0       # ...or after this long, whichever comes first
+
+# Record types, one JSON object per line:
+#   {"type": "start", "desks": [...], "frame": 0, "ts": ...}            -- a camera run begins, every desk Vacant
+#   {"type": "change", "desk": "Desk 1", "state": "Occupied", "frame": 42, "ts": ...}
+#   {"type": "end", "frame": 1234, "ts": ...}                           -- last frame processed
+START = "start"
+CHANGE = "change"
+END = "end"
+INITIAL_STATE = "Vacant"
+
+
+class OccupancyRecorder:
+    """
+    Append-only occupancy log that only stores state changes.
+    - record() is called every frame but writes a line only when a desk changes state.
+    - Lines are buffered and flushed every FLUSH_EVERY events or FLUSH_INTERVAL_S seconds.
+    - Memory stays constant: only the last state of every desk is kept.
+    """
+
+    def __init__(self, path=LOG_PATH, desks=(), flush_every=FLUSH_EVERY, flush_interval=FLUSH_INTERVAL_S,
+                 start_frame=0):
+        """
+        Args:
+            path (str): NDJSON file the events are appended to.
+            desks (iterable): Desk names; every desk starts Vacant.
+            flush_every (int): Buffered events written out together.
+            flush_interval (float): Maximum seconds an event stays in the buffer.
+            start_frame (int): Frame index of the first frame of this run.
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.states = {desk: INITIAL_STATE for desk in desks}
+        self.last_frame = start_frame
+        self.events = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._file = open(path, "a", encoding="utf-8")
+        self._emit({"type": START, "desks": list(self.states), "frame": start_frame, "ts": time.time()})
+
+    def record(self, frame_index, desk_status, ts=None):
+        """
+        Compares the status of one frame with the previous one and logs the desks that changed.
+
+        Args:
+            frame_index (int): Index of the frame.
+            desk_status (dict): desk name -> 'Occupied' / 'Vacant'.
+            ts (float): Wall time of the frame, defaults to now.
+        """
+        self.last_frame = frame_index
+        changed = [(desk, state) for desk, state in desk_status.items() if self.states.get(desk) != state]
+        if changed:
+            ts = time.time() if ts is None else ts
+            for desk, state in changed:
+                self.states[desk] = state
+                self._emit({"type": CHANGE, "desk": desk, "state": state, "frame": frame_index, "ts": ts})
+                self.events += 1
+        if len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer = []
+            self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._emit({"type": END, "frame": self.last_frame, "ts": time.time()})
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _emit(self, record):
+        self._buffer.append(json.dumps(record) + "\n")
+
+
+class OccupancyLogReader:
+    """
+    Reconstructs per-frame desk status from an OccupancyRecorder log, streaming through the file.
+    When a file holds several runs (the recorder appends), frames refer to the last run unless run= is given.
+    """
+
+    def __init__(self, path=LOG_PATH):
+        self.path = path
+
+    def _records(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A half-written last line after a crash
+                    continue
+
+    def runs(self):
+        """
+        Returns (desks, first_frame, last_frame, n_events) for every run in the file.
+        """
+        runs = []
+        for record in self._records():
+            if record["type"] == START:
+                runs.append([record["desks"], record["frame"], record["frame"], 0])
+            elif runs:
+                runs[-1][2] = max(runs[-1][2], record["frame"])
+                runs[-1][3] += record["type"] == CHANGE
+        return [tuple(run) for run in runs]
+
+    def _run_records(self, run):
+        n_runs = sum(1 for record in self._records() if record["type"] == START)
+        target = n_runs - 1 if run is None else run
+        current = -1
+        for record in self._records():
+            if record["type"] == START:
+                current += 1
+            if current == target:
+                yield record
+            elif current > target:
+                return
+
+    def iter_frames(self, start=None, end=None, run=None):
+        """
+        Yields (frame_index, status dict) for every frame in [start, end] of a run.
+        Only the current state of every desk is held in memory.
+        """
+        states, frame, last_frame = None, None, None
+        for record in self._run_records(run):
+            if record["type"] == START:
+                states = {desk: INITIAL_STATE for desk in record["desks"]}
+                frame = record["frame"]
+                last_frame = frame
+                continue
+            last_frame = max(last_frame, record["frame"])
+            if record["type"] != CHANGE:
+                continue
+            # Every frame before this change still has the previous state
+            while frame < record["frame"]:
+                if (start is None or frame >= start) and (end is None or frame <= end):
+                    yield frame, dict(states)
+                frame += 1
+                if end is not None and frame > end:
+                    return
+            states[record["desk"]] = record["state"]
+        if states is None:
+            return
+        while frame <= last_frame and (end is None or frame <= end):
+            if start is None or frame >= start:
+                yield frame, dict(states)
+            frame += 1
+
+    def state_at(self, frame_index, run=None):
+        """
+        Desk status at one frame, replaying the changes up to it.
+        """
+        states = None
+        for record in self._run_records(run):
+            if record["type"] == START:
+                states = {desk: INITIAL_STATE for desk in record["desks"]}
+            elif record["type"] == CHANGE:
+                if record["frame"] > frame_index:
+                    break
+                states[record["desk"]] = record["state"]
+        return states
+
+    def changes(self, desk=None, run=None):
+        """
+        Yields the change records of a run, optionally of one desk only.
+        """
+        for record in self._run_records(run):
+            if record["type"] == CHANGE and (desk is None or record["desk"] == desk):
+                yield record
+
+    def to_frame_dict(self, run=None):
+        """
+        Expands a run to the old log.json layout {frame: {desk: state}}. Only meant for short clips.
+        """
+        return {frame: status for frame, status in self.iter_frames(run=run)}
+
+
+# --- Benchmark: rewrite-the-whole-log vs append-only events ---
+def run_benchmark(frames, desks, change_every):
+    desk_names = [f"Desk {k + 1}" for k in range(desks)]
+    workdir = tempfile.mkdtemp()
+
+    def status_at(i):
+        return {desk: "Occupied" if (i // change_every + k) % 3 == 0 else "Vacant" for k, desk in enumerate(desk_names)}
+
+    json_path = os.path.join(workdir, "log.json")
+    all_status = {}
+    started = time.perf_counter()
+    rewrite_frames = min(frames, 2000)
+    for i in range(rewrite_frames):
+        all_status[i] = status_at(i)
+        with open(json_path, "w") as f:
+            json.dump(all_status, f, indent=4)
+    rewrite_s = time.perf_counter() - started
+
+    log_path = os.path.join(workdir, "occupancy_log.ndjson")
+    started = time.perf_counter()
+    with OccupancyRecorder(log_path, desk_names) as recorder:
+        for i in range(frames):
+            recorder.record(i, status_at(i))
+    append_s = time.perf_counter() - started
+
+    reader = OccupancyLogReader(log_path)
+    mismatches = sum(status != status_at(i) for i, status in reader.iter_frames())
+    print(f"Rewriting log.json every frame: {rewrite_s * 1000 / rewrite_frames:.3f} ms/frame over "
+          f"{rewrite_frames} frames, {os.path.getsize(json_path) / 1024:.0f} KiB")
+    print(f"Append-only change log:         {append_s * 1000 / frames:.3f} ms/frame over {frames} frames, "
+          f"{os.path.getsize(log_path) / 1024:.0f} KiB, {recorder.events} events")
+    print(f"Reconstructed frames differing from the input: {mismatches}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the append-only occupancy log with rewriting log.json.")
+    parser.add_argument("--frames", type=int, default=100000)
+    parser.add_argument("--desks", type=int, default=5)
+    parser.add_argument("--change-every", type=int, default=300, help="frames between state changes")
+    args = parser.parse_args()
+    run_benchmark(args.frames, args.desks, args.change_every)
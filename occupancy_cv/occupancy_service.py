@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import cv2
+
+from inference_service import InferenceService, load_desk_rois, MODEL_PATH, OCCUPIED
+from motion_gate import MotionGatedScheduler
+from cv_pipeline import LatestFrameCapture
+
+# --- CONFIGURATION PARAMETERS ---
+SENSOR_TOPIC = "room/{room_id}/device/{device_id}/sensor"   # Same path the ESP32 sensors use, see mqtt_connection.py
+DEBOUNCE_S = 5.0             # A desk must keep its new state this long before the change is published
+SUMMARY_INTERVAL_S = 60.0    # Occupied-desk count per room, even when nothing changed
+SMOOTH_S = 10.0              # A desk stays occupied this long after the last detection (SMOOTH_FRAMES of the prototype)
+HEARTBEAT_S = 60.0           # Longest gap between two detections in a static room
+PUBLISH_QOS = 1
+
+
+class OccupancyDebouncer:
+    """
+    Turns per-frame desk status into debounced changes.
+    A desk's first observation is reported straight away; afterwards a new state is only reported
+    once it has been observed continuously for hold_s seconds.
+    """
+
+    def __init__(self, hold_s=DEBOUNCE_S):
+        self.hold_s = hold_s
+        self.published = {}
+        self._candidates = {}
+
+    def update(self, status, now=None):
+        """
+        Args:
+            status (dict): desk -> bool occupied, for the desks seen in this frame.
+            now (float): Time of the observation.
+
+        Returns:
+            list: (desk, occupied) changes to publish.
+        """
+        now = time.time() if now is None else now
+        changes = []
+        for desk, occupied in status.items():
+            current = self.published.get(desk)
+            if current is None:
+                self.published[desk] = occupied
+                changes.append((desk, occupied))
+            elif occupied == current:
+                self._candidates.pop(desk, None)
+            else:
+                since = self._candidates.setdefault(desk, now)
+                if now - since >= self.hold_s:
+                    self.published[desk] = occupied
+                    del self._candidates[desk]
+                    changes.append((desk, occupied))
+        return changes
+
+
+class _CameraWorker:
+    def __init__(self, config, debounce_s=DEBOUNCE_S):
+        self.camera_id = config["camera_id"]
+        self.source = config["source"]
+        self.live = config.get("live", True)
+        self.room_id = int(config["room_id"])
+        self.desk_rois = load_desk_rois(config["desk_rois"])
+        self.desk_devices = {desk: int(device_id) for desk, device_id in config["desk_devices"].items()}
+        self.capture = None
+        self.scheduler = None
+        self.writer = None
+        self.last_status = {}
+        # Desk names ("Desk 1", ...) repeat across cameras: debounced state is kept per camera
+        self.debouncer = OccupancyDebouncer(debounce_s)
+        self.thread = None
+
+
+class OccupancyService:
+    """
+    Headless desk-occupancy service, one per building/server.
+    - Every camera gets a capture thread (latest frame only for live streams) and a motion gate;
+      frames that need detection go to one shared, batched InferenceService.
+    - Desk changes are debounced and published as {"occupancy": 0|1} on room/<room>/device/<desk device>/sensor,
+      so they land in sensor_data/realtime_state through the normal ingest path.
+    - Every summary_interval the number of occupied desks per room is published for the room's summary device.
+    - No window and no video writing unless record_dir is given.
+    """
+
+    def __init__(self, config, publish, inference=None, record_dir=None):
+        """
+        Args:
+            config (dict): Service configuration, see occupancy_service.example.json.
+            publish (callable): publish(topic, payload, qos), e.g. a paho client's publish.
+            inference (InferenceService): Shared detector, created from config["model"] if not given.
+            record_dir (str): Write annotated videos per camera into this directory.
+        """
+        self.config = config
+        self.publish = publish
+        self.record_dir = record_dir
+        self.summary_interval = config.get("summary_interval_s", SUMMARY_INTERVAL_S)
+        self.smooth_s = config.get("smooth_s", SMOOTH_S)
+        self.heartbeat_s = config.get("heartbeat_s", HEARTBEAT_S)
+        self.rooms = {int(room_id): room for room_id, room in config.get("rooms", {}).items()}
+        self.cameras = [_CameraWorker(c, config.get("debounce_s", DEBOUNCE_S)) for c in config["cameras"]]
+
+        if inference is None:
+            inference = InferenceService(config.get("model", MODEL_PATH), batch_size=config.get("batch_size", 8))
+        self.inference = inference
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._summary_thread = None
+        self.stats = {"frames": 0, "inferences": 0, "skipped": 0, "changes_published": 0,
+                      "summaries_published": 0, "publish_errors": 0}
+
+    # ---------- Lifecycle ----------
+    def start(self):
+        if self.inference._thread is None:
+            self.inference.start()
+        for camera in self.cameras:
+            camera.capture = LatestFrameCapture(camera.source, live=camera.live)
+            if not camera.capture.is_opened():
+                print(f"Error: Could not open camera {camera.camera_id} at {camera.source}")
+                continue
+            shape = (camera.capture.height, camera.capture.width)
+            fps = camera.capture.fps
+            camera.scheduler = MotionGatedScheduler(camera.desk_rois, shape, min_interval=fps,
+                                                    heartbeat=int(fps * self.heartbeat_s))
+            self.inference.register_camera(camera.camera_id, camera.desk_rois, smooth_frames=int(fps * self.smooth_s))
+            if self.record_dir:
+                os.makedirs(self.record_dir, exist_ok=True)
+                path = os.path.join(self.record_dir, f"{camera.camera_id}.mp4")
+                camera.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (shape[1], shape[0]))
+            camera.capture.start()
+            camera.thread = threading.Thread(target=self._camera_loop, args=(camera,),
+                                             name=f"Camera-{camera.camera_id}", daemon=True)
+            camera.thread.start()
+        self._summary_thread = threading.Thread(target=self._summary_loop, name="OccupancySummary", daemon=True)
+        self._summary_thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for camera in self.cameras:
+            if camera.thread is not None:
+                camera.capture.stop()
+                camera.thread.join()
+            if camera.writer is not None:
+                camera.writer.release()
+        self.inference.stop()
+        if self._summary_thread is not None:
+            self._summary_thread.join()
+
+    def wait(self):
+        """
+        Blocks until every camera source is exhausted (video files) or the service is stopped.
+        """
+        for camera in self.cameras:
+            while camera.thread is not None and camera.thread.is_alive() and not self._stop.is_set():
+                camera.thread.join(timeout=1.0)
+
+    # ---------- Per camera ----------
+    def _camera_loop(self, camera):
+        while not self._stop.is_set():
+            item = camera.capture.read()
+            if item is None:
+                break
+            frame_index, frame, captured_at = item
+            run = camera.scheduler.should_detect(frame, frame_index)
+            with self._lock:
+                self.stats["frames"] += 1
+                self.stats["inferences" if run else "skipped"] += 1
+            if run:
+                future = self.inference.submit(camera.camera_id, frame, frame_index, captured_at)
+                if not camera.live:
+                    # Video files: keep results in frame order and do not outrun the detector
+                    self._on_result(camera, future)
+                else:
+                    future.add_done_callback(lambda f, camera=camera: self._on_result(camera, f))
+            if camera.writer is not None:
+                self._draw(frame, camera)
+                camera.writer.write(frame)
+
+    def _on_result(self, camera, future):
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"  - Inference failed for camera {camera.camera_id}: {e}")
+            return
+        camera.last_status = result.status
+        with self._lock:
+            changes = camera.debouncer.update(
+                {desk: status == OCCUPIED for desk, status in result.status.items()})
+        for desk, occupied in changes:
+            device_id = camera.desk_devices.get(desk)
+            if device_id is None:
+                continue
+            if self._publish(SENSOR_TOPIC.format(room_id=camera.room_id, device_id=device_id),
+                             {"occupancy": int(occupied)}):
+                with self._lock:
+                    self.stats["changes_published"] += 1
+            print(f"[{camera.camera_id}] {desk}: {'Occupied' if occupied else 'Vacant'}")
+
+    def _draw(self, frame, camera):
+        for desk_name, polygon in camera.desk_rois.items():
+            status = camera.last_status.get(desk_name, "Vacant")
+            color = (0, 255, 0) if status == 'Vacant' else (0, 0, 255)
+            cv2.polylines(frame, [polygon], isClosed=True, color=color, thickness=2)
+            cv2.putText(frame, f'{desk_name}: {status}', (int(polygon[0][0]), int(polygon[0][1])),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    # ---------- Publishing ----------
+    def _publish(self, topic, data):
+        try:
+            info = self.publish(topic, json.dumps(data), PUBLISH_QOS)
+            if getattr(info, "rc", 0) != 0:
+                raise ConnectionError(f"publish returned rc={info.rc}")
+            return True
+        except Exception as e:
+            print(f"  - Failed to publish to {topic}: {e}")
+            with self._lock:
+                self.stats["publish_errors"] += 1
+            return False
+
+    def room_summary(self):
+        """
+        Returns {room_id: (occupied desks, known desks)} from the published (debounced) desk states.
+        """
+        summary = {}
+        for camera in self.cameras:
+            with self._lock:
+                published = dict(camera.debouncer.published)
+            occupied, known = summary.get(camera.room_id, (0, 0))
+            for desk in camera.desk_rois:
+                if desk in published:
+                    known += 1
+                    occupied += int(published[desk])
+            summary[camera.room_id] = (occupied, known)
+        return summary
+
+    def publish_summary(self):
+        for room_id, (occupied, known) in self.room_summary().items():
+            device_id = self.rooms.get(room_id, {}).get("summary_device_id")
+            if device_id is None or not known:
+                continue
+            if self._publish(SENSOR_TOPIC.format(room_id=room_id, device_id=device_id), {"occupancy": occupied}):
+                with self._lock:
+                    self.stats["summaries_published"] += 1
+
+    def _summary_loop(self):
+        while not self._stop.wait(self.summary_interval):
+            self.publish_summary()
+
+
+def _paho_publisher(host, port):
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client()
+    client.connect(host, port, 60)
+    client.loop_start()
+    return client, lambda topic, payload, qos: client.publish(topic, payload, qos=qos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless desk occupancy service publishing to MQTT.")
+    parser.add_argument("--config", default="occupancy_cv/occupancy_service.example.json")
+    parser.add_argument("--record-dir", default=None, help="also write annotated videos per camera here")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    broker = config.get("broker", {})
+    client, publish = _paho_publisher(broker.get("host", "localhost"), broker.get("port", 1883))
+
+    service = OccupancyService(config, publish, record_dir=args.record_dir).start()
+    try:
+        service.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.publish_summary()
+        service.stop()
+        client.loop_stop()
+        client.disconnect()
+        print(f"Occupancy service stopped: {service.stats}")
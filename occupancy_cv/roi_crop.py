@@ -0,0 +1,218 @@
+import argparse
+
+import numpy as np
+
+# --- CONFIGURATION PARAMETERS ---
+SIDE_PAD_FRACTION = 0.25     # Padding around the desk regions, as a fraction of the region size...
+TOP_PAD_FRACTION = 0.6       # ...more above the desks, where the upper bodies of seated people are
+MERGE_GAP_PX = 32            # Regions closer than this are cropped together
+FULL_FRAME_FRACTION = 0.8    # Crops (tiles included) covering more than this fraction of the frame are not worth it
+TILE_OVERLAP = 0.2           # Overlap between neighbouring tiles of a large region
+NMS_IOU = 0.5                # Boxes of the same person found in two overlapping tiles are merged
+
+
+def person_detections(result, person_cls):
+    """
+    Returns (boxes, scores) of the 'person' detections of one ultralytics result: (N, 4) float xyxy and (N,) floats.
+    """
+    boxes = result.boxes
+    xyxy, cls = boxes.xyxy, boxes.cls
+    scores = getattr(boxes, "conf", None)
+    if hasattr(xyxy, "cpu"):
+        xyxy = xyxy.cpu().numpy()
+        cls = cls.cpu().numpy()
+        scores = None if scores is None else scores.cpu().numpy()
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    cls = np.asarray(cls).reshape(-1)
+    scores = np.ones(len(xyxy)) if scores is None else np.asarray(scores, dtype=np.float64).reshape(-1)
+    keep = cls.astype(int) == person_cls
+    return xyxy[keep], scores[keep]
+
+
+def _merge_regions(regions, gap):
+    regions = [list(r) for r in regions]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] - gap <= b[2] and b[0] - gap <= a[2] and a[1] - gap <= b[3] and b[1] - gap <= a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(r) for r in regions]
+
+
+def _overlaps(crops):
+    """
+    Intersections of every pair of overlapping crops, as xyxy rectangles.
+    """
+    overlaps = []
+    for i, a in enumerate(crops):
+        for b in crops[i + 1:]:
+            x1, y1, x2, y2 = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+            if x1 < x2 and y1 < y2:
+                overlaps.append((x1, y1, x2, y2))
+    return np.asarray(overlaps, dtype=np.float64).reshape(-1, 4)
+
+
+def _iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def _tile(region, tile_size, overlap):
+    x1, y1, x2, y2 = region
+    tiles = []
+    step = max(1, int(tile_size * (1 - overlap)))
+    xs = list(range(x1, max(x2 - tile_size, x1) + 1, step))
+    ys = list(range(y1, max(y2 - tile_size, y1) + 1, step))
+    # Make the last tile end exactly at the region border
+    if xs[-1] + tile_size < x2:
+        xs.append(x2 - tile_size)
+    if ys[-1] + tile_size < y2:
+        ys.append(y2 - tile_size)
+    for ty in ys:
+        for tx in xs:
+            tiles.append((tx, ty, min(tx + tile_size, x2), min(ty + tile_size, y2)))
+    return tiles
+
+
+class CropPlan:
+    """
+    Crop regions covering the desk polygons of one camera, computed once.
+    - The bounding boxes of the desks are padded (more above the desks), merged when they are close,
+      and optionally split into overlapping tiles of tile_size pixels.
+    - detect() runs the model on the crops in one batched call and maps the boxes back to frame
+      coordinates, so the result feeds the usual DeskROIIndex assignment.
+    - If the crops (after tiling) cover most of the frame the plan falls back to the whole frame.
+    """
+
+    def __init__(self, desk_rois, frame_shape, tile_size=None, side_pad=SIDE_PAD_FRACTION, top_pad=TOP_PAD_FRACTION,
+                 merge_gap=MERGE_GAP_PX, tile_overlap=TILE_OVERLAP, nms_iou=NMS_IOU):
+        """
+        Args:
+            desk_rois (dict): desk name -> int32 polygon in frame coordinates.
+            frame_shape (tuple): (height, width) of the frames.
+            tile_size (int): Split regions larger than this into square tiles, None to keep whole regions.
+            side_pad (float): Padding left/right/below as a fraction of the region size.
+            top_pad (float): Padding above as a fraction of the region height.
+            merge_gap (int): Regions closer than this many pixels are merged.
+            tile_overlap (float): Overlap between neighbouring tiles.
+            nms_iou (float): IoU above which detections from different crops are considered the same person.
+        """
+        self.height, self.width = frame_shape[:2]
+        self.nms_iou = nms_iou
+
+        padded = []
+        for polygon in desk_rois.values():
+            polygon = np.asarray(polygon)
+            x1, y1 = polygon.min(axis=0)
+            x2, y2 = polygon.max(axis=0)
+            w, h = x2 - x1, y2 - y1
+            padded.append((int(max(x1 - side_pad * w, 0)), int(max(y1 - top_pad * h, 0)),
+                           int(min(x2 + side_pad * w + 1, self.width)), int(min(y2 + side_pad * h + 1, self.height))))
+        regions = _merge_regions(padded, merge_gap)
+
+        if tile_size:
+            crops = [t for r in regions for t in _tile(r, tile_size, tile_overlap)]
+        else:
+            crops = list(regions)
+        # Overlapping tiles can cost more pixels than the regions themselves, so check after tiling
+        pixel_fraction = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in crops) / (self.width * self.height)
+        if not crops or pixel_fraction > FULL_FRAME_FRACTION:
+            regions = crops = [(0, 0, self.width, self.height)]
+            pixel_fraction = 1.0
+        self.regions = regions
+        self.crops_xyxy = crops
+        self.pixel_fraction = pixel_fraction
+        self.overlaps = _overlaps(crops)
+
+    @property
+    def is_full_frame(self):
+        return self.crops_xyxy == [(0, 0, self.width, self.height)]
+
+    def crops(self, frame):
+        """
+        Views (no copies) of the frame for every crop.
+        """
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self.crops_xyxy]
+
+    def merge(self, detections):
+        """
+        Maps per-crop (boxes, scores) back to frame coordinates and removes duplicates from overlapping crops.
+
+        Returns:
+            tuple: (N, 4) int32 xyxy boxes and (N,) scores in frame coordinates.
+        """
+        all_boxes, all_scores, all_crops = [], [], []
+        for crop_id, ((x1, y1, x2, y2), (boxes, scores)) in enumerate(zip(self.crops_xyxy, detections)):
+            if len(boxes):
+                boxes = boxes + (x1, y1, x1, y1)
+                # A person cut by a tile border is also seen whole by the neighbouring tile: prefer that box
+                cut = (((boxes[:, 0] <= x1 + 1) & (x1 > 0)) | ((boxes[:, 1] <= y1 + 1) & (y1 > 0))
+                       | ((boxes[:, 2] >= x2 - 1) & (x2 < self.width)) | ((boxes[:, 3] >= y2 - 1) & (y2 < self.height)))
+                all_boxes.append(boxes)
+                all_scores.append(np.where(cut, scores * 0.9, scores))
+                all_crops.append(np.full(len(boxes), crop_id))
+        if not all_boxes:
+            return np.zeros((0, 4), dtype=np.int32), np.zeros(0)
+        boxes, scores = np.concatenate(all_boxes), np.concatenate(all_scores)
+        if len(self.overlaps) and len(boxes) > 1:
+            keep = self._suppress_duplicates(boxes, scores, np.concatenate(all_crops))
+            boxes, scores = boxes[keep], scores[keep]
+        return boxes.astype(np.int32), scores
+
+    def _suppress_duplicates(self, boxes, scores, crop_ids):
+        """
+        Greedy NMS restricted to boxes that touch a tile overlap, and only between boxes of different crops:
+        two people sitting close together in the same crop are never merged (the model already ran NMS there).
+        """
+        o = self.overlaps
+        touches = ((boxes[:, None, 0] < o[:, 2]) & (boxes[:, None, 2] > o[:, 0])
+                   & (boxes[:, None, 1] < o[:, 3]) & (boxes[:, None, 3] > o[:, 1])).any(axis=1)
+        keep = np.ones(len(boxes), dtype=bool)
+        candidates = np.flatnonzero(touches)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        for n, i in enumerate(candidates):
+            if not keep[i]:
+                continue
+            rest = candidates[n + 1:]
+            rest = rest[keep[rest] & (crop_ids[rest] != crop_ids[i])]
+            if len(rest):
+                keep[rest[_iou(boxes[i], boxes[rest]) > self.nms_iou]] = False
+        return np.flatnonzero(keep)
+
+    def detect(self, model, frame, person_cls, **kwargs):
+        """
+        Runs the model on the crops of one frame (one batched call) and returns person boxes in frame coordinates.
+        """
+        results = model(self.crops(frame), **kwargs)
+        boxes, _ = self.merge([person_detections(r, person_cls) for r in results])
+        return boxes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the crop regions computed for a camera's desk polygons.")
+    parser.add_argument("--rois", default="occupancy_cv/desk_roi_pos.json")
+    parser.add_argument("--width", type=int, default=480)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--tile", type=int, default=None)
+    args = parser.parse_args()
+
+    from inference_service import load_desk_rois
+    plan = CropPlan(load_desk_rois(args.rois), (args.height, args.width), tile_size=args.tile)
+    print(f"{len(plan.crops_xyxy)} crops covering {plan.pixel_fraction:.1%} of the frame"
+          f"{' (full frame fallback)' if plan.is_full_frame else ''}:")
+    for crop in plan.crops_xyxy:
+        print(f"  - {crop}")
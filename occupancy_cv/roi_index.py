@@ -0,0 +1,173 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+NO_DESK = -1
+
+
+def box_centers(boxes):
+    """
+    Integer center points of (N, 4) xyxy boxes, the same point the scripts pass to cv2.pointPolygonTest.
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) // 2, (boxes[:, 1] + boxes[:, 3]) // 2], axis=1)
+
+
+class DeskROIIndex:
+    """
+    Precomputed lookup from image points to desk polygons, built once per camera.
+    - Every polygon is rasterized into a label mask at frame resolution, so assigning all detections
+      of a frame is a single NumPy fancy-indexing lookup instead of people x desks pointPolygonTest calls.
+    - Pixels covered by several polygons or next to an outline (and points outside the frame) fall back to a bounding-box
+      prefilter + cv2.pointPolygonTest over the candidate desks, in desk order, so the result matches
+      the original "first desk that contains the point wins" loop.
+    """
+
+    def __init__(self, desk_rois, frame_shape):
+        """
+        Args:
+            desk_rois (dict): desk name -> int32 polygon (as loaded from desk_roi_pos.json).
+            frame_shape (tuple): (height, width) of the camera frames.
+        """
+        self.names = list(desk_rois)
+        self.polygons = [np.asarray(desk_rois[name], dtype=np.int32) for name in self.names]
+        self.height, self.width = frame_shape[:2]
+
+        self.bboxes = np.array([[p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()]
+                                for p in self.polygons], dtype=np.int64).reshape(-1, 4)
+
+        # label 0 = no desk, k + 1 = desk k; coverage counts how many polygons contain a pixel.
+        # Rasterized edges do not agree exactly with pointPolygonTest, so pixels on or next to
+        # an outline are resolved by the exact test as well.
+        self.labels = np.zeros((self.height, self.width), dtype=np.int32)
+        coverage = np.zeros((self.height, self.width), dtype=np.uint8)
+        edges = np.zeros((self.height, self.width), dtype=np.uint8)
+        for k, polygon in enumerate(self.polygons):
+            x1, y1, x2, y2 = self.bboxes[k]
+            x1, y1 = max(x1 - 1, 0), max(y1 - 1, 0)
+            x2, y2 = min(x2 + 2, self.width), min(y2 + 2, self.height)
+            if x1 >= x2 or y1 >= y2:
+                continue
+            # Rasterize inside the polygon's bounding box only
+            mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+            cv2.fillPoly(mask, [polygon], 1, offset=(-int(x1), -int(y1)))
+            inside = mask.astype(bool)
+            labels = self.labels[y1:y2, x1:x2]
+            labels[inside & (coverage[y1:y2, x1:x2] == 0)] = k + 1
+            coverage[y1:y2, x1:x2] += mask
+            cv2.polylines(edges, [polygon], True, 1, thickness=3)
+        self.ambiguous = (coverage > 1) | edges.astype(bool)
+        # Polygons reaching outside the frame need the slow path for out-of-frame points
+        self._outside_frame = bool(len(self.bboxes)) and bool(
+            (self.bboxes[:, 0] < 0).any() or (self.bboxes[:, 1] < 0).any()
+            or (self.bboxes[:, 2] >= self.width).any() or (self.bboxes[:, 3] >= self.height).any())
+
+    def lookup(self, points):
+        """
+        Returns the desk index of every (x, y) point, NO_DESK where the point is in no polygon.
+        """
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        xs, ys = points[:, 0], points[:, 1]
+        in_frame = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        desk = np.full(len(points), NO_DESK, dtype=np.int64)
+
+        inside_xs, inside_ys = xs[in_frame], ys[in_frame]
+        desk[in_frame] = self.labels[inside_ys, inside_xs] - 1
+        slow = np.zeros(len(points), dtype=bool)
+        slow[in_frame] = self.ambiguous[inside_ys, inside_xs]
+        if self._outside_frame:
+            slow |= ~in_frame
+
+        for i in np.flatnonzero(slow):
+            desk[i] = self._slow_lookup(int(xs[i]), int(ys[i]))
+        return desk
+
+    def _slow_lookup(self, x, y):
+        b = self.bboxes
+        candidates = np.flatnonzero((b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3]))
+        for k in candidates:
+            if cv2.pointPolygonTest(self.polygons[k], (x, y), False) >= 0:
+                return int(k)
+        return NO_DESK
+
+    def assign(self, boxes):
+        """
+        Maps person boxes to desks by their center point.
+
+        Returns:
+            dict: desk name -> list of indices into boxes of the people sitting there.
+        """
+        assignment = {name: [] for name in self.names}
+        for i, k in enumerate(self.lookup(box_centers(boxes))):
+            if k != NO_DESK:
+                assignment[self.names[k]].append(i)
+        return assignment
+
+
+# --- Benchmark: rasterized index vs per-person pointPolygonTest loop ---
+def _grid_desks(n_desks, width, height):
+    cols = int(np.ceil(np.sqrt(n_desks * width / height)))
+    rows = int(np.ceil(n_desks / cols))
+    cell_w, cell_h = width / cols, height / rows
+    desks = {}
+    for k in range(n_desks):
+        r, c = divmod(k, cols)
+        x0, y0 = c * cell_w, r * cell_h
+        # Slightly skewed quads that overlap their right-hand neighbour, like perspective desk outlines
+        desks[f"Desk {k + 1}"] = np.array([
+            [x0 + 0.1 * cell_w, y0 + 0.1 * cell_h], [x0 + 1.05 * cell_w, y0 + 0.15 * cell_h],
+            [x0 + 0.95 * cell_w, y0 + 0.9 * cell_h], [x0 + 0.05 * cell_w, y0 + 0.85 * cell_h],
+        ], dtype=np.int32)
+    return desks
+
+
+def _loop_assign(desk_rois, boxes):
+    desk = []
+    for x1, y1, x2, y2 in boxes:
+        center = (int((x1 + x2) // 2), int((y1 + y2) // 2))
+        found = NO_DESK
+        for k, polygon in enumerate(desk_rois.values()):
+            if cv2.pointPolygonTest(polygon, center, False) >= 0:
+                found = k
+                break
+        desk.append(found)
+    return np.array(desk)
+
+
+def run_benchmark(desk_counts, people, frames, width=1920, height=1080):
+    rng = np.random.default_rng(0)
+    for n_desks in desk_counts:
+        desks = _grid_desks(n_desks, width, height)
+        started = time.perf_counter()
+        index = DeskROIIndex(desks, (height, width))
+        build_ms = (time.perf_counter() - started) * 1000
+
+        frame_boxes = []
+        for _ in range(frames):
+            x1 = rng.integers(0, width - 40, people)
+            y1 = rng.integers(0, height - 80, people)
+            frame_boxes.append(np.stack([x1, y1, x1 + rng.integers(20, 120, people),
+                                         y1 + rng.integers(40, 240, people)], axis=1))
+
+        started = time.perf_counter()
+        expected = [_loop_assign(desks, boxes) for boxes in frame_boxes]
+        loop_s = time.perf_counter() - started
+        started = time.perf_counter()
+        actual = [index.lookup(box_centers(boxes)) for boxes in frame_boxes]
+        index_s = time.perf_counter() - started
+
+        agree = np.mean(np.concatenate(expected) == np.concatenate(actual)) * 100
+        print(f"{n_desks:4d} desks, {people} people/frame: loop {loop_s * 1000 / frames:8.3f} ms/frame, "
+              f"index {index_s * 1000 / frames:7.3f} ms/frame ({loop_s / index_s:6.1f}x), "
+              f"build {build_ms:6.1f} ms, agreement {agree:.2f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark desk assignment: rasterized ROI index vs pointPolygonTest loop.")
+    parser.add_argument("--desks", type=int, nargs="+", default=[5, 50, 200])
+    parser.add_argument("--people", type=int, default=30, help="detections per frame")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+    run_benchmark(args.desks, args.people, args.frames)
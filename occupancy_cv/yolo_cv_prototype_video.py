@@ -3,10 +3,25 @@ from ultralytics import YOLO
 import numpy as np
 import json
 
+from roi_index import DeskROIIndex, box_centers, NO_DESK
+from occupancy_log import OccupancyRecorder
+from motion_gate import MotionGatedScheduler
+from roi_crop import CropPlan, person_detections
+from cv_pipeline import LatestFrameCapture, CVPipeline
+
 # File path 
 video_path = "occupancy_cv/test.mp4"
 output_path = "output_with_polygons.mp4"
 desk_rois_path = "occupancy_cv/desk_roi_pos.json"
+occupancy_log_path = "occupancy_cv/occupancy_log.ndjson"
+
+# ROI-cropped inference: only the areas around the desks are passed to YOLO
+USE_ROI_CROP = False
+ROI_CROP_TILE = None  # e.g. 320 to split large desk areas into tiles
+
+# Pipeline: capture, inference and rendering run in separate threads
+LIVE_STREAM = False   # True for network cameras (e.g. the ESP32-CAM feed): stale frames are dropped
+HEADLESS = False      # True skips drawing, video encoding and the preview window
 
 # Save data into a json file
 with open("data.json", "w") as f:
@@ -22,63 +37,89 @@ DESK_ROIS = {desk: np.array(roi, dtype=np.int32) for desk, roi in desk_rois_json
 # Define YOLO model
 model = YOLO("yolov8l.pt")
 print(model.names)
+PERSON_CLS = next(int(k) for k, v in model.names.items() if v == 'person')
 
-# Setup cv2
-cap = cv2.VideoCapture(video_path)
-frame_index = 0
+# Setup cv2: frames are read on a separate capture thread
+capture = LatestFrameCapture(video_path, live=LIVE_STREAM)
 
 # Errro handling for file open error
-if not cap.isOpened():
+if not capture.is_opened():
     print(f"Error: Could not open file {video_path}")
     exit()
     
-frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-fps = int(cap.get(cv2.CAP_PROP_FPS))
+frame_width = capture.width
+frame_height = capture.height
+fps = capture.fps
+
+# Desk lookup mask, built once for this resolution
+roi_index = DeskROIIndex(DESK_ROIS, (frame_height, frame_width))
+desk_names = list(DESK_ROIS)
+crop_plan = CropPlan(DESK_ROIS, (frame_height, frame_width), tile_size=ROI_CROP_TILE)
+if USE_ROI_CROP:
+    print(f"ROI crop: {len(crop_plan.crops_xyxy)} crops covering {crop_plan.pixel_fraction:.0%} of the frame")
 
 # Smoothing memory
 desk_last_seen = {seat: -999 for seat in DESK_ROIS}
 SMOOTH_FRAMES = fps * 10
 
-# Detection internal
+# Detection internal: YOLO runs at most every DETECTION_INTERVAL frames when a desk shows motion,
+# and backs off up to HEARTBEAT_INTERVAL frames while the room is static
 DETECTION_INTERVAL = fps * 1
+HEARTBEAT_INTERVAL = fps * 60
+scheduler = MotionGatedScheduler(DESK_ROIS, (frame_height, frame_width), DETECTION_INTERVAL, HEARTBEAT_INTERVAL)
+occupied_at_last_run = set()
 
-fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+out = None
+if not HEADLESS:
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
 
-all_status = {}
+# Only state changes are appended to the log
+recorder = OccupancyRecorder(occupancy_log_path, DESK_ROIS)
 
-# Main loop for each frame detection
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-    
+
+# Inference stage: detection, desk assignment, smoothing and logging for each frame
+def infer(frame, frame_index):
+    global occupied_at_last_run
     desk_status = {desk_name: 'Vacant' for desk_name in DESK_ROIS}
     
-    results = []
-    if frame_index % DETECTION_INTERVAL == 0:
-        results = model(frame, conf=0.1)
+    person_boxes = None
+    if scheduler.should_detect(frame, frame_index):
+        if USE_ROI_CROP:
+            person_boxes = crop_plan.detect(model, frame, PERSON_CLS, conf=0.1)
+        else:
+            results = model(frame, conf=0.1)
+            person_boxes = np.concatenate(
+                [person_detections(result, PERSON_CLS)[0] for result in results]).astype(np.int32)
+        occupied_at_last_run = set()
+    else:
+        # Nothing moved at these desks since the last detection, so whoever sat there still does
+        for desk_name in occupied_at_last_run & scheduler.static_desks():
+            desk_last_seen[desk_name] = frame_index
     
-    if results:
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                if model.names[int(box.cls)] == 'person':
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    person_center_point = ((x1 + x2) // 2, (y1 + y2) // 2)
-                    
-                    for desk_name, polygon in DESK_ROIS.items():
-                        is_inside = cv2.pointPolygonTest(polygon, person_center_point, False)
-                        
-                        if is_inside >= 0:
-                            desk_status[desk_name] = 'Occupied'
-                            desk_last_seen[desk_name] = frame_index 
-                            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                            break
+    seated_boxes = []
+    if person_boxes is not None:
+        # All people of the frame are mapped to desks in one lookup
+        for box, desk in zip(person_boxes, roi_index.lookup(box_centers(person_boxes))):
+            if desk != NO_DESK:
+                desk_name = desk_names[desk]
+                desk_status[desk_name] = 'Occupied'
+                desk_last_seen[desk_name] = frame_index
+                occupied_at_last_run.add(desk_name)
+                seated_boxes.append(box)
     for desk_name in DESK_ROIS:
         if frame_index - desk_last_seen[desk_name] <= SMOOTH_FRAMES:
             desk_status[desk_name] = "Occupied"
+
+    recorder.record(frame_index, desk_status)
+    return desk_status, seated_boxes
+
+
+# Render stage (main thread): annotation, video encoding and preview window
+def render(frame, frame_index, result):
+    desk_status, seated_boxes = result
+    for x1, y1, x2, y2 in seated_boxes:
+        cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
                 
     for desk_name, polygon in DESK_ROIS.items():
         status = desk_status[desk_name]
@@ -88,23 +129,24 @@ while cap.isOpened():
     
         text_pos = (polygon[0][0], polygon[0][1])
         cv2.putText(frame, f'{desk_name}: {status}', text_pos, cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-    
-
-    all_status[frame_index] = desk_status.copy()
-
             
     out.write(frame)
     cv2.imshow('Desk Occupancy Detection', frame)
     
-    frame_index += 1
-    
     if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+        return False
+
 
-    with open("occupancy_cv/log.json", "w") as f:
-        json.dump(all_status, f, indent=4)
-    print("Log file saved as log.json")
+# Main loop: runs until the video ends (or 'q' is pressed in the preview window)
+pipeline = CVPipeline(capture, infer, None if HEADLESS else render)
+pipeline.run()
 
-cap.release()
-out.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+recorder.close()
+print(f"Occupancy log saved as {occupancy_log_path} ({recorder.events} state changes)")
+gate = scheduler.metrics()
+print(f"YOLO ran on {gate['runs']} of {gate['frames']} frames ({gate['skipped']} skipped, "
+      f"skip ratio {gate['skip_ratio']:.3f})")
+pipeline.print_stats()
+if out is not None:
+    out.release()
+cv2.destroyAllWindows()